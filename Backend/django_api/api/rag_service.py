@@ -8,6 +8,7 @@ from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from langchain_openai import ChatOpenAI
 
+from .services.page_references import parse_page_references
 from .services.prompt_router import get_prompt_router
 from .services.prompt_templates import PROMPT_TEMPLATES
 
@@ -33,7 +34,7 @@ RAG_DIR = _resolve_rag_directory()
 if str(RAG_DIR) not in sys.path:
     sys.path.append(str(RAG_DIR))
 
-from rag import RAGConfig, RAGPipeline  # noqa: E402
+from rag import RAGConfig, RAGPipeline, material_id_for  # noqa: E402
 
 
 ROUTES_THAT_NEED_RAG = {
@@ -75,6 +76,40 @@ def _format_additional_context(context: dict | str | None) -> str:
     return "\n".join(parts)
 
 
+def _context_value(context: dict | str | None, *keys: str):
+    if not isinstance(context, dict):
+        return None
+    for key in keys:
+        value = context.get(key)
+        if value not in (None, "", [], {}, ()):
+            return value
+    return None
+
+
+def _retrieval_filters(subject: str = "", context: dict | str | None = None) -> dict:
+    """
+    Payload filters for a request: the course (a courseCode in `context`,
+    else `subject` looked up in settings.RAG_COURSE_CODES) plus any
+    material, file, lecture or slide it names. A file name is matched by
+    its material id, since stored sources are full ingest paths. Slide/page
+    numbers count from 1; stored pages count from 0.
+    """
+    filters: dict = {}
+    course = _context_value(context, "courseCode", "course_code") or settings.RAG_COURSE_CODES.get(subject)
+    if course:
+        filters["course"] = course
+    material_id = _context_value(context, "materialId", "material_id")
+    source = _context_value(context, "source", "file")
+    if material_id or source:
+        filters["material_id"] = material_id or material_id_for(source)
+    reference = parse_page_references("", context)
+    if reference.pages:
+        filters["page"] = [page - 1 for page in reference.pages]
+    if reference.lecture is not None:
+        filters["lecture"] = reference.lecture
+    return filters
+
+
 class RAGService:
     def __init__(self):
         if not settings.OPENAI_API_KEY:
@@ -94,18 +129,135 @@ class RAGService:
                 top_k=settings.RAG_TOP_K,
                 embedding_model=settings.RAG_EMBEDDING_MODEL,
                 embedding_dim=settings.RAG_EMBEDDING_DIM,
+                embedding_backend=settings.RAG_EMBEDDING_BACKEND,
+                embedding_threads=settings.RAG_EMBEDDING_THREADS,
+                rerank_model=settings.RAG_RERANK_MODEL or None,
+                rerank_candidates=settings.RAG_RERANK_CANDIDATES,
+                rerank_timeout=settings.RAG_RERANK_TIMEOUT,
+                query_cache_size=settings.RAG_QUERY_CACHE_SIZE,
+                query_cache_ttl=settings.RAG_QUERY_CACHE_TTL,
+                embedding_cache_path=settings.RAG_EMBEDDING_CACHE or None,
+                vector_backend=settings.RAG_VECTOR_BACKEND,
+                mmap_path=settings.RAG_MMAP_PATH or None,
                 llm_model=settings.RAG_LLM_MODEL,
                 llm_temperature=settings.RAG_LLM_TEMPERATURE,
             )
             self._pipeline = RAGPipeline(config=cfg).use_existing()
         return self._pipeline
 
-    def _retrieve_context(self, question: str) -> tuple[str, list[dict]]:
+    def query_cache_stats(self) -> dict | None:
+        """The pipeline's query-vector cache counters; None before it is loaded or with the cache off."""
+        if self._pipeline is None or self._pipeline.query_cache is None:
+            return None
+        return self._pipeline.query_cache.stats()
+
+    def _retrieve_context(self, question: str, filters: dict | None = None) -> tuple[str, list[dict]]:
+        try:
+            pipeline = self._get_pipeline()
+            docs = pipeline.retrieve(question, filters=filters)
+            if not docs and filters:
+                # Chunks ingested before course/material tagging match no filter.
+                docs = pipeline.retrieve(question)
+        except Exception:
+            return "", []
+        return self._format_documents(docs)
+
+    def _summary_context(
+        self,
+        user_question: str,
+        subject: str = "",
+        context: dict | str | None = None,
+    ) -> tuple[str, list[dict]]:
+        """
+        Precomputed page-window and document summaries for a summarization
+        request, so whole lectures are summarized from a few short texts
+        rather than raw chunks. Returns ("", []) when the collection has no
+        summary tier or nothing matches.
+        """
+        filters = _retrieval_filters(subject, context)
+        reference = parse_page_references(user_question, context)
+        if reference.pages:
+            filters["page"] = [page - 1 for page in reference.pages]
+        if reference.lecture is not None:
+            filters["lecture"] = reference.lecture
+        try:
+            pipeline = self._get_pipeline()
+            docs = pipeline.retrieve_summaries(user_question, filters=filters)
+            if not docs and "course" in filters:
+                filters.pop("course")
+                docs = pipeline.retrieve_summaries(user_question, filters=filters)
+        except Exception:
+            return "", []
+        return self._format_documents(docs)
+
+    def _topic_context(self, subject: str, topics: list[str], fallback_query: str) -> tuple[str, list[dict]]:
+        """
+        Context for topic-level generators (flashcards, quizzes, study plans)
+        from the precomputed topic clusters: each topic's most central chunks,
+        with no query embedding or vector search per topic. Falls back to a
+        search for `fallback_query` when the collection has no topic index or
+        nothing of the subject's course is in the matched topics; topics are
+        never fetched without the course filter, as clusters span courses.
+        """
+        filters = _retrieval_filters(subject)
+        topics = [topic for topic in topics if topic and topic.strip()]
+        limit = max(settings.RAG_TOP_K, len(topics))
+        per_topic: list[list] = []
+        try:
+            pipeline = self._get_pipeline()
+            for topic in topics:
+                per_topic.append(pipeline.topic_documents(topic, filters=filters))
+        except Exception:
+            per_topic = []
+
+        # Round-robin over topics so every topic is represented before any repeats.
+        merged, seen = [], set()
+        for rank in range(max((len(docs) for docs in per_topic), default=0)):
+            for docs in per_topic:
+                if rank < len(docs) and len(merged) < limit:
+                    key = docs[rank].metadata.get("_id") or docs[rank].page_content
+                    if key not in seen:
+                        seen.add(key)
+                        merged.append(docs[rank])
+        if not merged:
+            return self._retrieve_context(fallback_query, filters)
+        return self._format_documents(merged)
+
+    def _lookup_pages(
+        self,
+        user_question: str,
+        subject: str = "",
+        context: dict | str | None = None,
+    ) -> tuple[str, list[dict]]:
+        """
+        Fetch the chunks of the slides/pages a message names ("explain slide
+        12 of lecture 3") straight from the page index: exact, and no
+        embedding call. A page number alone is ambiguous (every lecture has
+        a slide 12), so the lecture or material must be known too. Returns
+        ("", []) otherwise, or when nothing is found, and the caller falls
+        back to semantic retrieval.
+        """
+        reference = parse_page_references(user_question, context)
+        if not reference:
+            return "", []
+
+        filters = _retrieval_filters(subject, context)
+        filters["page"] = [page - 1 for page in reference.pages]
+        if reference.lecture is not None:
+            filters["lecture"] = reference.lecture
+        if "lecture" not in filters and "material_id" not in filters:
+            return "", []
         try:
-            docs = self._get_pipeline().retrieve(question)
+            pipeline = self._get_pipeline()
+            docs = pipeline.lookup(filters)
+            if not docs and "course" in filters:
+                filters.pop("course")
+                docs = pipeline.lookup(filters)
         except Exception:
             return "", []
+        return self._format_documents(docs)
 
+    def _format_documents(self, docs: list) -> tuple[str, list[dict]]:
         if not docs:
             return "", []
 
@@ -115,6 +267,9 @@ class RAGService:
             metadata = doc.metadata or {}
             source = metadata.get("source") or metadata.get("file") or "unknown"
             page = metadata.get("page", metadata.get("page_number", "?"))
+            if isinstance(page, list) and page:
+                # Summaries cover a range of pages.
+                page = f"{page[0]}-{page[-1]}" if len(page) > 1 else page[0]
             snippet = " ".join((doc.page_content or "").split())
             if len(snippet) > 1200:
                 snippet = snippet[:1200].rstrip() + "..."
@@ -175,8 +330,14 @@ class RAGService:
 
         retrieved_context = ""
         references: list[dict] = []
-        if route in ROUTES_THAT_NEED_RAG:
-            retrieved_context, references = self._retrieve_context(user_question)
+        if route == "slide_explanation":
+            retrieved_context, references = self._lookup_pages(user_question, subject, context)
+        elif route == "summarization":
+            retrieved_context, references = self._summary_context(user_question, subject, context)
+        if route in ROUTES_THAT_NEED_RAG and not retrieved_context:
+            retrieved_context, references = self._retrieve_context(
+                user_question, _retrieval_filters(subject, context)
+            )
 
         question_payload = self._build_question_payload(
             user_question=user_question,
@@ -293,7 +454,9 @@ Code:
         return {"answer": answer, "references": []}
 
     def generate_flashcards(self, subject: str, topic: str, num_cards: int) -> list[dict]:
-        retrieved_context, references = self._retrieve_context(f"{subject} {topic} flashcards")
+        retrieved_context, references = self._topic_context(
+            subject, [topic], f"{subject} {topic} flashcards"
+        )
         prompt = f"""You are an AI flashcard generator for university students.
 
 Create {num_cards} high-quality flashcards for the following subject and topic.
@@ -340,6 +503,7 @@ Rules:
         question_types: list[str],
     ) -> list[dict]:
         prompt_types = ", ".join(question_types)
+        retrieved_context, _ = self._topic_context(subject, [topic], f"{subject} {topic} quiz")
         prompt = f"""Generate a quiz as a JSON array for this course topic.
 
 Subject: {subject}
@@ -348,6 +512,11 @@ Number of questions: {num_questions}
 Difficulty: {difficulty}
 Question types: {prompt_types}
 
+Base the questions on the retrieved course material when it is available.
+
+Retrieved context:
+{retrieved_context}
+
 Return valid JSON only using this structure:
 [
   {{
@@ -386,7 +555,9 @@ Rules:
         Returns a JSON-serializable dict containing plan metadata and day-level schedule entries.
         """
         topics_text = "\n".join(f"- {t}" for t in (topics or []))
-        retrieved_context, references = self._retrieve_context(f"{subject} {' '.join(topics or [])} study plan")
+        retrieved_context, references = self._topic_context(
+            subject, topics or [], f"{subject} {' '.join(topics or [])} study plan"
+        )
 
         prompt = f"""You are an AI study planner for university students.
 
@@ -474,3 +645,14 @@ Rules:
 @lru_cache(maxsize=1)
 def get_rag_service() -> RAGService:
     return RAGService()
+
+
+def rag_status() -> dict:
+    """
+    Runtime counters for the health endpoint. Empty until the first RAG
+    request has loaded the service; checking never loads it.
+    """
+    if get_rag_service.cache_info().currsize == 0:
+        return {}
+    stats = get_rag_service().query_cache_stats()
+    return {"query_cache": stats} if stats is not None else {}
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+
+
+# "slide 12", "slides 3-5", "pages 4, 6 and 7", "p. 12", "slide #3 to 5"
+_PAGE_PATTERN = re.compile(
+    r"\b(?:slides?|pages?|pp?\.)\s*#?\s*(\d{1,4})"
+    r"((?:(?:\s*(?:-|–|to|through|,|and|&))+\s*#?\s*\d{1,4})*)",
+    re.IGNORECASE,
+)
+_RANGE_PATTERN = re.compile(r"(\d{1,4})\s*(?:-|–|to|through)\s*#?\s*(\d{1,4})", re.IGNORECASE)
+_LECTURE_PATTERN = re.compile(r"\b(?:lecture|lec)\s*#?\s*(\d{1,3})\b", re.IGNORECASE)
+
+MAX_PAGES = 20
+
+PAGE_CONTEXT_KEYS = ("slide", "slides", "slideNumber", "page", "pages", "pageNumber")
+LECTURE_CONTEXT_KEYS = ("lecture", "lectureNumber")
+
+
+@dataclass
+class PageReference:
+    """Slides / pages a message points at, numbered from 1 as students count them."""
+
+    pages: list[int] = field(default_factory=list)
+    lecture: int | None = None
+
+    def __bool__(self) -> bool:
+        return bool(self.pages)
+
+
+def _expand(first: str, rest: str) -> list[int]:
+    text = first + rest
+    pages: list[int] = []
+    for start, end in _RANGE_PATTERN.findall(text):
+        low, high = sorted((int(start), int(end)))
+        pages.extend(range(low, min(high, low + MAX_PAGES - 1) + 1))
+    pages.extend(int(number) for number in re.findall(r"\d{1,4}", _RANGE_PATTERN.sub(" ", text)))
+    return pages
+
+
+def _context_numbers(context: dict, keys: tuple[str, ...]) -> list[int]:
+    numbers: list[int] = []
+    for key in keys:
+        value = context.get(key)
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            try:
+                numbers.append(int(item))
+            except (TypeError, ValueError):
+                continue
+    return numbers
+
+
+def parse_page_references(message: str, context: dict | str | None = None) -> PageReference:
+    """
+    Find slide or page numbers (and a lecture number) in a message, or in
+    the slide/page/lecture fields of the request context.
+    """
+    pages: list[int] = []
+    for match in _PAGE_PATTERN.finditer(message or ""):
+        pages.extend(_expand(match.group(1), match.group(2)))
+
+    lecture_match = _LECTURE_PATTERN.search(message or "")
+    lecture = int(lecture_match.group(1)) if lecture_match else None
+
+    if isinstance(context, dict):
+        if not pages:
+            pages = _context_numbers(context, PAGE_CONTEXT_KEYS)
+        if lecture is None:
+            lectures = _context_numbers(context, LECTURE_CONTEXT_KEYS)
+            lecture = lectures[0] if lectures else None
+
+    unique = sorted({page for page in pages if page > 0})
+    return PageReference(pages=unique[:MAX_PAGES], lecture=lecture)
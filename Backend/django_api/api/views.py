@@ -11,7 +11,7 @@ from django.utils import timezone
 
 
 def health(request):
-    return JsonResponse({"status": "ok"})
+    return JsonResponse({"status": "ok", **rag_status()})
 
 
 from .models import Material, ChatSession, ChatMessage, Quiz, QuizSubmission
@@ -19,7 +19,7 @@ from .serializers import (
     MaterialSerializer, UserSerializer, RegisterSerializer,
     ChatSessionSerializer, ChatMessageSerializer, QuizSerializer, QuizSubmissionSerializer
 )
-from .rag_service import get_rag_service
+from .rag_service import get_rag_service, rag_status
 import json
 
 User = get_user_model()
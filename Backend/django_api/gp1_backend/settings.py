@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
 
@@ -42,10 +43,24 @@ QDRANT_API_KEY = os.getenv('QDRANT_API_KEY', '')
 QDRANT_LOCATION = os.getenv('QDRANT_LOCATION', ':memory:')
 QDRANT_COLLECTION = os.getenv('QDRANT_COLLECTION', 'OOP_COURSE_MATERIAL')
 RAG_TOP_K = int(os.getenv('RAG_TOP_K', '5'))
+# Chat subjects as the frontend names them -> the course codes ingested with
+# --course, e.g. {"Object-Oriented Programming": "CS201"}. Unmapped subjects
+# search every course.
+RAG_COURSE_CODES = json.loads(os.getenv('RAG_COURSE_CODES', '{}'))
 RAG_EMBEDDING_MODEL = os.getenv('RAG_EMBEDDING_MODEL', 'text-embedding-3-small')
 RAG_EMBEDDING_DIM = int(os.getenv('RAG_EMBEDDING_DIM', '1536'))
+RAG_EMBEDDING_BACKEND = os.getenv('RAG_EMBEDDING_BACKEND', 'openai')
+RAG_EMBEDDING_THREADS = int(os.getenv('RAG_EMBEDDING_THREADS', '0')) or None
+RAG_RERANK_MODEL = os.getenv('RAG_RERANK_MODEL', '')
+RAG_RERANK_CANDIDATES = int(os.getenv('RAG_RERANK_CANDIDATES', '20'))
+RAG_RERANK_TIMEOUT = float(os.getenv('RAG_RERANK_TIMEOUT', '0.5'))
+RAG_QUERY_CACHE_SIZE = int(os.getenv('RAG_QUERY_CACHE_SIZE', '1024'))
+RAG_QUERY_CACHE_TTL = float(os.getenv('RAG_QUERY_CACHE_TTL', '3600'))
 RAG_LLM_MODEL = os.getenv('RAG_LLM_MODEL', 'gpt-5.4-mini')
 RAG_LLM_TEMPERATURE = float(os.getenv('RAG_LLM_TEMPERATURE', '0'))
+RAG_EMBEDDING_CACHE = os.getenv('RAG_EMBEDDING_CACHE', '')
+RAG_VECTOR_BACKEND = os.getenv('RAG_VECTOR_BACKEND', 'qdrant')
+RAG_MMAP_PATH = os.getenv('RAG_MMAP_PATH', '')
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
 
@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase
+
+from api.services.page_references import parse_page_references
+
+
+class PageReferenceTests(SimpleTestCase):
+    def assert_reference(self, message: str, pages: list[int], lecture=None, context=None) -> None:
+        reference = parse_page_references(message, context)
+        self.assertEqual(reference.pages, pages)
+        self.assertEqual(reference.lecture, lecture)
+
+    def test_single_slide_with_lecture(self):
+        self.assert_reference("explain slide 12 of lecture 3", [12], lecture=3)
+
+    def test_slide_range(self):
+        self.assert_reference("what is on slides 3-5?", [3, 4, 5])
+
+    def test_page_list(self):
+        self.assert_reference("pages 4, 6 and 7 please", [4, 6, 7])
+
+    def test_no_number_means_no_reference(self):
+        self.assert_reference("explain this slide", [])
+
+    def test_number_not_tied_to_a_slide_is_ignored(self):
+        self.assert_reference("I have 3 pages of notes", [])
+
+    def test_context_fields_are_used_when_message_has_none(self):
+        self.assert_reference("explain this", [7], lecture=2, context={"slide": "7", "lecture": 2})
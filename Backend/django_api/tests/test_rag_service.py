@@ -0,0 +1,224 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from langchain_core.documents import Document
+
+from api.rag_service import RAGService, _retrieval_filters, get_rag_service
+from rag import QueryVectorCache
+
+
+COURSE_CODES = {"Object-Oriented Programming": "CS201", "Data Structures": "CS211"}
+
+
+@override_settings(RAG_COURSE_CODES=COURSE_CODES)
+class RetrievalFilterTests(SimpleTestCase):
+    def test_frontend_subject_is_mapped_to_its_course_code(self):
+        self.assertEqual(_retrieval_filters("Object-Oriented Programming"), {"course": "CS201"})
+        self.assertEqual(_retrieval_filters("Data Structures"), {"course": "CS211"})
+
+    def test_unmapped_subject_is_not_a_filter(self):
+        self.assertEqual(_retrieval_filters("Algorithms"), {})
+        self.assertEqual(_retrieval_filters("General"), {})
+
+    def test_context_names_material_and_pages(self):
+        filters = _retrieval_filters(
+            "Object-Oriented Programming",
+            {"materialId": "lecture-03", "page": ["4", 5], "actionType": "explain"},
+        )
+        self.assertEqual(
+            filters,
+            {"course": "CS201", "material_id": "lecture-03", "page": [3, 4]},
+        )
+
+    def test_file_name_is_matched_by_material_id(self):
+        self.assertEqual(
+            _retrieval_filters("Algorithms", {"file": "Lecture 03 - Inheritance.pdf"}),
+            {"material_id": "lecture-03-inheritance"},
+        )
+
+    def test_context_course_code_overrides_subject(self):
+        self.assertEqual(
+            _retrieval_filters("General", {"courseCode": "MATH101"}),
+            {"course": "MATH101"},
+        )
+
+
+class RetrieveContextTests(SimpleTestCase):
+    def make_service(self, pipeline) -> RAGService:
+        service = RAGService.__new__(RAGService)
+        service._pipeline = pipeline
+        return service
+
+    def test_filters_are_passed_to_the_pipeline(self):
+        pipeline = FakePipeline({"CS201": [Document(page_content="vtables", metadata={"source": "a.pdf", "page": 2})]})
+        context, references = self.make_service(pipeline)._retrieve_context("q", {"course": "CS201"})
+        self.assertIn("vtables", context)
+        self.assertEqual(pipeline.calls, [{"course": "CS201"}])
+        self.assertEqual(references[0]["page"], 2)
+
+    def test_falls_back_to_unfiltered_search_when_filter_matches_nothing(self):
+        pipeline = FakePipeline({None: [Document(page_content="untagged", metadata={"source": "a.pdf"})]})
+        context, _ = self.make_service(pipeline)._retrieve_context("q", {"course": "CS201"})
+        self.assertIn("untagged", context)
+        self.assertEqual(pipeline.calls, [{"course": "CS201"}, None])
+
+
+@override_settings(RAG_COURSE_CODES=COURSE_CODES)
+class LookupPagesTests(SimpleTestCase):
+    def make_service(self, pipeline) -> RAGService:
+        service = RAGService.__new__(RAGService)
+        service._pipeline = pipeline
+        return service
+
+    def test_named_slide_is_fetched_by_filter(self):
+        pipeline = FakePipeline({"CS201": [Document(page_content="slide 12 text", metadata={"page": 11})]})
+        context, _ = self.make_service(pipeline)._lookup_pages("explain slide 12 of lecture 3", "Object-Oriented Programming")
+        self.assertIn("slide 12 text", context)
+        self.assertEqual(pipeline.lookups, [{"course": "CS201", "page": [11], "lecture": 3}])
+        self.assertEqual(pipeline.calls, [])
+
+    def test_named_material_is_enough_to_fetch_a_slide(self):
+        pipeline = FakePipeline({"CS201": [Document(page_content="slide 4 text", metadata={"page": 3})]})
+        context, _ = self.make_service(pipeline)._lookup_pages(
+            "explain slide 4", "Object-Oriented Programming", {"materialId": "lecture-03"}
+        )
+        self.assertIn("slide 4 text", context)
+        self.assertEqual(pipeline.lookups, [{"course": "CS201", "material_id": "lecture-03", "page": [3]}])
+
+    def test_slide_without_lecture_or_material_skips_the_lookup(self):
+        pipeline = FakePipeline({"CS201": [Document(page_content="slide 12 text", metadata={"page": 11})]})
+        self.assertEqual(
+            self.make_service(pipeline)._lookup_pages("explain slide 12", "Object-Oriented Programming"), ("", [])
+        )
+        self.assertEqual(pipeline.lookups, [])
+
+    def test_no_page_reference_skips_the_lookup(self):
+        pipeline = FakePipeline({})
+        self.assertEqual(self.make_service(pipeline)._lookup_pages("explain this slide", "Object-Oriented Programming"), ("", []))
+        self.assertEqual(pipeline.lookups, [])
+
+
+@override_settings(RAG_COURSE_CODES=COURSE_CODES)
+class TopicContextTests(SimpleTestCase):
+    def make_service(self, pipeline) -> RAGService:
+        service = RAGService.__new__(RAGService)
+        service._pipeline = pipeline
+        return service
+
+    def test_topic_chunks_are_used_without_a_search(self):
+        pipeline = FakePipeline({}, topics={
+            "inheritance": [Document(page_content="subclass", metadata={"_id": "a"})],
+            "polymorphism": [Document(page_content="vtable", metadata={"_id": "b"})],
+        })
+        context, references = self.make_service(pipeline)._topic_context(
+            "Object-Oriented Programming", ["inheritance", "polymorphism"], "fallback"
+        )
+        self.assertIn("subclass", context)
+        self.assertIn("vtable", context)
+        self.assertEqual(len(references), 2)
+        self.assertEqual(pipeline.topic_calls, [("inheritance", {"course": "CS201"}), ("polymorphism", {"course": "CS201"})])
+        self.assertEqual(pipeline.calls, [])
+
+    def test_falls_back_to_search_without_a_topic_index(self):
+        pipeline = FakePipeline({"CS201": [Document(page_content="searched", metadata={})]})
+        context, _ = self.make_service(pipeline)._topic_context(
+            "Object-Oriented Programming", ["inheritance"], "Object-Oriented Programming inheritance flashcards"
+        )
+        self.assertIn("searched", context)
+        self.assertEqual(pipeline.calls, [{"course": "CS201"}])
+
+    def test_topics_of_other_courses_are_not_used(self):
+        pipeline = FakePipeline(
+            {"CS201": [Document(page_content="searched", metadata={})]},
+            topics={"inheritance": [Document(page_content="other course", metadata={"_id": "a"})]},
+        )
+        pipeline.topic_documents = lambda topic, filters=None, limit=None: (
+            [] if filters else pipeline.topics.get(topic, [])
+        )
+        context, _ = self.make_service(pipeline)._topic_context(
+            "Object-Oriented Programming", ["inheritance"], "Object-Oriented Programming inheritance flashcards"
+        )
+        self.assertIn("searched", context)
+        self.assertNotIn("other course", context)
+
+
+@override_settings(RAG_COURSE_CODES=COURSE_CODES)
+class SummaryContextTests(SimpleTestCase):
+    def make_service(self, pipeline) -> RAGService:
+        service = RAGService.__new__(RAGService)
+        service._pipeline = pipeline
+        return service
+
+    def test_summaries_for_named_lecture(self):
+        pipeline = FakePipeline({}, summaries=[
+            Document(page_content="Lecture 3 covers vtables.", metadata={"source": "l3.pdf", "page": [0, 1, 2]}),
+        ])
+        context, references = self.make_service(pipeline)._summary_context("summarize lecture 3", "Object-Oriented Programming")
+        self.assertIn("covers vtables", context)
+        self.assertEqual(references[0]["page"], "0-2")
+        self.assertEqual(pipeline.summary_calls, [{"course": "CS201", "lecture": 3}])
+
+    def test_no_summary_tier_returns_nothing(self):
+        pipeline = FakePipeline({})
+        self.assertEqual(self.make_service(pipeline)._summary_context("summarize this", "Object-Oriented Programming"), ("", []))
+        self.assertEqual(pipeline.summary_calls, [{"course": "CS201"}, {}])
+
+
+class HealthStatusTests(SimpleTestCase):
+    def setUp(self):
+        get_rag_service.cache_clear()
+        self.addCleanup(get_rag_service.cache_clear)
+
+    def load_service(self, pipeline) -> RAGService:
+        with mock.patch.object(RAGService, "__init__", lambda service: setattr(service, "_pipeline", pipeline)):
+            return get_rag_service()
+
+    def test_health_does_not_load_the_service(self):
+        self.assertEqual(self.client.get("/api/health/").json(), {"status": "ok"})
+        self.assertEqual(get_rag_service.cache_info().currsize, 0)
+
+    def test_health_reports_query_cache_counters(self):
+        pipeline = FakePipeline({})
+        pipeline.query_cache = QueryVectorCache(max_entries=8)
+        pipeline.query_cache.put("what is a vtable", [0.1], seconds=0.2)
+        pipeline.query_cache.get("what is a vtable")
+        pipeline.query_cache.get("what is a pointer")
+        self.load_service(pipeline)
+
+        stats = self.client.get("/api/health/").json()["query_cache"]
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_health_omits_a_disabled_query_cache(self):
+        self.load_service(FakePipeline({}))
+        self.assertEqual(self.client.get("/api/health/").json(), {"status": "ok"})
+
+
+class FakePipeline:
+    query_cache = None
+
+    def __init__(self, docs_by_course: dict, topics: dict | None = None, summaries: list | None = None):
+        self.docs_by_course = docs_by_course
+        self.topics = topics or {}
+        self.summaries = summaries or []
+        self.summary_calls = []
+        self.calls = []
+        self.lookups = []
+        self.topic_calls = []
+
+    def retrieve(self, question, filters=None):
+        self.calls.append(filters)
+        return self.docs_by_course.get((filters or {}).get("course"), [])
+
+    def lookup(self, filters, limit=50):
+        self.lookups.append(dict(filters))
+        return self.docs_by_course.get(filters.get("course"), [])
+
+    def topic_documents(self, topic, filters=None, limit=None):
+        self.topic_calls.append((topic, filters))
+        return self.topics.get(topic, [])
+
+    def retrieve_summaries(self, question, filters=None, level=None, k=None):
+        self.summary_calls.append(dict(filters or {}))
+        return self.summaries
@@ -1,16 +1,26 @@
 import os
 import argparse
+import hashlib
+import time
 from pathlib import Path
 
 from dotenv import load_dotenv
 
-from rag import RAGPipeline, RAGConfig, PDFDataSource
+from rag import (
+    RAGPipeline,
+    RAGConfig,
+    PDFDataSource,
+    DirectoryDataSource,
+    IngestCheckpoint,
+    PageCache,
+    read_snapshot_manifest,
+)
 
 
 load_dotenv(Path(__file__).resolve().parents[1] / "Backend" / "django_api" / ".env")
 
 
-def parse_args() -> tuple[list[str], str | None]:
+def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Ingest one or more PDFs into a Qdrant collection."
     )
@@ -25,11 +35,233 @@ def parse_args() -> tuple[list[str], str | None]:
         dest="collection",
         help="Override the Qdrant collection name.",
     )
+    parser.add_argument(
+        "--course",
+        default=os.getenv("RAG_COURSE_CODE"),
+        help="Course code stored with every chunk (e.g. CS201), used to filter retrieval by course.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=64,
+        help="Number of chunks per embedding request / Qdrant upsert.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of embedding batches to run concurrently.",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=int,
+        default=int(os.getenv("RAG_EMBEDDING_RPM", "3000")),
+        help="Embedding requests-per-minute budget (0 = unlimited).",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=int,
+        default=int(os.getenv("RAG_EMBEDDING_TPM", "1000000")),
+        help="Embedding tokens-per-minute budget (0 = unlimited).",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes used to extract PDF text (1 = parse in-process).",
+    )
+    parser.add_argument(
+        "--embedding-cache",
+        default=os.getenv(
+            "RAG_EMBEDDING_CACHE",
+            str(Path(__file__).resolve().parent / ".cache" / "embeddings.sqlite"),
+        ),
+        help="SQLite file used to cache embeddings between runs.",
+    )
+    parser.add_argument(
+        "--page-cache",
+        default=str(Path(__file__).resolve().parent / ".cache" / "pages"),
+        help="Directory of cached extracted PDF pages, reused when only chunking settings change.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disable the embedding and page caches for this run.",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help=(
+            "Sync a directory with the collection: ingest only new or changed PDFs "
+            "and delete the chunks of changed or removed ones."
+        ),
+    )
+    parser.add_argument(
+        "--copy-from",
+        metavar="SOURCE_COLLECTION",
+        help=(
+            "Copy SOURCE_COLLECTION (stored vectors and payloads) into the collection given "
+            "with -c instead of ingesting PDFs. No embedding calls are made."
+        ),
+    )
+    parser.add_argument(
+        "--quantization",
+        choices=["scalar", "binary"],
+        default=os.getenv("RAG_QUANTIZATION") or None,
+        help="Quantize vectors in newly created collections (scalar = int8, binary = 1 bit).",
+    )
+    parser.add_argument(
+        "--on-disk",
+        action="store_true",
+        help="Store original vectors and payloads of newly created collections on disk.",
+    )
+    parser.add_argument(
+        "--search-dim",
+        type=int,
+        default=int(os.getenv("RAG_EMBEDDING_SEARCH_DIM", "0")) or None,
+        help=(
+            "Also store SEARCH_DIM-long (e.g. 256) embeddings in newly created collections, "
+            "search those first and rescore with the full vectors."
+        ),
+    )
+    parser.add_argument(
+        "--embedding-backend",
+        choices=["openai", "fastembed"],
+        default=os.getenv("RAG_EMBEDDING_BACKEND", "openai"),
+        help="Embed with the OpenAI API or locally with fastembed (ONNX, no API calls).",
+    )
+    parser.add_argument(
+        "--embedding-model",
+        default=os.getenv("RAG_EMBEDDING_MODEL") or None,
+        help="Embedding model, e.g. BAAI/bge-small-en-v1.5 with --embedding-backend fastembed.",
+    )
+    parser.add_argument(
+        "--embedding-dim",
+        type=int,
+        default=int(os.getenv("RAG_EMBEDDING_DIM", "0")) or None,
+        help="Dimension of the embedding model's vectors (e.g. 384 for bge-small).",
+    )
+    parser.add_argument(
+        "--embedding-threads",
+        type=int,
+        default=int(os.getenv("RAG_EMBEDDING_THREADS", "0")) or None,
+        help="ONNX Runtime threads for --embedding-backend fastembed (default: all cores).",
+    )
+    parser.add_argument(
+        "--sparse-model",
+        default=os.getenv("RAG_SPARSE_MODEL") or None,
+        help=(
+            "Also store sparse vectors from this fastembed model (e.g. Qdrant/bm25) in newly "
+            "created collections, for hybrid dense + keyword retrieval."
+        ),
+    )
+    parser.add_argument(
+        "--child-chunk-size",
+        type=int,
+        default=None,
+        help=(
+            "Index small non-overlapping chunks of this size (e.g. 250); each search hit "
+            "is returned with its neighbouring chunks as context."
+        ),
+    )
+    parser.add_argument(
+        "--neighbor-window",
+        type=int,
+        default=2,
+        help="Neighbouring chunks returned on each side of a hit with --child-chunk-size (default: 2).",
+    )
+    parser.add_argument(
+        "--topics",
+        metavar="K",
+        type=int,
+        default=int(os.getenv("RAG_TOPIC_CLUSTERS", "0")),
+        help=(
+            "Cluster the collection into K topics for flashcards and study plans: on a "
+            "rebuild or a collection without topics; other runs assign new chunks to the "
+            "nearest topic. Without PDF paths, the existing collection is re-clustered."
+        ),
+    )
+    parser.add_argument(
+        "--summaries",
+        metavar="PAGES",
+        type=int,
+        default=int(os.getenv("RAG_SUMMARY_PAGES", "0")),
+        help=(
+            "Keep a summary tier: one LLM summary per PAGES consecutive pages and per document, "
+            "embedded for the summarization route. Only changed pages are re-summarized. "
+            "Without PDF paths, only the summaries are updated."
+        ),
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help=(
+            "Rebuild the collection from scratch into a new version and switch the "
+            "collection alias to it when done; queries keep using the old version meanwhile."
+        ),
+    )
+    parser.add_argument(
+        "--replace-legacy-collection",
+        action="store_true",
+        help=(
+            "With --rebuild: if -c names a plain collection from before aliases, delete it and "
+            "create the alias in its place. Queries fail for the moment in between (one-time migration)."
+        ),
+    )
+    parser.add_argument(
+        "--export-mmap",
+        metavar="DIR",
+        help=(
+            "Export the collection to DIR for the memory-mapped backend "
+            "(RAG_VECTOR_BACKEND=mmap, RAG_MMAP_PATH=DIR). Without PDF paths, "
+            "only the export runs."
+        ),
+    )
+    parser.add_argument(
+        "--mmap-dtype",
+        choices=["float16", "int8"],
+        default="float16",
+        help="Vector precision of the --export-mmap matrix.",
+    )
+    parser.add_argument(
+        "--export-snapshot",
+        metavar="FILE",
+        help=(
+            "Write the collection (ids, vectors, payloads, config) to a portable "
+            "snapshot FILE. Without PDF paths, only the export runs."
+        ),
+    )
+    parser.add_argument(
+        "--import-snapshot",
+        metavar="FILE",
+        help=(
+            "Load a snapshot FILE into the collection (-c, default: the exported name), "
+            "or into RAG_MMAP_PATH when RAG_VECTOR_BACKEND=mmap. No embedding calls are made."
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from its last committed batch.",
+    )
     args = parser.parse_args()
 
     paths = list(args.paths)
     collection_name = args.collection
 
+    if args.rebuild and (args.sync or args.resume):
+        raise SystemExit("--rebuild cannot be combined with --sync or --resume.")
+    if args.replace_legacy_collection and not args.rebuild:
+        raise SystemExit("--replace-legacy-collection only applies to --rebuild.")
+
+    if args.copy_from:
+        if not collection_name:
+            raise SystemExit("--copy-from needs a target collection (-c).")
+        return args
+
+    if args.import_snapshot or ((args.export_mmap or args.export_snapshot or args.topics or args.summaries) and not paths):
+        return args
+
     if not paths:
         pdf_path = os.getenv("PDF_PATH")
         if pdf_path:
@@ -49,22 +281,15 @@ def parse_args() -> tuple[list[str], str | None]:
         if not last.is_file() and not last_text.endswith(".pdf"):
             collection_name = paths.pop()
 
-    return paths, collection_name
-
-cfg = RAGConfig(
-    qdrant_url=os.getenv("QDRANT_URL"),
-    qdrant_api_key=os.getenv("QDRANT_API_KEY"),
-    qdrant_collection=os.getenv("QDRANT_COLLECTION", "OOP_COURSE_MATERIAL"),
-    chunk_size=1000,
-    chunk_overlap=200,
-)
+    args.paths = paths
+    args.collection = collection_name
+    return args
 
-pdf_paths, collection_name = parse_args()
 
 def resolve_pdf_path(raw_path: str) -> str:
-    """Resolve relative PDF paths against common project locations."""
+    """Resolve relative PDF paths (or a directory) against common project locations."""
     candidate = Path(raw_path).expanduser()
-    if candidate.is_file():
+    if candidate.is_file() or candidate.is_dir():
         return str(candidate.resolve())
 
     script_dir = Path(__file__).resolve().parent
@@ -82,16 +307,168 @@ def resolve_pdf_path(raw_path: str) -> str:
         f"Tried: {candidate}, {fallback_paths[0]}, {fallback_paths[1]}"
     )
 
-resolved_paths = [resolve_pdf_path(path) for path in pdf_paths]
 
-if not collection_name:
-    collection_name = Path(resolved_paths[0]).stem
+class ProgressReporter:
+    """Print chunks/sec and an ETA (based on PDF pages) as batches are committed."""
+
+    def __init__(self, files: list[str], interval: float = 2.0):
+        self.total_pages = self._count_pages(files)
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.last_print = 0.0
+        self.chunks = 0
+        self.pages: set[tuple[str, object]] = set()
+
+    @staticmethod
+    def _count_pages(files: list[str]) -> int:
+        import pypdf
+
+        total = 0
+        for path in files:
+            if path.lower().endswith(".pdf"):
+                try:
+                    total += len(pypdf.PdfReader(path).pages)
+                except Exception:
+                    pass
+        return total
+
+    def __call__(self, batch) -> None:
+        self.chunks += len(batch)
+        for doc in batch:
+            self.pages.add((doc.metadata.get("source"), doc.metadata.get("page")))
+
+        now = time.perf_counter()
+        if now - self.last_print < self.interval:
+            return
+        self.last_print = now
+
+        elapsed = now - self.started
+        rate = self.chunks / elapsed if elapsed else 0.0
+        line = f"  … {self.chunks} chunks | {rate:.1f} chunks/s"
+        done = len(self.pages)
+        if self.total_pages and done:
+            remaining = max(self.total_pages - done, 0)
+            eta = elapsed * remaining / done
+            line += f" | {done}/{self.total_pages} pages | ETA {int(eta // 60)}m{int(eta % 60):02d}s"
+        print(line, flush=True)
+
+
+def checkpoint_path(collection: str, paths: list[str]) -> Path:
+    """One checkpoint per (collection, input set), so unrelated runs never collide."""
+    key = hashlib.sha256("\n".join(sorted(paths)).encode("utf-8")).hexdigest()[:12]
+    return Path(__file__).resolve().parent / ".cache" / "checkpoints" / f"{collection}-{key}.json"
+
+
+def export(pipeline: RAGPipeline, args: argparse.Namespace) -> None:
+    """Run the --export-snapshot / --export-mmap steps requested on the command line."""
+    if args.export_snapshot:
+        pipeline.export_snapshot(args.export_snapshot)
+    if args.export_mmap:
+        pipeline.export_mmap(args.export_mmap, args.mmap_dtype)
+
+
+def main() -> None:
+    cfg = RAGConfig(
+        qdrant_url=os.getenv("QDRANT_URL"),
+        qdrant_api_key=os.getenv("QDRANT_API_KEY"),
+        qdrant_collection=os.getenv("QDRANT_COLLECTION", "OOP_COURSE_MATERIAL"),
+        chunk_size=1000,
+        chunk_overlap=200,
+    )
+
+    args = parse_args()
+    pdf_paths, collection_name = args.paths, args.collection
+    cfg.ingest_batch_size = args.batch_size
+    cfg.ingest_workers = args.workers
+    cfg.embedding_rpm = args.rpm
+    cfg.embedding_tpm = args.tpm
+    cfg.embedding_cache_path = None if args.no_cache else args.embedding_cache
+    cfg.manifest_dir = str(Path(__file__).resolve().parent / ".cache" / "manifests")
+    cfg.quantization = args.quantization
+    cfg.vectors_on_disk = cfg.payload_on_disk = args.on_disk
+    cfg.embedding_search_dim = args.search_dim
+    cfg.sparse_model = args.sparse_model
+    cfg.embedding_backend = args.embedding_backend
+    cfg.embedding_model = args.embedding_model or cfg.embedding_model
+    cfg.embedding_dim = args.embedding_dim or cfg.embedding_dim
+    cfg.embedding_threads = args.embedding_threads
+    cfg.course_code = args.course
+    cfg.child_chunk_size = args.child_chunk_size
+    cfg.neighbor_window = args.neighbor_window
+    cfg.topic_clusters = args.topics
+    cfg.summary_pages = args.summaries
+    cfg.replace_legacy_collection = args.replace_legacy_collection
+
+    if args.import_snapshot:
+        cfg.qdrant_collection = collection_name or read_snapshot_manifest(args.import_snapshot)["collection"]
+        cfg.vector_backend = os.getenv("RAG_VECTOR_BACKEND", "qdrant")
+        cfg.mmap_path = os.getenv("RAG_MMAP_PATH") or None
+        cfg.mmap_dtype = args.mmap_dtype
+        RAGPipeline(config=cfg).import_snapshot(args.import_snapshot)
+        return
+
+    if args.copy_from:
+        cfg.qdrant_collection = collection_name
+        pipeline = RAGPipeline(config=cfg).copy_from(args.copy_from, workers=args.workers)
+        export(pipeline, args)
+        return
+
+    if not pdf_paths:
+        if collection_name:
+            cfg.qdrant_collection = collection_name
+        pipeline = RAGPipeline(config=cfg)
+        if args.topics:
+            pipeline.build_topics()
+        if args.summaries:
+            pipeline.build_summaries()
+        export(pipeline, args)
+        return
+
+    resolved_paths = [resolve_pdf_path(path) for path in pdf_paths]
+
+    if not collection_name:
+        collection_name = Path(resolved_paths[0]).stem
+
+    if collection_name:
+        cfg.qdrant_collection = collection_name
+
+    page_cache = None if args.no_cache else PageCache(args.page_cache)
+    directories = [path for path in resolved_paths if Path(path).is_dir()]
+    if directories:
+        if len(resolved_paths) != 1:
+            raise SystemExit("Pass either a single directory or one or more PDF files, not both.")
+        source = DirectoryDataSource(directories[0], workers=args.parse_workers, page_cache=page_cache)
+    elif args.sync:
+        raise SystemExit("--sync needs a directory path.")
+    else:
+        source = PDFDataSource(resolved_paths, workers=args.parse_workers, page_cache=page_cache)
+
+    pipeline = RAGPipeline(source, config=cfg)
+    if args.sync:
+        pipeline.sync()
+    elif args.rebuild:
+        pipeline.build()
+    else:
+        checkpoint = IngestCheckpoint.load(
+            str(checkpoint_path(cfg.qdrant_collection, source.files())), cfg
+        )
+        if not args.resume:
+            checkpoint.committed, checkpoint.completed = {}, []
+        elif checkpoint.is_empty:
+            print("No checkpoint found for this input; starting from the beginning.")
+        pipeline.build_incremental(
+            checkpoint=checkpoint,
+            on_commit=ProgressReporter(
+                [path for path in source.files() if path not in checkpoint.completed]
+            ),
+        )
+        checkpoint.clear()
 
-if collection_name:
-    cfg.qdrant_collection = collection_name
+    export(pipeline, args)
 
-source = PDFDataSource(resolved_paths)
+    print("Ingestion complete. Your vectors are stored in Qdrant.")
 
-RAGPipeline(source, config=cfg).build_incremental()
 
-print("Ingestion complete. Your vectors are stored in Qdrant.")
+# The guard matters: PDF parsing may run in worker processes, which re-import this module.
+if __name__ == "__main__":
+    main()
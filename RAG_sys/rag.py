@@ -6,19 +6,75 @@ Vectorstore: Qdrant (local in-memory, local on-disk, or remote cluster).
 Swap in any DataSource (PDF, Qdrant collection, API, etc.) via the abstract interface.
 """
 
+import gzip
+import hashlib
+import io
+import json
+import math
+import mmap
 import os
+import random
 import re
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+from array import array
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Optional
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
 
+import numpy as np
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    Fusion,
+    FusionQuery,
+    HnswConfigDiff,
+    IsEmptyCondition,
+    MatchAny,
+    MatchValue,
+    Modifier,
+    PayloadField,
+    PayloadSchemaType,
+    PointStruct,
+    Prefetch,
+    QuantizationSearchParams,
+    QueryRequest,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SparseVector,
+    SparseVectorParams,
+    VectorParams,
+)
 
 
 # ---------------------------------------------------------------------------
@@ -32,14 +88,100 @@ class RAGConfig:
     chunk_size: int = 1000
     chunk_overlap: int = 200
 
+    # Sentence-window mode — when `child_chunk_size` is set, pages are cut into
+    # small chunks of that size with no overlap, and each chunk stores the ids of
+    # the `neighbor_window` chunks on either side. retrieve() matches on the small
+    # chunks and returns each hit with its neighbours' text, fetched by id in one
+    # batched lookup. Nothing is stored or embedded twice.
+    child_chunk_size: Optional[int] = None
+    neighbor_window: int = 2
+
     # Retrieval
     top_k: int = 3
 
+    # Course code written into every ingested chunk's metadata as `course`
+    # (see FILTER_FIELDS); retrieve(filters={"course": ...}) searches only it.
+    course_code: Optional[str] = os.getenv("RAG_COURSE_CODE") or None
+
+    # Search-time index parameters (None = Qdrant's defaults). `search_hnsw_ef`
+    # trades latency for recall; on a quantized collection (whatever its
+    # `quantization` was created with), `search_oversampling` fetches that many
+    # times top_k candidates and `search_rescore` re-ranks them with the
+    # original vectors.
+    search_hnsw_ef: Optional[int] = int(os.getenv("RAG_SEARCH_HNSW_EF", "0")) or None
+    search_oversampling: Optional[float] = float(os.getenv("RAG_SEARCH_OVERSAMPLING", "0")) or None
+    search_rescore: bool = os.getenv("RAG_SEARCH_RESCORE", "1") != "0"
+
+    # Ingestion — chunks are embedded in batches of `ingest_batch_size`, with up to
+    # `ingest_workers` embedding requests in flight while finished batches are upserted.
+    ingest_batch_size: int = 64
+    ingest_workers: int = 4
+
     # OpenAI
     embedding_model: str = "text-embedding-3-small"
     embedding_dim: int = 1536        
+    # Embedding backend — "openai" calls the embeddings API; "fastembed" runs
+    # `embedding_model` (e.g. "BAAI/bge-small-en-v1.5" with embedding_dim=384)
+    # locally on ONNX Runtime, so queries make no network round trip.
+    # `embedding_batch_size` / `embedding_threads` tune local throughput. The
+    # backend and model are recorded on every collection and export, and a
+    # pipeline configured for a different one is refused.
+    embedding_backend: str = os.getenv("RAG_EMBEDDING_BACKEND", "openai")
+    embedding_batch_size: int = 256
+    embedding_threads: Optional[int] = int(os.getenv("RAG_EMBEDDING_THREADS", "0")) or None
+    # Matryoshka search — when set (e.g. 256 or 512), new collections also store
+    # the first `embedding_search_dim` components of each embedding, renormalised,
+    # and search them first; the best `rescore_candidates` are then re-ranked with
+    # the full vectors, which are kept on disk without an HNSW index. Every
+    # vector search of the pipeline takes this route; only measure_recall()'s
+    # exact baseline scans the full vectors.
+    embedding_search_dim: Optional[int] = int(os.getenv("RAG_EMBEDDING_SEARCH_DIM", "0")) or None
+    rescore_candidates: int = 50
+
+    # Hybrid retrieval — when set (e.g. "Qdrant/bm25", or a SPLADE model such as
+    # "prithivida/Splade_PP_en_v1"), new collections also store a sparse vector per
+    # chunk, computed locally with fastembed, and retrieval fuses the sparse and
+    # dense result lists (`hybrid_candidates` from each) with reciprocal rank
+    # fusion in one Qdrant query. The model is recorded on the collection, and
+    # queries use the recorded one.
+    sparse_model: Optional[str] = os.getenv("RAG_SPARSE_MODEL") or None
+    hybrid_candidates: int = 20
+
+    # Reranking — when set (e.g. "Xenova/ms-marco-MiniLM-L-6-v2"), retrieve()
+    # fetches `rerank_candidates` chunks, scores them against the question with
+    # this local cross-encoder (fastembed, CPU) in one batched call and keeps the
+    # best top_k. A call that takes longer than `rerank_timeout` seconds is
+    # abandoned and the vector-search order is used instead.
+    rerank_model: Optional[str] = os.getenv("RAG_RERANK_MODEL") or None
+    rerank_candidates: int = int(os.getenv("RAG_RERANK_CANDIDATES", "20"))
+    rerank_timeout: float = float(os.getenv("RAG_RERANK_TIMEOUT", "0.5"))
     llm_model: str = "gpt-5.4-mini"
     llm_temperature: float = 0.0
+    # query_many() answers at most this many questions at once.
+    llm_max_concurrency: int = int(os.getenv("RAG_LLM_MAX_CONCURRENCY", "4"))
+
+    # Embedding cache — SQLite file shared by ingestion and query embedding.
+    # Entries are keyed by (embedding_model, embedding_dim, sha256(text)); None disables it.
+    embedding_cache_path: Optional[str] = os.getenv("RAG_EMBEDDING_CACHE") or None
+    embedding_cache_max_entries: int = 50_000
+
+    # Query-vector cache — an in-process LRU in front of every query embedding:
+    # up to `query_cache_size` normalized questions, each kept `query_cache_ttl`
+    # seconds. Repeated questions skip the embedding call. 0 disables it.
+    query_cache_size: int = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+    query_cache_ttl: float = float(os.getenv("RAG_QUERY_CACHE_TTL", "3600"))
+
+    # Embedding rate limits — one scheduler per process enforces them for every
+    # pipeline using the same budget; 0 disables a budget. Set embedding_api_base
+    # to point the embeddings client at another endpoint (e.g. a local stub).
+    embedding_rpm: int = int(os.getenv("RAG_EMBEDDING_RPM", "3000"))
+    embedding_tpm: int = int(os.getenv("RAG_EMBEDDING_TPM", "1000000"))
+    embedding_max_concurrency: int = 8
+    embedding_max_retries: int = 6
+    embedding_api_base: Optional[str] = os.getenv("RAG_EMBEDDING_API_BASE") or None
+    # Seconds before one embeddings request is abandoned and retried by the
+    # scheduler (the OpenAI client would otherwise wait up to 600 s).
+    embedding_request_timeout: float = float(os.getenv("RAG_EMBEDDING_TIMEOUT", "30"))
 
     # Qdrant connection — pick ONE mode:
     #   • In-memory (default, no setup needed):  qdrant_location=":memory:"
@@ -51,6 +193,56 @@ class RAGConfig:
     qdrant_api_key: Optional[str] = os.getenv("QDRANT_API_KEY") or None
     qdrant_collection: str = os.getenv("QDRANT_COLLECTION", "OOP_COURSE_MATERIAL")
 
+    # Directory for per-collection sync manifests used by RAGPipeline.sync()
+    manifest_dir: str = os.getenv("RAG_MANIFEST_DIR", ".rag_manifests")
+
+    # Collection layout — applied when a collection is created (build(), a missing
+    # collection in build_incremental()/sync(), or the target of copy_from()).
+    #   quantization:      None, "scalar" (int8, ~4x smaller) or "binary" (~32x smaller)
+    #   vectors_on_disk:   keep original vectors on disk (quantized ones stay in RAM)
+    #   payload_on_disk:   keep chunk text and metadata on disk
+    #   hnsw_m / hnsw_ef_construct: HNSW graph degree / build-time beam (None = default)
+    quantization: Optional[str] = os.getenv("RAG_QUANTIZATION") or None
+    vectors_on_disk: bool = False
+    payload_on_disk: bool = False
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construct: Optional[int] = None
+
+    # Vector backend used by use_existing():
+    #   "qdrant" — query the Qdrant collection (default)
+    #   "mmap"   — search a read-only memory-mapped export of it at `mmap_path`
+    #              (see RAGPipeline.export_mmap()); every worker process on a host
+    #              shares the same pages, and no Qdrant server is needed to serve.
+    vector_backend: str = os.getenv("RAG_VECTOR_BACKEND", "qdrant")
+    mmap_path: Optional[str] = os.getenv("RAG_MMAP_PATH") or None
+    mmap_dtype: str = "float16"       # "float16" or "int8" (per-row scaled)
+
+    # Blue/green rebuilds — build() fills "<collection>__v<timestamp>" and then
+    # points the alias `qdrant_collection` at it; older versions beyond
+    # `keep_versions` (including the live one) are deleted.
+    keep_versions: int = 2
+    # A deployment from before aliases has a plain collection named
+    # `qdrant_collection`. It must be deleted before the alias can take the
+    # name, and readers get nothing for that moment, so build() refuses unless
+    # this is set (one-time migration).
+    replace_legacy_collection: bool = False
+
+    # Topic clusters — with `topic_clusters` > 0, build() / sync() / copy_from()
+    # cluster the chunk embeddings into that many topics (k-means, no embedding
+    # calls) and store each chunk's topic id, the centroids and the
+    # `topic_representatives` most central chunks per topic. topic_documents()
+    # then serves flashcards and study plans from a topic without a vector search.
+    topic_clusters: int = int(os.getenv("RAG_TOPIC_CLUSTERS", "0"))
+    topic_representatives: int = 20
+
+    # Summary tier — with `summary_pages` > 0, build() / sync() / copy_from() also
+    # summarize every `summary_pages` consecutive pages and every whole document
+    # with `summary_model` (default: llm_model), embedded into their own collection
+    # (see build_summary_index()). Unchanged pages keep their summaries.
+    summary_pages: int = int(os.getenv("RAG_SUMMARY_PAGES", "0"))
+    summary_model: Optional[str] = os.getenv("RAG_SUMMARY_MODEL") or None
+    summary_workers: int = 4
+
 
 # ---------------------------------------------------------------------------
 # Abstract DataSource — implement this to plug in any backend
@@ -60,6 +252,10 @@ class DataSource(ABC):
     """
     Override `load()` to feed documents from any origin:
     PDFs, a Qdrant collection, an API, a directory of files, etc.
+
+    Sources that can produce documents one at a time should also override
+    `iter_load()`; the ingestion pipeline consumes it lazily so memory use
+    does not grow with the size of the source.
     """
 
     @abstractmethod
@@ -67,41 +263,291 @@ class DataSource(ABC):
         """Return a list of LangChain Document objects."""
         ...
 
+    def iter_load(self) -> Iterator[Document]:
+        """Yield Documents one at a time. Defaults to iterating over `load()`."""
+        yield from self.load()
+
     def description(self) -> str:
         return self.__class__.__name__
 
 
+# ---------------------------------------------------------------------------
+# Parallel PDF parsing
+# ---------------------------------------------------------------------------
+
+def _pdf_base_metadata(reader, path: str) -> dict:
+    """Document-level metadata in the same shape PyPDFLoader produces."""
+    metadata = {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+    for key, value in (reader.metadata or {}).items():
+        if not isinstance(value, str):
+            continue
+        key = key.lstrip("/").lower()
+        if key in ("creationdate", "moddate") and value.startswith("D:"):
+            try:
+                value = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat()
+            except ValueError:
+                pass
+        metadata[key] = value
+    metadata["source"] = path
+    metadata["total_pages"] = len(reader.pages)
+    return metadata
+
+
+def _parse_pdf_range(path: str, start: int, stop: int) -> list[Document]:
+    """Extract pages [start, stop) of one PDF. Runs inside a worker process."""
+    import pypdf
+
+    reader = pypdf.PdfReader(path)
+    base = _pdf_base_metadata(reader, path)
+    docs = []
+    for page_number in range(start, min(stop, len(reader.pages))):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain").strip()
+        docs.append(Document(
+            page_content=text,
+            metadata=base | {"page": page_number, "page_label": reader.page_labels[page_number]},
+        ))
+    return docs
+
+
+def iter_parse_pdfs(paths: list[str], workers: int, pages_per_task: int = 32) -> Iterator[Document]:
+    """
+    Parse PDFs in a process pool and yield their pages in (file, page) order.
+
+    Each file is split into tasks of `pages_per_task` pages, so one large
+    lecture deck is spread over several processes. Results are yielded in
+    submission order and at most 2 * workers tasks are in flight.
+    """
+    import pypdf
+
+    tasks = []
+    for path in paths:
+        page_count = len(pypdf.PdfReader(path).pages)
+        for start in range(0, page_count, max(1, pages_per_task)):
+            tasks.append((path, start, start + pages_per_task))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque[Future] = deque()
+        for task in tasks:
+            pending.append(pool.submit(_parse_pdf_range, *task))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+# ---------------------------------------------------------------------------
+# Parsed-page cache
+# ---------------------------------------------------------------------------
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _pdf_parser_version() -> str:
+    import langchain_community
+    import pypdf
+    # Single-process parsing goes through langchain_community's PyPDFLoader,
+    # so its version shapes the pages too. Bump the suffix whenever page
+    # extraction or metadata shaping changes here.
+    return f"pypdf-{pypdf.__version__}-lc-{langchain_community.__version__}-plain-1"
+
+
+class PageCache:
+    """
+    On-disk cache of extracted PDF pages, one gzip-compressed JSON file per
+    (file content hash, parser version). Lets re-chunking experiments skip
+    text extraction entirely. The `source` metadata is not stored; it is
+    filled in from the path being loaded, so moved files still hit.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}-{_pdf_parser_version()}.json.gz")
+
+    def contains(self, content_hash: str) -> bool:
+        """Whether pages for this content are cached, without reading them (an absent one counts as a miss)."""
+        if os.path.exists(self._entry_path(content_hash)):
+            return True
+        self.misses += 1
+        return False
+
+    def get(self, path: str, content_hash: str) -> Optional[list[Document]]:
+        entry = self._entry_path(content_hash)
+        if not os.path.exists(entry):
+            self.misses += 1
+            return None
+        with gzip.open(entry, "rt", encoding="utf-8") as f:
+            pages = json.load(f)
+        self.hits += 1
+        return [
+            Document(page_content=page["text"], metadata=page["metadata"] | {"source": path})
+            for page in pages
+        ]
+
+    def put(self, content_hash: str, docs: list[Document]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        entry = self._entry_path(content_hash)
+        pages = [
+            {
+                "text": doc.page_content,
+                "metadata": {k: v for k, v in doc.metadata.items() if k != "source"},
+            }
+            for doc in docs
+        ]
+        tmp_path = f"{entry}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, entry)
+
+
 # ---------------------------------------------------------------------------
 # Built-in DataSource implementations
 # ---------------------------------------------------------------------------
 
 class PDFDataSource(DataSource):
-    """Load one or more PDF files."""
+    """
+    Load one or more PDF files.
+
+    With `workers > 1`, text extraction runs in a process pool (see
+    `iter_parse_pdfs`); pages still come out in file and page order.
+    With a `page_cache`, files whose content was parsed before are served
+    from the cache and only the others are parsed.
+    """
 
-    def __init__(self, paths: str | list[str]):
+    def __init__(
+        self,
+        paths: str | list[str],
+        workers: int = 1,
+        pages_per_task: int = 32,
+        page_cache: Optional[PageCache] = None,
+    ):
         self.paths = [paths] if isinstance(paths, str) else paths
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.page_cache = page_cache
+
+    def files(self) -> list[str]:
+        return list(self.paths)
+
+    def for_files(self, files: list[str]) -> "PDFDataSource":
+        return PDFDataSource(list(files), self.workers, self.pages_per_task, self.page_cache)
 
     def load(self) -> list[Document]:
-        from langchain_community.document_loaders import PyPDFLoader
-        docs = []
+        return list(self.iter_load())
+
+    def iter_load(self) -> Iterator[Document]:
+        if self.page_cache is None:
+            yield from self._parse(self.paths)
+            return
+
+        # Only hashes are computed up front; a cached file's pages are read
+        # when its turn comes, so at most one file is held in memory.
+        hashes = {path: file_sha256(path) for path in self.paths}
+        uncached = {path for path in self.paths if not self.page_cache.contains(hashes[path])}
+        parsed = self._parse([path for path in self.paths if path in uncached])
+        lookahead: Optional[Document] = next(parsed, None)
+
         for path in self.paths:
-            docs.extend(PyPDFLoader(path).load())
-        return docs
+            if path not in uncached:
+                pages = self.page_cache.get(path, hashes[path])
+                if pages is None:
+                    # Evicted since the check above: parse this file on its own.
+                    pages = list(self._parse([path]))
+                    self.page_cache.put(hashes[path], pages)
+                yield from pages
+                continue
+            # Parsed pages arrive in the same file order; take this file's run.
+            pages = []
+            while (
+                lookahead is not None
+                and lookahead.metadata.get("source") == path
+                and len(pages) < lookahead.metadata.get("total_pages", float("inf"))
+            ):
+                pages.append(lookahead)
+                yield lookahead
+                lookahead = next(parsed, None)
+            self.page_cache.put(hashes[path], pages)
+
+    def _parse(self, paths: list[str]) -> Iterator[Document]:
+        if self.workers > 1:
+            yield from iter_parse_pdfs(paths, self.workers, self.pages_per_task)
+            return
+        from langchain_community.document_loaders import PyPDFLoader
+        for path in paths:
+            yield from PyPDFLoader(path).lazy_load()
 
     def description(self) -> str:
         return f"PDFs: {self.paths}"
 
 
 class DirectoryDataSource(DataSource):
-    """Load all supported files from a directory."""
+    """
+    Load all supported files from a directory.
+
+    PDFs are parsed like PDFDataSource (in a process pool when
+    `workers > 1`), in sorted path order; any other matching files go
+    through UnstructuredFileLoader afterwards.
 
-    def __init__(self, directory: str, glob: str = "**/*.pdf"):
+    `files()` / `for_files()` let RAGPipeline.sync() ingest only the files
+    that changed since the last run.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        glob: str = "**/*.pdf",
+        workers: int = 1,
+        pages_per_task: int = 32,
+        include: Optional[list[str]] = None,
+        page_cache: Optional[PageCache] = None,
+    ):
         self.directory = directory
         self.glob = glob
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.include = include
+        self.page_cache = page_cache
+
+    def files(self) -> list[str]:
+        """Sorted paths of the files this source will load."""
+        matches = sorted(str(p) for p in Path(self.directory).glob(self.glob) if p.is_file())
+        if self.include is not None:
+            allowed = set(self.include)
+            matches = [path for path in matches if path in allowed]
+        return matches
+
+    def for_files(self, files: list[str]) -> "DirectoryDataSource":
+        """A copy of this source restricted to `files` (a subset of `files()`)."""
+        return DirectoryDataSource(
+            self.directory,
+            self.glob,
+            self.workers,
+            self.pages_per_task,
+            include=list(files),
+            page_cache=self.page_cache,
+        )
 
     def load(self) -> list[Document]:
-        from langchain_community.document_loaders import DirectoryLoader
-        return DirectoryLoader(self.directory, glob=self.glob).load()
+        return list(self.iter_load())
+
+    def iter_load(self) -> Iterator[Document]:
+        files = self.files()
+        pdfs = [path for path in files if path.lower().endswith(".pdf")]
+        yield from PDFDataSource(pdfs, self.workers, self.pages_per_task, self.page_cache).iter_load()
+
+        others = [path for path in files if not path.lower().endswith(".pdf")]
+        if others:
+            from langchain_community.document_loaders import UnstructuredFileLoader
+            for path in others:
+                yield from UnstructuredFileLoader(path).lazy_load()
 
     def description(self) -> str:
         return f"Directory: {self.directory} ({self.glob})"
@@ -124,10 +570,11 @@ class RawTextDataSource(DataSource):
         self.metadatas = metadatas or [{} for _ in texts]
 
     def load(self) -> list[Document]:
-        return [
-            Document(page_content=t, metadata=m)
-            for t, m in zip(self.texts, self.metadatas)
-        ]
+        return list(self.iter_load())
+
+    def iter_load(self) -> Iterator[Document]:
+        for t, m in zip(self.texts, self.metadatas):
+            yield Document(page_content=t, metadata=m)
 
 
 class QdrantDataSource(DataSource):
@@ -144,6 +591,10 @@ class QdrantDataSource(DataSource):
         collection:      Name of the Qdrant collection to read from.
         text_field:      Payload key that holds the document text (default: "page_content").
         metadata_fields: Payload keys to include in Document.metadata (None = all).
+        page_size:       Points fetched per scroll request.
+
+    To copy a collection without re-embedding it, use copy_collection() or
+    RAGPipeline.copy_from() instead — they reuse the stored vectors.
     """
 
     def __init__(
@@ -152,20 +603,24 @@ class QdrantDataSource(DataSource):
         collection: str,
         text_field: str = "page_content",
         metadata_fields: Optional[list[str]] = None,
+        page_size: int = 1000,
     ):
         self.client = client
         self.collection = collection
         self.text_field = text_field
         self.metadata_fields = metadata_fields
+        self.page_size = page_size
 
     def load(self) -> list[Document]:
-        docs = []
+        return list(self.iter_load())
+
+    def iter_load(self) -> Iterator[Document]:
         offset = None
         while True:
             results, next_offset = self.client.scroll(
                 collection_name=self.collection,
                 offset=offset,
-                limit=100,
+                limit=self.page_size,
                 with_payload=True,
                 with_vectors=False,
             )
@@ -176,11 +631,10 @@ class QdrantDataSource(DataSource):
                     meta = {k: payload[k] for k in self.metadata_fields if k in payload}
                 else:
                     meta = {k: v for k, v in payload.items() if k != self.text_field}
-                docs.append(Document(page_content=text, metadata=meta))
+                yield Document(page_content=text, metadata=meta)
             if next_offset is None:
                 break
             offset = next_offset
-        return docs
 
     def description(self) -> str:
         return f"Qdrant collection: {self.collection}"
@@ -202,6 +656,558 @@ def clean_documents(docs: list[Document]) -> list[Document]:
     return cleaned
 
 
+def _link_windows(chunks: list[Document], window: int) -> None:
+    """Store in each chunk the ordered ids of its window: `window` chunks either side and itself."""
+    ids = [chunk_point_id(chunk) for chunk in chunks]
+    for i, chunk in enumerate(chunks):
+        # Copy: the splitter's chunks of one page can share a metadata dict.
+        chunk.metadata = dict(chunk.metadata)
+        chunk.metadata["window_ids"] = ids[max(0, i - window):i + window + 1]
+
+
+# ---------------------------------------------------------------------------
+# Persistent embedding cache
+# ---------------------------------------------------------------------------
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed store of embedding vectors.
+
+    Rows are keyed by (model, dim, kind, sha256(text)) where `kind` separates
+    document and query embeddings. Vectors are stored as float32 blobs.
+    Once the table grows past `max_entries`, the least recently used rows
+    are evicted. Safe to share between threads of one process; several
+    processes may open the same file.
+    """
+
+    _LOOKUP_CHUNK = 500
+
+    def __init__(self, path: str, max_entries: int = 50_000):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, dim INTEGER NOT NULL, kind TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, dim, kind, text_hash))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+
+    def get_many(self, model: str, dim: int, kind: str, hashes: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        now = time.time()
+        with self._lock, self._conn:
+            for start in range(0, len(hashes), self._LOOKUP_CHUNK):
+                part = hashes[start:start + self._LOOKUP_CHUNK]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND dim = ? AND kind = ? AND text_hash IN ({marks})",
+                    (model, dim, kind, *part),
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? "
+                    "WHERE model = ? AND dim = ? AND kind = ? AND text_hash = ?",
+                    [(now, model, dim, kind, key) for key in found],
+                )
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, model: str, dim: int, kind: str, vectors: dict[str, list[float]]) -> None:
+        if not vectors:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, dim, kind, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (model, dim, kind, key, array("f", vector).tobytes(), now)
+                    for key, vector in vectors.items()
+                ],
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an Embeddings instance so every call goes through an EmbeddingCache first."""
+
+    def __init__(self, inner: Embeddings, cache: EmbeddingCache, model: str, dim: int):
+        self.inner = inner
+        self.cache = cache
+        self.model = model
+        self.dim = dim
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, "document", self.inner.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text], "query", lambda batch: [self.inner.embed_query(batch[0])])[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, "query", lambda batch: embed_queries(self.inner, batch))
+
+    def _embed(self, texts: list[str], kind: str, compute) -> list[list[float]]:
+        hashes = [text_hash(text) for text in texts]
+        unique = list(dict.fromkeys(hashes))
+        found = self.cache.get_many(self.model, self.dim, kind, unique)
+
+        missing = [h for h in unique if h not in found]
+        if missing:
+            by_hash = dict(zip(hashes, texts))
+            computed = dict(zip(missing, compute([by_hash[h] for h in missing])))
+            self.cache.put_many(self.model, self.dim, kind, computed)
+            found.update(computed)
+
+        return [found[h] for h in hashes]
+
+
+_EMBEDDING_CACHES: dict[str, EmbeddingCache] = {}
+_EMBEDDING_CACHES_LOCK = threading.Lock()
+
+
+def _get_embedding_cache(path: str, max_entries: int) -> EmbeddingCache:
+    """One EmbeddingCache per file per process, so hit/miss counters are shared."""
+    key = os.path.abspath(path)
+    with _EMBEDDING_CACHES_LOCK:
+        if key not in _EMBEDDING_CACHES:
+            _EMBEDDING_CACHES[key] = EmbeddingCache(path, max_entries=max_entries)
+        return _EMBEDDING_CACHES[key]
+
+
+# ---------------------------------------------------------------------------
+# In-process query-vector cache
+# ---------------------------------------------------------------------------
+
+def embed_queries(embeddings: Embeddings, texts: list[str]) -> list[list[float]]:
+    """
+    Query vectors for several questions. The pipeline's wrappers batch them
+    through their own `embed_queries`; OpenAI embeds queries and documents
+    alike, so one embed_documents request covers them. Any other model
+    (fastembed may prefix queries differently) gets one embed_query each.
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if isinstance(embeddings, OpenAIEmbeddings):
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+def normalize_question(text: str) -> str:
+    """"What is  Encapsulation?" and "what is encapsulation" share one cache entry."""
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+
+class QueryVectorCache:
+    """
+    LRU of normalized question → query vector, held in process memory, with
+    at most `max_entries` entries, each kept for up to `ttl` seconds.
+
+    Hits skip the embedding round trip entirely (including the SQLite
+    EmbeddingCache). `stats()` reports the hit rate and an estimate of the
+    latency saved: hits times the mean time of a miss.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._miss_seconds = 0.0
+
+    def get(self, key: str) -> Optional[list[float]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, vector: list[float], seconds: float) -> None:
+        with self._lock:
+            self._miss_seconds += seconds
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            mean_miss = self._miss_seconds / self.misses if self.misses else 0.0
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "mean_miss_ms": 1000 * mean_miss,
+                "saved_seconds": self.hits * mean_miss,
+            }
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """Wrap an Embeddings instance so embed_query() goes through a QueryVectorCache first."""
+
+    def __init__(self, inner: Embeddings, cache: QueryVectorCache):
+        self.inner = inner
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = normalize_question(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            started = time.perf_counter()
+            vector = self.inner.embed_query(text)
+            self.cache.put(key, vector, time.perf_counter() - started)
+        return vector
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        keys = [normalize_question(text) for text in texts]
+        found = {key: self.cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, vector in found.items() if vector is None]
+        if missing:
+            by_key = dict(zip(keys, texts))
+            started = time.perf_counter()
+            vectors = embed_queries(self.inner, [by_key[key] for key in missing])
+            seconds = (time.perf_counter() - started) / len(missing)
+            for key, vector in zip(missing, vectors):
+                self.cache.put(key, vector, seconds)
+                found[key] = vector
+        return [found[key] for key in keys]
+
+
+# ---------------------------------------------------------------------------
+# Rate-limit-aware embedding scheduler
+# ---------------------------------------------------------------------------
+
+class _TokenBucket:
+    """Per-minute budget refilled continuously; `take()` blocks until it fits."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in {
+        "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    }
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingScheduler:
+    """
+    Process-wide gate in front of the embeddings API.
+
+    - Requests/min and tokens/min budgets are enforced with token buckets
+      (tokens are estimated as characters / 4).
+    - Concurrency is adaptive (AIMD): it grows by ~1 per window of
+      successful calls up to `max_concurrency` and halves on a 429/timeout.
+      It halves at most once per epoch: calls that were already in flight
+      when it last halved fail from the same overload, so their 429s do
+      not halve it again.
+    - A throttled call pauses every caller until its backoff (Retry-After
+      if the server sent one, else exponential with jitter) has elapsed,
+      then only that batch is retried, up to `max_retries` times.
+    """
+
+    def __init__(
+        self,
+        rpm: int,
+        tpm: int,
+        max_concurrency: int = 8,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._limit = float(self.max_concurrency)
+        self._epoch = 0     # bumped on every decrease
+        self._active = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._requests = _TokenBucket(rpm) if rpm else None
+        self._tokens = _TokenBucket(tpm) if tpm else None
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+
+    @property
+    def concurrency_limit(self) -> int:
+        return max(1, int(self._limit))
+
+    def call(self, fn: Callable[[list[str]], list[list[float]]], texts: list[str]) -> list[list[float]]:
+        tokens = sum(len(text) for text in texts) / 4
+        attempt = 0
+        while True:
+            epoch = self._acquire(tokens)
+            try:
+                result = fn(texts)
+            except Exception as exc:
+                if not _is_retryable(exc) or attempt >= self.max_retries:
+                    self._release(epoch, success=False, throttled=False)
+                    raise
+                delay = _retry_after(exc)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+                attempt += 1
+                self._release(epoch, success=False, throttled=True, pause=delay)
+                continue
+            self._release(epoch, success=True, throttled=False)
+            return result
+
+    def _acquire(self, tokens: float) -> int:
+        """Wait for a slot and the budgets; returns the epoch the call starts in."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = max(0.0, self._paused_until - now)
+                if not wait and self._active >= self.concurrency_limit:
+                    self._cond.wait()
+                    continue
+                if not wait and self._requests:
+                    wait = self._requests.wait_time(1)
+                if not wait and self._tokens:
+                    wait = self._tokens.wait_time(tokens)
+                if wait:
+                    self._cond.wait(timeout=wait)
+                    continue
+                if self._requests:
+                    self._requests.take(1)
+                if self._tokens:
+                    self._tokens.take(tokens)
+                self._active += 1
+                self.calls += 1
+                return self._epoch
+
+    def _release(self, epoch: int, success: bool, throttled: bool, pause: float = 0.0) -> None:
+        with self._cond:
+            self._active -= 1
+            if success:
+                self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+            elif throttled:
+                self.throttled += 1
+                self.retries += 1
+                if epoch == self._epoch:
+                    self._limit = max(1.0, self._limit / 2)
+                    self._epoch += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "concurrency_limit": self.concurrency_limit,
+        }
+
+
+class ScheduledEmbeddings(Embeddings):
+    """Route every embedding request through an EmbeddingScheduler."""
+
+    def __init__(self, inner: Embeddings, scheduler: EmbeddingScheduler):
+        self.inner = inner
+        self.scheduler = scheduler
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.scheduler.call(self.inner.embed_documents, texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.scheduler.call(lambda batch: [self.inner.embed_query(batch[0])], [text])[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self.scheduler.call(lambda batch: embed_queries(self.inner, batch), texts)
+
+
+_EMBEDDING_SCHEDULERS: dict[tuple, EmbeddingScheduler] = {}
+_EMBEDDING_SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_embedding_scheduler(cfg: RAGConfig) -> EmbeddingScheduler:
+    """The shared scheduler for this process and (endpoint, model, budget)."""
+    key = (
+        cfg.embedding_api_base,
+        cfg.embedding_model,
+        cfg.embedding_rpm,
+        cfg.embedding_tpm,
+        cfg.embedding_max_concurrency,
+        cfg.embedding_max_retries,
+    )
+    with _EMBEDDING_SCHEDULERS_LOCK:
+        if key not in _EMBEDDING_SCHEDULERS:
+            _EMBEDDING_SCHEDULERS[key] = EmbeddingScheduler(
+                rpm=cfg.embedding_rpm,
+                tpm=cfg.embedding_tpm,
+                max_concurrency=cfg.embedding_max_concurrency,
+                max_retries=cfg.embedding_max_retries,
+            )
+        return _EMBEDDING_SCHEDULERS[key]
+
+
+def _make_embeddings(cfg: RAGConfig) -> Embeddings:
+    if cfg.embedding_backend == "fastembed":
+        return _make_local_embeddings(cfg)
+    if cfg.embedding_backend != "openai":
+        raise ValueError(f"Unknown embedding_backend {cfg.embedding_backend!r}; use 'openai' or 'fastembed'.")
+    # Retries are owned by the scheduler, so the client must not retry on its own.
+    kwargs = {"model": cfg.embedding_model, "max_retries": 0, "request_timeout": cfg.embedding_request_timeout}
+    if cfg.embedding_api_base:
+        # Other endpoints (a local stub, an OpenAI-compatible server) get raw
+        # strings: splitting by OpenAI's tokenizer would need tiktoken's files.
+        kwargs["base_url"] = cfg.embedding_api_base
+        kwargs["check_embedding_ctx_length"] = False
+    embeddings = ScheduledEmbeddings(OpenAIEmbeddings(**kwargs), get_embedding_scheduler(cfg))
+    if cfg.embedding_cache_path:
+        cache = _get_embedding_cache(cfg.embedding_cache_path, cfg.embedding_cache_max_entries)
+        embeddings = CachedEmbeddings(embeddings, cache, cfg.embedding_model, cfg.embedding_dim)
+    return embeddings
+
+
+# Local (fastembed) models, loaded once per process: loading one takes seconds.
+# Each model has its own load lock, so a download of one model never blocks
+# requests that use another; _LOCAL_MODELS_LOCK only guards the lock table.
+_LOCAL_MODELS: dict[tuple, object] = {}
+_LOCAL_MODEL_LOCKS: dict[tuple, threading.Lock] = {}
+_LOCAL_MODELS_LOCK = threading.Lock()
+
+
+def _local_model(key: tuple, load: Callable[[], object]):
+    """The process-wide model for `key`, made by `load()` on first use."""
+    model = _LOCAL_MODELS.get(key)
+    if model is not None:
+        return model
+    with _LOCAL_MODELS_LOCK:
+        lock = _LOCAL_MODEL_LOCKS.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _LOCAL_MODELS:
+            _LOCAL_MODELS[key] = load()
+        return _LOCAL_MODELS[key]
+
+
+def _make_local_embeddings(cfg: RAGConfig) -> Embeddings:
+    """Dense fastembed embeddings for `cfg.embedding_model`; its dimension must match `embedding_dim`."""
+    from langchain_community.embeddings import FastEmbedEmbeddings
+
+    def load():
+        model = FastEmbedEmbeddings(
+            model_name=cfg.embedding_model,
+            threads=cfg.embedding_threads,
+            batch_size=cfg.embedding_batch_size,
+        )
+        return model, len(model.embed_query("dimension probe"))
+
+    key = ("dense", cfg.embedding_model, cfg.embedding_threads, cfg.embedding_batch_size)
+    model, dim = _local_model(key, load)
+    if dim != cfg.embedding_dim:
+        raise ValueError(f"'{cfg.embedding_model}' makes {dim}-dim vectors; set embedding_dim={dim}.")
+    return model
+
+
+def _make_sparse_embeddings(model_name: str):
+    """Sparse fastembed embeddings (BM25 / SPLADE) for hybrid collections."""
+    from langchain_qdrant import FastEmbedSparse
+
+    return _local_model(("sparse", model_name), lambda: FastEmbedSparse(model_name=model_name))
+
+
+def _embedding_identity(cfg: RAGConfig) -> dict:
+    """What a collection's dense vectors are made with; recorded on collections and exports."""
+    return {
+        "embedding_backend": cfg.embedding_backend,
+        "embedding_model": cfg.embedding_model,
+        "embedding_dim": cfg.embedding_dim,
+    }
+
+
+def _recorded_identity(metadata: dict, embedding_model: Optional[str] = None) -> dict:
+    """The embedding identity fields of collection metadata, with `embedding_model` as fallback."""
+    identity = {key: metadata[key] for key in ("embedding_backend", "embedding_model", "embedding_dim") if key in metadata}
+    if embedding_model:
+        identity.setdefault("embedding_model", embedding_model)
+    return identity
+
+
+def _check_embedding_identity(recorded: dict, cfg: RAGConfig, what: str) -> None:
+    """Refuse to mix embedding spaces. Fields missing from `recorded` (older data) are not checked."""
+    for key, value in _embedding_identity(cfg).items():
+        if recorded.get(key) not in (None, value):
+            raise ValueError(f"{what} was built with {key}={recorded[key]!r}, but this pipeline uses {value!r}.")
+
+
 # ---------------------------------------------------------------------------
 # Qdrant client factory
 # ---------------------------------------------------------------------------
@@ -209,25 +1215,2183 @@ def clean_documents(docs: list[Document]) -> list[Document]:
 def _make_qdrant_client(cfg: RAGConfig) -> QdrantClient:
     if cfg.qdrant_url:
         return QdrantClient(url=cfg.qdrant_url, api_key=cfg.qdrant_api_key)
-    return QdrantClient(location=cfg.qdrant_location)
+    if cfg.qdrant_location == ":memory:":
+        return QdrantClient(location=":memory:")
+    # QdrantClient(location=...) treats anything but ":memory:" as a URL.
+    return QdrantClient(path=cfg.qdrant_location)
 
 
 def _resolve_vector_name(client: QdrantClient, collection_name: str, default: str = "dense") -> str:
     """
-    Match the vector naming scheme used by an existing Qdrant collection.
+    Match the vector naming scheme used by an existing Qdrant collection.
+
+    Older collections in this project were created with an unnamed dense vector,
+    while newer runs may use the named vector `dense`.
+    """
+    try:
+        collection = client.get_collection(collection_name=_resolve_alias(client, collection_name))
+    except Exception:
+        return default
+
+    vectors = collection.config.params.vectors
+    if isinstance(vectors, dict):
+        return default if default in vectors else (next(iter(vectors)) if vectors else default)
+    return ""
+
+
+# ---------------------------------------------------------------------------
+# Collection layout and search parameters
+# ---------------------------------------------------------------------------
+
+def _quantization_config(cfg: RAGConfig):
+    if cfg.quantization is None:
+        return None
+    if cfg.quantization == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=0.99, always_ram=True,
+        ))
+    if cfg.quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"Unknown quantization {cfg.quantization!r}; use None, 'scalar' or 'binary'.")
+
+
+def _collection_settings(cfg: RAGConfig) -> dict:
+    """Keyword arguments for `create_collection` besides the vectors config."""
+    hnsw = None
+    if cfg.hnsw_m is not None or cfg.hnsw_ef_construct is not None:
+        hnsw = HnswConfigDiff(m=cfg.hnsw_m, ef_construct=cfg.hnsw_ef_construct)
+    return {
+        "hnsw_config": hnsw,
+        "quantization_config": _quantization_config(cfg),
+        "on_disk_payload": cfg.payload_on_disk or None,
+    }
+
+
+SPARSE_VECTOR_NAME = "sparse"
+
+
+def _collection_metadata(cfg: RAGConfig) -> dict:
+    """Facts about how a collection's vectors are made, stored on the collection itself."""
+    metadata = _embedding_identity(cfg)
+    if cfg.sparse_model:
+        metadata["sparse_model"] = cfg.sparse_model
+    return metadata
+
+
+def _sparse_vectors_config(cfg: RAGConfig) -> Optional[dict]:
+    if not cfg.sparse_model:
+        return None
+    # BM25 vectors hold term frequencies; Qdrant applies the IDF at query time.
+    modifier = Modifier.IDF if "bm25" in cfg.sparse_model.lower() else None
+    return {SPARSE_VECTOR_NAME: SparseVectorParams(modifier=modifier)}
+
+
+def _stored_metadata(client: QdrantClient, collection_name: str) -> dict:
+    """A collection's metadata ({} if it has none or does not exist)."""
+    try:
+        info = client.get_collection(collection_name=_resolve_alias(client, collection_name))
+    except Exception:
+        return {}
+    return info.config.metadata or {}
+
+
+def _sparse_model(client: QdrantClient, collection_name: str) -> Optional[str]:
+    """The sparse model a collection was built with, or None if it has no sparse vector."""
+    try:
+        info = client.get_collection(collection_name=_resolve_alias(client, collection_name))
+    except Exception:
+        return None
+    if SPARSE_VECTOR_NAME not in (info.config.params.sparse_vectors or {}):
+        return None
+    return (info.config.metadata or {}).get("sparse_model")
+
+
+def _create_dense_collection(client: QdrantClient, collection_name: str, cfg: RAGConfig) -> None:
+    if cfg.embedding_search_dim and cfg.embedding_search_dim < cfg.embedding_dim:
+        vectors_config = {
+            # Only read by id for rescoring, so no HNSW graph is built for it.
+            "dense": VectorParams(
+                size=cfg.embedding_dim,
+                distance=Distance.COSINE,
+                on_disk=True,
+                hnsw_config=HnswConfigDiff(m=0),
+            ),
+            REDUCED_VECTOR_NAME: VectorParams(
+                size=cfg.embedding_search_dim,
+                distance=Distance.COSINE,
+                on_disk=cfg.vectors_on_disk or None,
+            ),
+        }
+    else:
+        vectors_config = {
+            "dense": VectorParams(
+                size=cfg.embedding_dim,
+                distance=Distance.COSINE,
+                on_disk=cfg.vectors_on_disk or None,
+            )
+        }
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=vectors_config,
+        sparse_vectors_config=_sparse_vectors_config(cfg),
+        metadata=_collection_metadata(cfg),
+        **_collection_settings(cfg),
+    )
+
+
+def _is_quantized(client: QdrantClient, collection_name: str) -> bool:
+    """Whether the collection, or any of its dense vectors, has a quantization config."""
+    try:
+        config = client.get_collection(collection_name=_resolve_alias(client, collection_name)).config
+    except Exception:
+        return False
+    vectors = config.params.vectors
+    per_vector = vectors.values() if isinstance(vectors, dict) else [vectors]
+    return config.quantization_config is not None or any(
+        getattr(params, "quantization_config", None) is not None for params in per_vector
+    )
+
+
+def _search_params(cfg: RAGConfig, quantized: bool) -> Optional[SearchParams]:
+    """
+    Per-query search parameters for `cfg` against a collection that is
+    `quantized` or not, or None to use Qdrant's defaults.
+    """
+    quantization = None
+    if quantized:
+        quantization = QuantizationSearchParams(
+            rescore=cfg.search_rescore,
+            oversampling=cfg.search_oversampling,
+        )
+    if cfg.search_hnsw_ef is None and quantization is None:
+        return None
+    return SearchParams(hnsw_ef=cfg.search_hnsw_ef, quantization=quantization)
+
+
+# ---------------------------------------------------------------------------
+# Payload fields and retrieval filters
+# ---------------------------------------------------------------------------
+
+# Chunk metadata fields that are indexed in Qdrant and accepted by
+# retrieve(filters=...). Stored under the "metadata" payload key.
+FILTER_FIELDS = {
+    "course": PayloadSchemaType.KEYWORD,
+    "material_id": PayloadSchemaType.KEYWORD,
+    "source": PayloadSchemaType.KEYWORD,
+    "page": PayloadSchemaType.INTEGER,        # 0-based, as PyPDF numbers pages
+    "lecture": PayloadSchemaType.INTEGER,     # from the file name, e.g. "Lecture 03.pdf"
+    "topic": PayloadSchemaType.INTEGER,       # k-means cluster, see build_topic_index()
+    "level": PayloadSchemaType.KEYWORD,       # summaries only: "window" or "document"
+}
+
+
+def normalize_course_code(code) -> str:
+    """"cs 201" and "CS201" name the same course."""
+    return re.sub(r"\s+", "", str(code)).upper()
+
+
+def material_id_for(source: str) -> str:
+    """Stable material id for a source file: its lower-cased, dash-separated stem."""
+    return re.sub(r"[^a-z0-9]+", "-", Path(str(source)).stem.lower()).strip("-")
+
+
+_LECTURE_PATTERN = re.compile(r"(?:^|[^a-z])(?:lecture|lect|lec|l)[^a-z0-9]*0*(\d{1,3})(?!\d)")
+
+
+def lecture_number_for(source: str) -> Optional[int]:
+    """Lecture number in a file name ("Lecture 03 - Inheritance.pdf" → 3), if any."""
+    match = _LECTURE_PATTERN.search(Path(str(source)).stem.lower())
+    return int(match.group(1)) if match else None
+
+
+def normalize_filters(filters: Optional[dict]) -> dict[str, list]:
+    """
+    Turn `{field: value or iterable of values}` into `{field: [values]}`,
+    dropping None values. Unknown fields raise ValueError.
+    """
+    normalized = {}
+    for field, value in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter on {field!r}; use one of {', '.join(FILTER_FIELDS)}.")
+        if value is None:
+            continue
+        values = list(value) if isinstance(value, (list, tuple, set, frozenset, range)) else [value]
+        if field == "course":
+            values = [normalize_course_code(v) for v in values]
+        elif field in ("page", "lecture", "topic"):
+            values = [int(v) for v in values]
+        else:
+            values = [str(v) for v in values]
+        normalized[field] = values
+    return normalized
+
+
+def qdrant_filter(filters: Optional[dict]) -> Optional[Filter]:
+    """Qdrant Filter matching every field of `filters` (any of its values), or None."""
+    conditions = [
+        FieldCondition(
+            key=f"{QdrantVectorStore.METADATA_KEY}.{field}",
+            match=MatchValue(value=values[0]) if len(values) == 1 else MatchAny(any=values),
+        )
+        for field, values in normalize_filters(filters).items()
+    ]
+    return Filter(must=conditions) if conditions else None
+
+
+# ---------------------------------------------------------------------------
+# Reduced-dimension (Matryoshka) vectors
+# ---------------------------------------------------------------------------
+
+REDUCED_VECTOR_NAME = "dense_reduced"
+
+
+def truncate_embedding(vector: list[float], dim: int) -> list[float]:
+    """
+    First `dim` components of `vector`, renormalised to unit length.
+
+    For text-embedding-3 models this matches requesting `dimensions=dim`
+    from the API, so one full-size embedding serves both searches.
+    """
+    head = vector[:dim]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
+
+
+def _reduced_dim(client: QdrantClient, collection_name: str) -> Optional[int]:
+    """Size of the collection's reduced search vector, or None if it has none."""
+    try:
+        vectors = client.get_collection(collection_name=_resolve_alias(client, collection_name)).config.params.vectors
+    except Exception:
+        return None
+    if isinstance(vectors, dict) and REDUCED_VECTOR_NAME in vectors:
+        return vectors[REDUCED_VECTOR_NAME].size
+    return None
+
+
+def _dense_request(
+    vector: list[float],
+    filter: Optional[Filter],
+    limit: int,
+    using: Optional[str] = "dense",
+    reduced_dim: Optional[int] = None,
+    candidates: int = 50,
+    search_params: Optional[SearchParams] = None,
+) -> QueryRequest:
+    """
+    Dense search for the `limit` nearest points to `vector`. With a reduced
+    search vector, `candidates` points are found with it and rescored by
+    `vector`: the full vector has no HNSW graph and lives on disk, so
+    searching it directly would scan every point.
+    """
+    if not reduced_dim:
+        return QueryRequest(
+            query=vector, using=using, filter=filter, params=search_params, limit=limit, with_payload=True
+        )
+    return QueryRequest(
+        prefetch=Prefetch(
+            query=truncate_embedding(vector, reduced_dim),
+            using=REDUCED_VECTOR_NAME,
+            filter=filter,
+            limit=max(candidates, limit),
+            params=search_params,
+        ),
+        query=vector,
+        using=using,
+        limit=limit,
+        with_payload=True,
+    )
+
+
+class RescoringRetriever(BaseRetriever):
+    """
+    Two-stage retriever for collections with a reduced search vector:
+    `candidates` points are found with the short vector, then re-ranked by
+    the full-dimension vector and the best `k` returned.
+    """
+
+    client: QdrantClient
+    embeddings: Embeddings
+    collection_name: str
+    reduced_dim: int
+    k: int = 3
+    candidates: int = 50
+    search_params: Optional[SearchParams] = None
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager=None, filter: Optional[Filter] = None
+    ) -> list[Document]:
+        return self.search_many([query], [self.embeddings.embed_query(query)], [filter])[0]
+
+    def search_many(self, queries: list[str], vectors: list, filters: list[Optional[Filter]]) -> list[list[Document]]:
+        """One Qdrant batch request for several already-embedded queries."""
+        requests = [
+            _dense_request(vector, filter, self.k, "dense", self.reduced_dim, self.candidates, self.search_params)
+            for vector, filter in zip(vectors, filters)
+        ]
+        return _batch_documents(self.client, self.collection_name, requests)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense + sparse retrieval in one Qdrant query: each side prefetches
+    `candidates` points and the two lists are fused with reciprocal rank
+    fusion. With a reduced search vector, the dense side is itself the
+    two-stage search of `RescoringRetriever`.
+    """
+
+    client: QdrantClient
+    embeddings: Embeddings
+    sparse_embeddings: object
+    collection_name: str
+    vector_name: str = "dense"
+    reduced_dim: Optional[int] = None
+    k: int = 3
+    candidates: int = 20
+    rescore_candidates: int = 50
+    search_params: Optional[SearchParams] = None
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager=None, filter: Optional[Filter] = None
+    ) -> list[Document]:
+        return self.search_many([query], [self.embeddings.embed_query(query)], [filter])[0]
+
+    def search_many(self, queries: list[str], vectors: list, filters: list[Optional[Filter]]) -> list[list[Document]]:
+        """One Qdrant batch request for several already-embedded queries; sparse vectors are made locally."""
+        requests = [
+            self._request(vector, self.sparse_embeddings.embed_query(query), filter)
+            for query, vector, filter in zip(queries, vectors, filters)
+        ]
+        return _batch_documents(self.client, self.collection_name, requests)
+
+    def _request(self, vector: list[float], sparse, filter: Optional[Filter]) -> QueryRequest:
+        if self.reduced_dim:
+            dense = Prefetch(
+                prefetch=Prefetch(
+                    query=truncate_embedding(vector, self.reduced_dim),
+                    using=REDUCED_VECTOR_NAME,
+                    filter=filter,
+                    limit=max(self.rescore_candidates, self.candidates),
+                    params=self.search_params,
+                ),
+                query=vector,
+                using=self.vector_name,
+                limit=self.candidates,
+            )
+        else:
+            dense = Prefetch(
+                query=vector,
+                using=self.vector_name,
+                filter=filter,
+                limit=self.candidates,
+                params=self.search_params,
+            )
+        return QueryRequest(
+            prefetch=[
+                dense,
+                Prefetch(
+                    query=SparseVector(indices=sparse.indices, values=sparse.values),
+                    using=SPARSE_VECTOR_NAME,
+                    filter=filter,
+                    limit=self.candidates,
+                ),
+            ],
+            query=FusionQuery(fusion=Fusion.RRF),
+            limit=self.k,
+            with_payload=True,
+        )
+
+
+def _batch_documents(client: QdrantClient, collection_name: str, requests: list[QueryRequest]) -> list[list[Document]]:
+    """Run `requests` as one query_batch_points call → one Document list per request."""
+    if not requests:
+        return []
+    responses = client.query_batch_points(collection_name=collection_name, requests=requests)
+    return [_points_to_documents(response.points, collection_name) for response in responses]
+
+
+def _points_to_documents(points, collection_name: str) -> list[Document]:
+    """Qdrant points or records → Documents shaped like langchain_qdrant search hits."""
+    docs = []
+    for point in points:
+        metadata = point.payload.get(QdrantVectorStore.METADATA_KEY) or {}
+        metadata["_id"] = point.id
+        metadata["_collection_name"] = collection_name
+        docs.append(Document(
+            page_content=point.payload.get(QdrantVectorStore.CONTENT_KEY, ""),
+            metadata=metadata,
+        ))
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# Cross-encoder reranking
+# ---------------------------------------------------------------------------
+
+class CrossEncoderReranker:
+    """Scores (query, passage) pairs with a local fastembed cross-encoder, one batched call per query."""
+
+    # Reranking runs on this pool so a call can be abandoned when it overruns
+    # its budget. An abandoned call still finishes in the background; two
+    # workers keep one slow call from holding up the next request. The pool
+    # is created on first use, so processes that never rerank start no threads.
+    _pool: Optional[ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
+
+    @classmethod
+    def pool(cls) -> ThreadPoolExecutor:
+        with cls._pool_lock:
+            if cls._pool is None:
+                cls._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rerank")
+            return cls._pool
+
+    def __init__(self, model_name: str, threads: Optional[int] = None):
+        from fastembed.rerank.cross_encoder import TextCrossEncoder
+
+        self.model_name = model_name
+        self.model = TextCrossEncoder(model_name=model_name, threads=threads)
+
+    def scores(self, query: str, texts: list[str]) -> list[float]:
+        return list(self.model.rerank(query, texts, batch_size=max(1, len(texts))))
+
+
+def _make_reranker(model_name: str, threads: Optional[int] = None) -> CrossEncoderReranker:
+    return _local_model(("rerank", model_name, threads), lambda: CrossEncoderReranker(model_name, threads=threads))
+
+
+@dataclass
+class RerankStats:
+    """Counters for the reranking stage of RAGPipeline.retrieve(); safe to update from several threads."""
+    reranked: int = 0
+    fallbacks: int = 0
+    seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.reranked += 1
+            self.seconds += seconds
+
+    def record_fallback(self) -> None:
+        with self._lock:
+            self.fallbacks += 1
+
+    def summary(self) -> str:
+        mean_ms = 1000 * self.seconds / self.reranked if self.reranked else 0.0
+        return f"{self.reranked} reranked (mean {mean_ms:.0f} ms), {self.fallbacks} fell back to vector order"
+
+
+# ---------------------------------------------------------------------------
+# Collection aliases and versions (blue/green rebuilds)
+# ---------------------------------------------------------------------------
+
+_VERSION_SEPARATOR = "__v"
+
+
+def _alias_target(client: QdrantClient, alias: str) -> Optional[str]:
+    try:
+        aliases = client.get_aliases().aliases
+    except Exception:
+        return None
+    return next((a.collection_name for a in aliases if a.alias_name == alias), None)
+
+
+def _resolve_alias(client: QdrantClient, name: str) -> str:
+    """The collection `name` points to if it is an alias, else `name` itself."""
+    return _alias_target(client, name) or name
+
+
+def _new_collection_version(alias: str) -> str:
+    return f"{alias}{_VERSION_SEPARATOR}{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+
+
+def _create_collection_version(client: QdrantClient, alias: str, create: Callable[[str], None]) -> str:
+    """
+    Create the first version of `alias` with `create(name)` and point `alias`
+    at it, so a collection written before any rebuild is already reached
+    through an alias. Returns the version's name.
+    """
+    name = _new_collection_version(alias)
+    create(name)
+    _swap_alias(client, alias, name)
+    return name
+
+
+def _is_legacy_collection(client: QdrantClient, alias: str) -> bool:
+    """Whether `alias` names a plain collection rather than an alias (a pre-alias deployment)."""
+    return _alias_target(client, alias) is None and client.collection_exists(collection_name=alias)
+
+
+def _check_legacy_collection(client: QdrantClient, alias: str, replace: bool) -> None:
+    if _is_legacy_collection(client, alias) and not replace:
+        raise RuntimeError(
+            f"'{alias}' is a plain collection, not an alias. Switching it to blue/green "
+            f"versions deletes it before the alias is created, so queries fail for that moment. "
+            f"Set replace_legacy_collection (ingest.py --replace-legacy-collection) to migrate."
+        )
+
+
+def _swap_alias(client: QdrantClient, alias: str, collection: str, replace_legacy: bool = False) -> None:
+    """
+    Point `alias` at `collection` in a single alias update, so readers see
+    either the old or the new collection, never neither.
+
+    The one exception is the one-time migration of a pre-alias deployment,
+    which has a real collection named `alias`: it is dropped just before the
+    alias takes its name, and only with `replace_legacy`.
+    """
+    _check_legacy_collection(client, alias, replace_legacy)
+    operations = []
+    legacy = _is_legacy_collection(client, alias)
+    if _alias_target(client, alias) is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    operations.append(CreateAliasOperation(
+        create_alias=CreateAlias(collection_name=collection, alias_name=alias)
+    ))
+    if legacy:
+        print(f"  → replacing legacy collection '{alias}' with an alias")
+        _delete_collection(client, alias)
+    try:
+        client.update_collection_aliases(change_aliases_operations=operations)
+    except Exception as exc:
+        if legacy:
+            raise RuntimeError(
+                f"Legacy collection '{alias}' was deleted but the alias could not be created; "
+                f"the data is in '{collection}'. Create the alias '{alias}' → '{collection}' by hand."
+            ) from exc
+        raise
+
+
+def _gc_collection_versions(client: QdrantClient, alias: str, keep: int) -> list[str]:
+    """Delete all but the newest `keep` versions of `alias`; the live one is always kept."""
+    live = _alias_target(client, alias)
+    prefix = f"{alias}{_VERSION_SEPARATOR}"
+    versions = sorted(
+        c.name for c in client.get_collections().collections
+        if c.name.startswith(prefix) and not c.name.endswith(_COMPANION_SUFFIXES)
+    )
+    stale = [name for name in versions[:max(0, len(versions) - max(1, keep))] if name != live]
+    for name in stale:
+        _delete_collection(client, name)
+    return stale
+
+
+def _delete_collection(client: QdrantClient, name: str) -> None:
+    """Delete a collection together with its topic and summary indexes, if any."""
+    client.delete_collection(collection_name=name)
+    for suffix in _COMPANION_SUFFIXES:
+        if client.collection_exists(collection_name=f"{name}{suffix}"):
+            client.delete_collection(collection_name=f"{name}{suffix}")
+
+
+# ---------------------------------------------------------------------------
+# Batched embed-and-upsert engine
+# ---------------------------------------------------------------------------
+
+# Fixed namespace so the same chunk always maps to the same point id.
+_POINT_ID_NAMESPACE = uuid.UUID("6f1c2a4e-3b7d-5e8f-9a0b-1c2d3e4f5a6b")
+
+
+def chunk_point_id(doc: Document) -> str:
+    """
+    Deterministic Qdrant point id derived from (source, page, sha256(text)).
+    Re-ingesting an unchanged chunk therefore targets the same point.
+    """
+    source = str(doc.metadata.get("source", ""))
+    page = str(doc.metadata.get("page", ""))
+    return str(uuid.uuid5(_POINT_ID_NAMESPACE, f"{source}|{page}|{text_hash(doc.page_content)}"))
+
+
+@dataclass
+class IngestStats:
+    """Counters reported at the end of an ingestion run."""
+    chunks: int = 0
+    upserted: int = 0
+    skipped: int = 0       # already in the collection before this run
+    duplicates: int = 0    # repeats of a chunk seen earlier in this run
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.upserted / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.upserted}/{self.chunks} chunks upserted, {self.skipped} already present, "
+            f"{self.duplicates} repeated in this run, in {self.seconds:.1f}s ({self.chunks_per_second:.1f} chunks/s)"
+        )
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, max(1, size))):
+        yield batch
+
+
+class IngestionEngine:
+    """
+    Embed and upsert chunks into a Qdrant collection in batches.
+
+    Up to `config.ingest_workers` embedding batches run concurrently on a
+    thread pool. A single writer thread upserts each finished batch, so
+    Qdrant writes overlap with the embedding requests for the next batches.
+    Batches are upserted in submission order.
+
+    `run()` consumes chunks lazily and keeps at most 2 * ingest_workers
+    batches waiting on embeddings and as many waiting on upserts, so memory
+    stays bounded whatever the size of the input.
+
+    Point ids come from `chunk_point_id()`. Before a batch is embedded, ids
+    that already exist in the collection are looked up and dropped, so
+    re-running ingestion on the same files costs one id lookup per batch.
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        embeddings,
+        collection_name: str,
+        vector_name: str,
+        config: RAGConfig,
+        reduced_dim: Optional[int] = None,
+        sparse_embeddings=None,
+    ):
+        self.client = client
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.vector_name = vector_name
+        self.config = config
+        # Collections with a reduced search vector get it alongside the full one.
+        self.reduced_dim = reduced_dim
+        # Hybrid collections get a locally computed sparse vector as well.
+        self.sparse_embeddings = sparse_embeddings
+        # Ids claimed by a batch of this run; identical chunks in later batches are skipped.
+        self._claimed: set[str] = set()
+        self._claimed_lock = threading.Lock()
+        # Embedded Qdrant is not thread-safe, so its calls are serialised.
+        self._client_lock = nullcontext() if config.qdrant_url else threading.Lock()
+
+    def run(
+        self,
+        chunks: Iterable[Document],
+        on_commit: Optional[Callable[[list[Document]], None]] = None,
+    ) -> IngestStats:
+        """
+        Ingest `chunks`. `on_commit`, if given, is called from the calling
+        thread with each batch once it is durably upserted (or skipped),
+        strictly in input order.
+        """
+        stats = IngestStats()
+        started = time.perf_counter()
+        workers = max(1, self.config.ingest_workers)
+        max_in_flight = workers * 2
+
+        with ThreadPoolExecutor(max_workers=workers) as embed_pool, \
+                ThreadPoolExecutor(max_workers=1) as upsert_pool:
+            pending: deque[tuple[list[Document], Future]] = deque()
+            upserts: deque[tuple[list[Document], Future]] = deque()
+
+            def collect(item: tuple[list[Document], Future]) -> None:
+                batch, future = item
+                upserted, skipped, duplicates = future.result()
+                stats.upserted += upserted
+                stats.skipped += skipped
+                stats.duplicates += duplicates
+                if on_commit is not None:
+                    on_commit(batch)
+
+            try:
+                for batch in _batched(chunks, self.config.ingest_batch_size):
+                    stats.chunks += len(batch)
+                    pending.append((batch, embed_pool.submit(self._embed, batch)))
+                    if len(pending) >= max_in_flight:
+                        upserts.append(self._hand_off(pending.popleft(), upsert_pool))
+                    while len(upserts) > max_in_flight:
+                        collect(upserts.popleft())
+
+                while pending:
+                    upserts.append(self._hand_off(pending.popleft(), upsert_pool))
+            except BaseException:
+                # Report batches that were already written before the failure.
+                for future in (f for _, f in pending):
+                    future.cancel()
+                while upserts:
+                    try:
+                        collect(upserts.popleft())
+                    except Exception:
+                        break
+                raise
+
+            while upserts:
+                collect(upserts.popleft())
+
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def _existing_ids(self, ids: list[str]) -> set[str]:
+        with self._client_lock:
+            found = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=ids,
+                with_payload=False,
+                with_vectors=False,
+            )
+        return {str(point.id) for point in found}
+
+    def _embed(self, batch: list[Document]) -> tuple[list[tuple[str, Document]], list, int, int]:
+        """(chunks to write, their vectors, chunks already stored, repeats within this run) for `batch`."""
+        keyed = {chunk_point_id(doc): doc for doc in batch}
+        with self._claimed_lock:
+            keyed = {point_id: doc for point_id, doc in keyed.items() if point_id not in self._claimed}
+            self._claimed.update(keyed)
+        duplicates = len(batch) - len(keyed)
+        existing = self._existing_ids(list(keyed)) if keyed else set()
+        todo = [(point_id, doc) for point_id, doc in keyed.items() if point_id not in existing]
+        skipped = len(keyed) - len(todo)
+        if not todo:
+            return [], [], skipped, duplicates
+        texts = [doc.page_content for _, doc in todo]
+        vectors = self.embeddings.embed_documents(texts)
+        if self.sparse_embeddings is None:
+            return todo, [self._point_vector(vector) for vector in vectors], skipped, duplicates
+        sparse = self.sparse_embeddings.embed_documents(texts)
+        return todo, [self._point_vector(vector, s) for vector, s in zip(vectors, sparse)], skipped, duplicates
+
+    def _hand_off(
+        self, item: tuple[list[Document], Future], upsert_pool: ThreadPoolExecutor
+    ) -> tuple[list[Document], Future]:
+        batch, embed_future = item
+        todo, vectors, skipped, duplicates = embed_future.result()
+        return batch, upsert_pool.submit(self._upsert, todo, vectors, skipped, duplicates)
+
+    def _point_vector(self, vector: list[float], sparse=None):
+        if not self.vector_name:
+            return vector
+        point = {self.vector_name: vector}
+        if self.reduced_dim:
+            point[REDUCED_VECTOR_NAME] = truncate_embedding(vector, self.reduced_dim)
+        if sparse is not None:
+            point[SPARSE_VECTOR_NAME] = SparseVector(indices=sparse.indices, values=sparse.values)
+        return point
+
+    def _upsert(
+        self, todo: list[tuple[str, Document]], vectors: list, skipped: int, duplicates: int
+    ) -> tuple[int, int, int]:
+        points = [
+            PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={
+                    QdrantVectorStore.CONTENT_KEY: doc.page_content,
+                    QdrantVectorStore.METADATA_KEY: doc.metadata,
+                },
+            )
+            for (point_id, doc), vector in zip(todo, vectors)
+        ]
+        if points:
+            with self._client_lock:
+                self.client.upsert(collection_name=self.collection_name, points=points)
+        return len(points), skipped, duplicates
+
+
+# ---------------------------------------------------------------------------
+# Ingestion checkpoints
+# ---------------------------------------------------------------------------
+
+class IngestCheckpoint:
+    """
+    Progress record for one ingestion run, saved after every committed batch.
+
+    Stores the number of leading chunks committed per source file and which
+    files are complete. Chunking is deterministic, so a resumed run skips
+    completed files entirely and the committed prefix of the file that was
+    in progress. The chunk settings are stored too; a checkpoint written
+    with different settings is ignored.
+    """
+
+    def __init__(self, path: str, cfg: RAGConfig):
+        self.path = path
+        self.settings = {
+            "collection": cfg.qdrant_collection,
+            "chunk_size": cfg.chunk_size,
+            "chunk_overlap": cfg.chunk_overlap,
+            "child_chunk_size": cfg.child_chunk_size,
+            "neighbor_window": cfg.neighbor_window,
+        }
+        self.committed: dict[str, int] = {}
+        self.completed: list[str] = []
+        self._last_source: Optional[str] = None
+
+    @classmethod
+    def load(cls, path: str, cfg: RAGConfig) -> "IngestCheckpoint":
+        checkpoint = cls(path, cfg)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("settings") == checkpoint.settings:
+                checkpoint.committed = data.get("committed", {})
+                checkpoint.completed = data.get("completed", [])
+        return checkpoint
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.committed and not self.completed
+
+    def record(self, batch: list[Document]) -> None:
+        """Engine `on_commit` hook: count the batch and persist."""
+        for doc in batch:
+            source = str(doc.metadata.get("source", ""))
+            if source != self._last_source:
+                # Chunks arrive in file order, so the previous file is done.
+                if self._last_source is not None and self._last_source not in self.completed:
+                    self.completed.append(self._last_source)
+                self._last_source = source
+            self.committed[source] = self.committed.get(source, 0) + 1
+        self.save()
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"settings": self.settings, "committed": self.committed, "completed": self.completed},
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ---------------------------------------------------------------------------
+# Sync manifest
+# ---------------------------------------------------------------------------
+
+@dataclass
+class SyncPlan:
+    new: list[str]
+    changed: list[str]
+    removed: list[str]
+    unchanged: list[str]
+
+    @property
+    def to_ingest(self) -> list[str]:
+        return self.new + self.changed
+
+    @property
+    def to_delete(self) -> list[str]:
+        return self.changed + self.removed
+
+
+class SyncManifest:
+    """
+    JSON record of the files ingested into one collection:
+    path -> {"size", "mtime", "sha256"}.
+
+    Files whose size and mtime match the manifest are treated as unchanged
+    without being read; otherwise the content hash decides.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+
+    @classmethod
+    def for_collection(cls, cfg: RAGConfig) -> "SyncManifest":
+        return cls(os.path.join(cfg.manifest_dir, f"{cfg.qdrant_collection}.json"))
+
+    def plan(self, files: list[str]) -> SyncPlan:
+        plan = SyncPlan(new=[], changed=[], removed=[], unchanged=[])
+        self._pending: dict[str, dict] = {}
+        for path in files:
+            stat = os.stat(path)
+            entry = self.entries.get(path)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                plan.unchanged.append(path)
+                continue
+            record = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_sha256(path)}
+            self._pending[path] = record
+            if entry is None:
+                plan.new.append(path)
+            elif entry["sha256"] == record["sha256"]:
+                # Touched but identical — just refresh the stat fields.
+                self.entries[path] = record
+                plan.unchanged.append(path)
+            else:
+                plan.changed.append(path)
+        present = set(files)
+        plan.removed = [path for path in self.entries if path not in present]
+        return plan
+
+    def commit(self, plan: SyncPlan) -> None:
+        """Record a plan as applied and write the manifest to disk."""
+        for path in plan.removed:
+            self.entries.pop(path, None)
+        for path in plan.to_ingest:
+            self.entries[path] = self._pending[path]
+        self.save()
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+# ---------------------------------------------------------------------------
+# Collection copy / migration (no re-embedding)
+# ---------------------------------------------------------------------------
+
+@dataclass
+class CopyStats:
+    points: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        rate = self.points / self.seconds if self.seconds else 0.0
+        return f"{self.points} points copied in {self.seconds:.1f}s ({rate:.0f} points/s)"
+
+
+def _scroll_page_offsets(client: QdrantClient, collection: str, page_size: int) -> list:
+    """Start offsets of every scroll page, found with a cheap id-only pass."""
+    offsets = [None]
+    offset = None
+    while True:
+        _, offset = client.scroll(
+            collection_name=collection,
+            offset=offset,
+            limit=page_size,
+            with_payload=False,
+            with_vectors=False,
+        )
+        if offset is None:
+            return offsets
+        offsets.append(offset)
+
+
+def copy_collection(
+    client: QdrantClient,
+    source_collection: str,
+    target_collection: str,
+    target_client: Optional[QdrantClient] = None,
+    page_size: int = 1000,
+    workers: int = 4,
+    payload_transform: Optional[Callable[[dict], dict]] = None,
+    create_target: Optional[Callable[[QdrantClient, str, object], None]] = None,
+    vector_transform: Optional[Callable[[object], object]] = None,
+) -> CopyStats:
+    """
+    Copy every point (id, stored vectors, payload) from one collection into
+    another without calling the embeddings API.
+
+    Points are read in pages of `page_size` with their vectors. With
+    `workers > 1`, page start offsets are collected first with an id-only
+    scroll, then pages are fetched and bulk-upserted by parallel cursors.
+
+    If the target does not exist it is created by `create_target(client,
+    name, source_info)`, defaulting to the source's vector configuration;
+    pass a custom one to change HNSW, quantization or storage settings.
+    `payload_transform` can rewrite each payload (e.g. a new schema) and
+    `vector_transform` each point's stored vector(s) (e.g. add a reduced one).
+
+    Embedded (":memory:" / on-disk) Qdrant clients are not thread-safe;
+    use `workers=1` with them.
+    """
+    target_client = target_client or client
+    started = time.perf_counter()
+    source_info = client.get_collection(collection_name=source_collection)
+
+    if not target_client.collection_exists(collection_name=target_collection):
+        if create_target is None:
+            params = source_info.config.params
+            target_client.create_collection(
+                collection_name=target_collection,
+                vectors_config=params.vectors,
+                sparse_vectors_config=params.sparse_vectors,
+                metadata=source_info.config.metadata,
+            )
+        else:
+            create_target(target_client, target_collection, source_info)
+
+    def copy_page(offset) -> tuple[int, object]:
+        records, next_offset = client.scroll(
+            collection_name=source_collection,
+            offset=offset,
+            limit=page_size,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if records:
+            points = [
+                PointStruct(
+                    id=record.id,
+                    vector=vector_transform(record.vector) if vector_transform else record.vector,
+                    payload=payload_transform(record.payload or {}) if payload_transform else record.payload,
+                )
+                for record in records
+            ]
+            target_client.upsert(collection_name=target_collection, points=points, wait=True)
+        return len(records), next_offset
+
+    stats = CopyStats()
+    if workers <= 1:
+        offset = None
+        while True:
+            copied, offset = copy_page(offset)
+            stats.points += copied
+            if offset is None:
+                break
+    else:
+        offsets = _scroll_page_offsets(client, source_collection, page_size)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for copied, _ in pool.map(copy_page, offsets):
+                stats.points += copied
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Topic clusters (k-means over chunk embeddings)
+# ---------------------------------------------------------------------------
+
+# Centroids and representative chunks live in a small companion collection
+# next to each physical collection version: "<collection>__topics".
+_TOPICS_SUFFIX = "__topics"
+
+_TOPIC_TOKEN = re.compile(r"[a-z][a-z0-9_]{2,}")
+_TOPIC_STOPWORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has have
+    with this that from they will would there their what when which who how
+    into than then them these those some such only other also more most very
+    use used using each may its just over been being does did about between
+    page slide lecture example examples figure note
+""".split())
+
+
+def _topics_collection(collection_name: str) -> str:
+    return f"{collection_name}{_TOPICS_SUFFIX}"
+
+
+def _topic_tokens(text: str) -> list[str]:
+    return [t for t in _TOPIC_TOKEN.findall(text.lower()) if t not in _TOPIC_STOPWORDS]
+
+
+def kmeans(
+    vectors: np.ndarray,
+    k: int,
+    iterations: int = 25,
+    max_train: int = 20_000,
+    block_rows: int = 8192,
+    seed: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means (cosine) over the rows of `vectors`.
+    Returns (k x D unit centroids, one label per row).
+
+    Seeding is k-means++; at most `max_train` sampled rows are used to fit
+    the centroids, then every row is assigned in blocks of `block_rows`.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    k = max(1, min(k, n))
+    sample = vectors if n <= max_train else vectors[np.sort(rng.choice(n, max_train, replace=False))]
+    x = np.asarray(sample, dtype=np.float32)
+    x = x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+    centroids = np.empty((k, x.shape[1]), dtype=np.float32)
+    centroids[0] = x[rng.integers(len(x))]
+    distance = np.maximum(1.0 - x @ centroids[0], 0.0)
+    for i in range(1, k):
+        total = float((distance ** 2).sum())
+        pick = rng.choice(len(x), p=distance ** 2 / total) if total > 0 else rng.integers(len(x))
+        centroids[i] = x[pick]
+        distance = np.minimum(distance, np.maximum(1.0 - x @ centroids[i], 0.0))
+
+    labels = np.full(len(x), -1)
+    for _ in range(iterations):
+        similarity = x @ centroids.T
+        new_labels = similarity.argmax(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, x)
+        counts = np.bincount(labels, minlength=k)
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # Re-seed empty clusters with the rows furthest from their centroid.
+            worst = np.argsort(similarity[np.arange(len(x)), labels])[:len(empty)]
+            sums[empty] = x[worst]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+    all_labels = np.empty(n, dtype=np.int64)
+    for start in range(0, n, block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        all_labels[start:start + len(block)] = (block @ centroids.T).argmax(axis=1)
+    return centroids, all_labels
+
+
+def _scroll_vectors(
+    client: QdrantClient,
+    collection_name: str,
+    scroll_filter: Optional[Filter] = None,
+    page_size: int = 1000,
+) -> tuple[list, np.ndarray]:
+    """(ids, float32 matrix) of the dense vectors of the matching points, filled in place page by page."""
+    vector_name = _resolve_vector_name(client, collection_name)
+    vectors_config = client.get_collection(collection_name=collection_name).config.params.vectors
+    dim = vectors_config[vector_name].size if vector_name else vectors_config.size
+    total = client.count(collection_name=collection_name, count_filter=scroll_filter, exact=True).count
+    ids: list = []
+    vectors = np.empty((total, dim), dtype=np.float32)
+    offset = None
+    while len(ids) < total:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            offset=offset,
+            limit=min(page_size, total - len(ids)),
+            with_payload=False,
+            with_vectors=[vector_name] if vector_name else True,
+        )
+        for record in records:
+            vectors[len(ids)] = record.vector[vector_name] if vector_name else record.vector
+            ids.append(record.id)
+        if offset is None or not records:
+            break
+    return ids, vectors[:len(ids)]
+
+
+def build_topic_index(
+    client: QdrantClient,
+    collection_name: str,
+    k: int,
+    representatives: int = 20,
+    keywords: int = 12,
+    page_size: int = 1000,
+) -> list[dict]:
+    """
+    Cluster a collection's chunk embeddings into `k` topics and store:
+
+      • `metadata.topic` on every point (a FILTER_FIELDS field)
+      • one point per topic in "<collection>__topics": the centroid as its
+        vector, and as payload the topic's size, its most distinctive
+        keywords (c-TF-IDF), its main sources and the ids of its
+        `representatives` chunks closest to the centroid, best first.
+
+    Returns the topic payloads. No embedding calls are made. This is a full
+    re-cluster; `assign_topics()` labels chunks added later.
+    """
+    ids, vectors = _scroll_vectors(client, collection_name, page_size=page_size)
+    if not ids:
+        return []
+
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    centroids, labels = kmeans(vectors, k)
+    closeness = np.einsum("ij,ij->i", vectors, centroids[labels])
+    del vectors
+
+    members = [np.flatnonzero(labels == topic) for topic in range(len(centroids))]
+    for topic, rows_in_topic in enumerate(members):
+        if len(rows_in_topic):
+            client.set_payload(
+                collection_name=collection_name,
+                payload={"topic": topic},
+                points=[ids[row] for row in rows_in_topic],
+                key=QdrantVectorStore.METADATA_KEY,
+            )
+
+    # Second pass over the payloads: term and source counts per topic.
+    position = {point_id: row for row, point_id in enumerate(ids)}
+    term_counts = [dict() for _ in members]
+    source_counts = [dict() for _ in members]
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            offset=offset,
+            limit=page_size,
+            with_payload=True,
+            with_vectors=False,
+        )
+        for record in records:
+            topic = labels[position[record.id]]
+            for token in _topic_tokens(record.payload.get(QdrantVectorStore.CONTENT_KEY, "")):
+                term_counts[topic][token] = term_counts[topic].get(token, 0) + 1
+            source = (record.payload.get(QdrantVectorStore.METADATA_KEY) or {}).get("source")
+            if source:
+                source_counts[topic][source] = source_counts[topic].get(source, 0) + 1
+        if offset is None or not records:
+            break
+
+    topics_with_term: dict[str, int] = {}
+    for counts in term_counts:
+        for token in counts:
+            topics_with_term[token] = topics_with_term.get(token, 0) + 1
+
+    topics = []
+    for topic, rows_in_topic in enumerate(members):
+        counts = term_counts[topic]
+        total = sum(counts.values()) or 1
+        weights = {
+            token: count / total * math.log(1 + len(members) / topics_with_term[token])
+            for token, count in counts.items()
+        }
+        central = rows_in_topic[np.argsort(-closeness[rows_in_topic])][:representatives]
+        topics.append({
+            "topic": topic,
+            "size": int(len(rows_in_topic)),
+            "keywords": sorted(weights, key=weights.get, reverse=True)[:keywords],
+            "sources": sorted(source_counts[topic], key=source_counts[topic].get, reverse=True)[:3],
+            "representatives": [ids[row] for row in central],
+        })
+
+    name = _topics_collection(collection_name)
+    if client.collection_exists(collection_name=name):
+        client.delete_collection(collection_name=name)
+    client.create_collection(
+        collection_name=name,
+        vectors_config={"dense": VectorParams(size=centroids.shape[1], distance=Distance.COSINE)},
+    )
+    client.upsert(
+        collection_name=name,
+        points=[
+            PointStruct(id=topic["topic"], vector={"dense": centroid.tolist()}, payload=topic)
+            for topic, centroid in zip(topics, centroids)
+        ],
+    )
+    return topics
+
+
+def assign_topics(client: QdrantClient, collection_name: str, page_size: int = 1000) -> int:
+    """
+    Label the points of a collection that have no `metadata.topic` yet with
+    their nearest stored centroid, and refresh each topic's size. Keywords,
+    sources and representatives keep their values from the last
+    `build_topic_index()`. Returns the number of points labelled.
+    """
+    topics = load_topics(client, collection_name)
+    if not topics:
+        return 0
+    untagged = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key=f"{QdrantVectorStore.METADATA_KEY}.topic"))])
+    ids, vectors = _scroll_vectors(client, collection_name, untagged, page_size)
+    if ids:
+        centroids = np.asarray([topic["centroid"] for topic in topics], dtype=np.float32)
+        labels = (vectors @ centroids.T).argmax(axis=1)
+        del vectors
+        for row, topic in enumerate(topics):
+            rows_in_topic = np.flatnonzero(labels == row)
+            if len(rows_in_topic):
+                client.set_payload(
+                    collection_name=collection_name,
+                    payload={"topic": topic["topic"]},
+                    points=[ids[i] for i in rows_in_topic],
+                    key=QdrantVectorStore.METADATA_KEY,
+                )
+
+    name = _topics_collection(collection_name)
+    for topic in topics:
+        size = client.count(
+            collection_name=collection_name, count_filter=qdrant_filter({"topic": topic["topic"]}), exact=True
+        ).count
+        if size != topic["size"]:
+            client.set_payload(collection_name=name, payload={"size": size}, points=[topic["topic"]])
+    return len(ids)
+
+
+def _without_topic(payload: dict) -> dict:
+    """`payload` minus its `metadata.topic`, a label that only means something next to its own topic index."""
+    metadata = payload.get(QdrantVectorStore.METADATA_KEY)
+    if not isinstance(metadata, dict) or "topic" not in metadata:
+        return payload
+    return {**payload, QdrantVectorStore.METADATA_KEY: {k: v for k, v in metadata.items() if k != "topic"}}
+
+
+def load_topics(client: QdrantClient, collection_name: str) -> list[dict]:
+    """Topic payloads of a collection (see `build_topic_index()`), each with its "centroid"; [] if none."""
+    name = _topics_collection(_resolve_alias(client, collection_name))
+    if not client.collection_exists(collection_name=name):
+        return []
+    records, _ = client.scroll(collection_name=name, limit=10_000, with_payload=True, with_vectors=True)
+    topics = [dict(record.payload, centroid=record.vector["dense"]) for record in records]
+    return sorted(topics, key=lambda topic: topic["topic"])
+
+
+def match_topic(text: str, topics: list[dict]) -> Optional[dict]:
+    """
+    The topic whose keywords best cover `text` ("inheritance and
+    polymorphism"), weighting earlier keywords higher; None if no keyword
+    occurs in it.
+    """
+    tokens = set(_topic_tokens(text))
+    tokens |= {token[:-1] for token in tokens if token.endswith("s")}
+    best, best_score = None, 0.0
+    for topic in topics:
+        score = sum(
+            1.0 / (1 + rank)
+            for rank, keyword in enumerate(topic.get("keywords", []))
+            if keyword in tokens or keyword.rstrip("s") in tokens
+        )
+        if score > best_score:
+            best, best_score = topic, score
+    return best
+
+
+# ---------------------------------------------------------------------------
+# Summary tier (page-window and document summaries)
+# ---------------------------------------------------------------------------
+
+# Summaries live in their own vector space next to each physical collection
+# version: "<collection>__summaries", one point per page window and per document.
+_SUMMARIES_SUFFIX = "__summaries"
+_COMPANION_SUFFIXES = (_TOPICS_SUFFIX, _SUMMARIES_SUFFIX)
+
+SUMMARY_INPUT_CHARS = 24_000
+
+WINDOW_SUMMARY_PROMPT = """Summarize this course material from {file_name}, pages {first}-{last}, for a student revising it.
+Cover every main concept, definition, rule and example in concise bullet points.
+Use only the material below; do not add facts.
+
+{text}"""
+
+DOCUMENT_SUMMARY_PROMPT = """Below are summaries of consecutive sections of {file_name}.
+Combine them into one overview of the whole document for a student revising it:
+a short paragraph on what it covers, then the key concepts as bullet points.
+Use only the summaries below; do not add facts.
+
+{text}"""
+
+
+def _summaries_collection(collection_name: str) -> str:
+    return f"{collection_name}{_SUMMARIES_SUFFIX}"
+
+
+def _summary_point_id(source: str, level: str, first: int, last: int, text: str) -> str:
+    """Keyed on the summarized text, so unchanged windows keep their summary."""
+    return str(uuid.uuid5(_POINT_ID_NAMESPACE, f"summary|{source}|{level}|{first}-{last}|{text_hash(text)}"))
+
+
+def _existing_points(client: QdrantClient, collection_name: Optional[str], ids: list[str]) -> dict:
+    """{id: Record with vectors} for the `ids` already stored in `collection_name`."""
+    if not collection_name or not ids or not client.collection_exists(collection_name=collection_name):
+        return {}
+    found = {}
+    for batch in _batched(ids, 256):
+        for record in client.retrieve(collection_name=collection_name, ids=batch, with_payload=True, with_vectors=True):
+            found[str(record.id)] = record
+    return found
+
+
+def build_summary_index(
+    client: QdrantClient,
+    collection_name: str,
+    summarize: Callable[[str], str],
+    embeddings: Embeddings,
+    window_pages: int = 5,
+    workers: int = 4,
+    reuse_from: Optional[str] = None,
+    page_size: int = 1000,
+) -> dict:
+    """
+    Summarize every source of a collection into "<collection>__summaries":
+    one summary per `window_pages` consecutive pages ("window") and one per
+    source built from its window summaries ("document"), each embedded.
+
+    Summary points carry the source's course / material_id / lecture and
+    the list of pages they cover, so the same filters as for chunks apply,
+    plus `level`. A summary whose input text is unchanged is kept as is
+    (or copied from `reuse_from`, e.g. the previous collection version), so
+    re-running after a sync only calls the LLM for changed pages. Summaries
+    of removed sources are deleted. Only one source's pages are held in
+    memory at a time. Returns counts of written, reused and deleted
+    summaries.
+    """
+    def scroll(scroll_filter: Optional[Filter], with_payload) -> Iterator:
+        offset = None
+        while True:
+            records, offset = client.scroll(
+                collection_name=collection_name,
+                scroll_filter=scroll_filter,
+                offset=offset,
+                limit=page_size,
+                with_payload=with_payload,
+                with_vectors=False,
+            )
+            yield from records
+            if offset is None or not records:
+                break
+
+    # One pass over the source names only; then each source's chunks are read
+    # (by an indexed `source` filter), summarized and written before the next.
+    sources = sorted({
+        source
+        for record in scroll(None, [f"{QdrantVectorStore.METADATA_KEY}.source"])
+        if (source := (record.payload.get(QdrantVectorStore.METADATA_KEY) or {}).get("source"))
+    })
+
+    target = _summaries_collection(collection_name)
+    target_exists = client.collection_exists(collection_name=target)
+    kept: set[str] = set()
+    written = reused = 0
+
+    def summarize_source(source: str) -> None:
+        nonlocal target_exists, written, reused
+        pages: dict[int, list[tuple[int, str]]] = {}
+        base: dict = {}
+        for record in scroll(qdrant_filter({"source": source}), True):
+            metadata = record.payload.get(QdrantVectorStore.METADATA_KEY) or {}
+            pages.setdefault(int(metadata.get("page") or 0), []).append(
+                (int(metadata.get("start_index") or 0), record.payload.get(QdrantVectorStore.CONTENT_KEY, ""))
+            )
+            base = base or {
+                field: metadata[field] for field in ("course", "material_id", "lecture") if metadata.get(field) is not None
+            }
+        if not pages:
+            return
+
+        file_name = Path(source).name
+        numbers = sorted(pages)
+        summaries: dict[str, dict] = {}    # point id -> {"prompt", "metadata"}, then "text" and "vector"
+        for i in range(0, len(numbers), max(1, window_pages)):
+            window = numbers[i:i + max(1, window_pages)]
+            text = "\n\n".join(
+                chunk for page in window for _, chunk in sorted(pages[page], key=lambda item: item[0])
+            )[:SUMMARY_INPUT_CHARS]
+            point_id = _summary_point_id(source, "window", window[0], window[-1], text)
+            summaries[point_id] = {
+                "prompt": WINDOW_SUMMARY_PROMPT.format(
+                    file_name=file_name, first=window[0] + 1, last=window[-1] + 1, text=text
+                ),
+                "metadata": {**base, "source": source, "level": "window", "page": window},
+            }
+        window_ids = list(summaries)
+        in_target: set[str] = set()
+
+        def load_existing(ids: list[str]) -> int:
+            found = _existing_points(client, target if target_exists else None, ids)
+            in_target.update(found)
+            found.update(_existing_points(client, reuse_from, [i for i in ids if i not in found]))
+            for point_id, record in found.items():
+                summaries[point_id]["text"] = record.payload.get(QdrantVectorStore.CONTENT_KEY, "")
+                summaries[point_id]["vector"] = record.vector
+            return len(found)
+
+        def run(items: list[str]) -> None:
+            todo = [i for i in items if "text" not in summaries[i]]
+            for point_id, text in zip(todo, pool.map(lambda i: summarize(summaries[i]["prompt"]), todo)):
+                summaries[point_id]["text"] = text.strip()
+
+        reused += load_existing(window_ids)
+        run(window_ids)
+
+        # The document summary is built from the window summaries.
+        text = "\n\n".join(summaries[i]["text"] for i in window_ids)[:SUMMARY_INPUT_CHARS]
+        point_id = _summary_point_id(source, "document", numbers[0], numbers[-1], text)
+        summaries[point_id] = {
+            "prompt": DOCUMENT_SUMMARY_PROMPT.format(file_name=file_name, text=text),
+            "metadata": {**base, "source": source, "level": "document", "page": numbers},
+        }
+        reused += load_existing([point_id])
+        run([point_id])
+
+        new = [i for i in summaries if "vector" not in summaries[i]]
+        for batch in _batched(new, 64):
+            for point_id, vector in zip(batch, embeddings.embed_documents([summaries[i]["text"] for i in batch])):
+                summaries[point_id]["vector"] = {"dense": vector}
+        written += len(new)
+        kept.update(summaries)
+
+        points = [
+            PointStruct(id=point_id, vector=item["vector"], payload={
+                QdrantVectorStore.CONTENT_KEY: item["text"],
+                QdrantVectorStore.METADATA_KEY: item["metadata"],
+            })
+            for point_id, item in summaries.items()
+            if point_id not in in_target
+        ]
+        if points and not target_exists:
+            client.create_collection(
+                collection_name=target,
+                vectors_config={"dense": VectorParams(size=len(points[0].vector["dense"]), distance=Distance.COSINE)},
+            )
+            target_exists = True
+        for batch in _batched(points, 256):
+            client.upsert(collection_name=target, points=batch)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for source in sources:
+            summarize_source(source)
+
+    stale = []
+    if target_exists:
+        offset = None
+        while True:
+            records, offset = client.scroll(collection_name=target, offset=offset, limit=page_size, with_payload=False)
+            stale.extend(record.id for record in records if str(record.id) not in kept)
+            if offset is None or not records:
+                break
+    if stale:
+        client.delete(collection_name=target, points_selector=stale)
+    return {"written": written, "reused": reused, "deleted": len(stale)}
+
+
+# ---------------------------------------------------------------------------
+# Memory-mapped vector store (read-only export of a collection)
+# ---------------------------------------------------------------------------
+
+def export_mmap_store(
+    client: QdrantClient,
+    collection_name: str,
+    directory: str,
+    dtype: str = "float16",
+    page_size: int = 1000,
+    embedding_model: Optional[str] = None,
+) -> int:
+    """
+    Write a collection's dense vectors and payloads as files for
+    `MmapVectorStore`, and return the number of rows written.
+
+      vectors.npy     N x D matrix of unit-length rows, float16 or int8
+      scales.npy      per-row float32 scales (int8 only)
+      payloads.jsonl  one {"id", "page_content", "metadata"} line per row
+      offsets.npy     byte offset of each line, plus the file size
+      index/          sorted ids and per-filter-field value -> rows arrays (.npy)
+      meta.json       row count, dimension, dtype, source and embedding model
+      topics.json     the collection's topic index with centroids, if it has one
+      summaries/      its summary tier as a nested store of the same layout, if any
+
+    `directory` is a symlink to a versioned sibling directory; see
+    `_publish_mmap_store()` for how a re-export replaces it.
+    """
+    if dtype not in ("float16", "int8"):
+        raise ValueError(f"Unknown mmap dtype {dtype!r}; use 'float16' or 'int8'.")
+    return _publish_mmap_store(
+        directory, lambda version: _export_mmap_files(client, collection_name, version, dtype, page_size, embedding_model)
+    )
+
+
+def _export_mmap_files(
+    client: QdrantClient,
+    collection_name: str,
+    directory: str,
+    dtype: str,
+    page_size: int,
+    embedding_model: Optional[str],
+) -> int:
+    alias, collection_name = collection_name, _resolve_alias(client, collection_name)
+    vector_name = _resolve_vector_name(client, collection_name)
+    vectors_config = client.get_collection(collection_name=collection_name).config.params.vectors
+    dim = vectors_config[vector_name].size if vector_name else vectors_config.size
+    capacity = client.count(collection_name=collection_name, exact=True).count
+
+    def blocks() -> Iterator[tuple[list, np.ndarray, list[dict]]]:
+        rows = 0
+        offset = None
+        while rows < capacity:
+            records, offset = client.scroll(
+                collection_name=collection_name,
+                offset=offset,
+                limit=min(page_size, capacity - rows),
+                with_payload=True,
+                with_vectors=[vector_name] if vector_name else True,
+            )
+            if not records:
+                return
+            yield (
+                [record.id for record in records],
+                np.asarray(
+                    [record.vector[vector_name] if vector_name else record.vector for record in records],
+                    dtype=np.float32,
+                ),
+                [record.payload or {} for record in records],
+            )
+            rows += len(records)
+            if offset is None:
+                return
+
+    return _write_mmap_store(blocks(), capacity, dim, directory, dtype, {
+        "collection": alias,
+        "source_collection": collection_name,
+        **_recorded_identity(_stored_metadata(client, collection_name), embedding_model),
+    }, topics=load_topics(client, collection_name), summaries=(
+        (client, _summaries_collection(collection_name), page_size)
+        if client.collection_exists(collection_name=_summaries_collection(collection_name)) else None
+    ))
+
+
+def _publish_mmap_store(directory: str, write: Callable[[str], int]) -> int:
+    """
+    Have `write` fill a new versioned sibling directory (".<name>.v<ms>"),
+    then point the `directory` symlink at it with one atomic rename: readers
+    see either the old store or the new one, never a missing or partial one.
+    The previous version is kept for workers that still have it open; older
+    ones are removed. A plain directory from before versioning is moved aside
+    on the first publish.
+    """
+    target = Path(directory)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    stamp = int(time.time() * 1000)
+    while target.with_name(f".{target.name}.v{stamp}").exists():
+        stamp += 1
+    version = target.with_name(f".{target.name}.v{stamp}")
+    try:
+        rows = write(str(version))
+    except BaseException:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+
+    if target.exists() and not target.is_symlink():
+        os.replace(target, target.with_name(f".{target.name}.v0"))
+    link = target.with_name(f".{target.name}.link-{os.getpid()}")
+    if link.is_symlink() or link.exists():
+        link.unlink()
+    os.symlink(version.name, link)
+    os.replace(link, target)
+
+    versions = sorted(p for p in target.parent.glob(f".{target.name}.v*") if p.is_dir() and p != version)
+    for old in versions[:-1]:
+        shutil.rmtree(old, ignore_errors=True)
+    return rows
+
+
+def _mmap_filter_values(metadata: dict) -> Iterator[tuple[str, object]]:
+    """(field, value) pairs a row is found under by `MmapVectorStore` filters."""
+    for field in FILTER_FIELDS:
+        value = metadata.get(field)
+        if value is None and metadata.get("source"):
+            if field == "material_id":
+                value = material_id_for(metadata["source"])
+            elif field == "lecture":
+                value = lecture_number_for(metadata["source"])
+        # A summary covers a list of pages; it matches any of them.
+        for item in value if isinstance(value, list) else [value]:
+            if item is not None:
+                yield field, item
+
+
+def _mmap_index_arrays(ids: list, metadatas: Iterable[dict]) -> dict[str, np.ndarray]:
+    """
+    The lookup arrays of an `MmapVectorStore`, from each row's id and metadata:
+
+      ids / id_rows                 point ids (as strings) sorted, and their rows
+      <field>.keys                  JSON-encoded values of a filter field, sorted
+      <field>.starts / <field>.rows rows of keys[i] are rows[starts[i]:starts[i + 1]]
+    """
+    index: dict[str, dict[str, list[int]]] = {field: {} for field in FILTER_FIELDS}
+    for row, metadata in enumerate(metadatas):
+        for field, value in _mmap_filter_values(metadata):
+            index[field].setdefault(json.dumps(value), []).append(row)
+
+    id_strings = np.asarray([str(point_id) for point_id in ids], dtype=str)
+    id_order = np.argsort(id_strings, kind="stable")
+    arrays = {"ids": id_strings[id_order], "id_rows": id_order.astype(np.int64)}
+    for field, values in index.items():
+        keys = sorted(values)
+        arrays[f"{field}.keys"] = np.asarray(keys, dtype=str)
+        arrays[f"{field}.starts"] = np.cumsum([0] + [len(values[key]) for key in keys], dtype=np.int64)
+        arrays[f"{field}.rows"] = np.asarray([row for key in keys for row in values[key]], dtype=np.int64)
+    return arrays
+
+
+def _write_mmap_store(
+    blocks: Iterable[tuple[list, np.ndarray, list[dict]]],
+    capacity: int,
+    dim: int,
+    directory: str,
+    dtype: str,
+    meta: dict,
+    topics: Optional[list[dict]] = None,
+    summaries: Optional[tuple[QdrantClient, str, int]] = None,
+) -> int:
+    """
+    Write (ids, float32 vectors, payloads) blocks, and any topic index, as an
+    `MmapVectorStore` in the new directory `directory`. `summaries` =
+    (client, summary collection, page size) is exported alongside as a
+    nested store in "summaries/".
+    """
+    tmp = Path(directory)
+    tmp.mkdir(parents=True)
+
+    matrix = np.lib.format.open_memmap(
+        tmp / "vectors.npy", mode="w+", dtype=np.dtype(dtype), shape=(capacity, dim)
+    )
+    scales = np.ones(capacity, dtype=np.float32)
+    offsets = [0]
+    point_ids, metadatas = [], []
+    rows = 0
+    with open(tmp / "payloads.jsonl", "wb") as payloads:
+        for ids, block, block_payloads in blocks:
+            block = block[:capacity - rows]
+            block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+            if dtype == "int8":
+                block_scales = np.maximum(np.abs(block).max(axis=1), 1e-12) / 127.0
+                scales[rows:rows + len(block)] = block_scales
+                block = np.round(block / block_scales[:, None])
+            matrix[rows:rows + len(block)] = block
+            for point_id, payload in zip(ids, block_payloads[:len(block)]):
+                metadata = payload.get(QdrantVectorStore.METADATA_KEY) or {}
+                line = json.dumps({
+                    "id": point_id,
+                    "page_content": payload.get(QdrantVectorStore.CONTENT_KEY, ""),
+                    "metadata": metadata,
+                }).encode("utf-8") + b"\n"
+                payloads.write(line)
+                offsets.append(offsets[-1] + len(line))
+                point_ids.append(point_id)
+                metadatas.append(metadata)
+            rows += len(block)
+    matrix.flush()
+    del matrix
+
+    np.save(tmp / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+    if dtype == "int8":
+        np.save(tmp / "scales.npy", scales[:rows])
+    (tmp / "index").mkdir()
+    for name, array in _mmap_index_arrays(point_ids, metadatas).items():
+        np.save(tmp / "index" / f"{name}.npy", array)
+    del point_ids, metadatas
+    if topics:
+        (tmp / "topics.json").write_text(json.dumps(topics))
+    if summaries is not None:
+        client, summary_collection, page_size = summaries
+        _export_mmap_files(client, summary_collection, str(tmp / "summaries"), dtype, page_size, None)
+    (tmp / "meta.json").write_text(json.dumps({
+        "rows": rows,
+        "dim": dim,
+        "dtype": dtype,
+        **meta,
+        "created": datetime.now().isoformat(timespec="seconds"),
+    }, indent=2))
+    return rows
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Read-only vector store over the files written by `export_mmap_store()`.
+
+    Vectors, payloads and the id / filter index arrays are memory-mapped,
+    so every process that opens the same directory shares one copy through
+    the OS page cache. Search is an exact cosine top-k over the matrix in
+    blocks of `block_rows` rows.
+
+    The `directory` symlink is resolved once, so a store keeps reading the
+    export version it opened while a re-export is published.
+    """
+
+    def __init__(self, directory: str, embedding: Embeddings, block_rows: int = 65536):
+        path = Path(directory).resolve()
+        self.directory = str(path)
+        self.meta = json.loads((path / "meta.json").read_text())
+        self.collection_name = self.meta.get("collection", path.name)
+        self.block_rows = block_rows
+        self._embedding = embedding
+        rows = self.meta["rows"]
+        self._vectors = np.load(path / "vectors.npy", mmap_mode="r")[:rows]
+        self._scales = np.load(path / "scales.npy", mmap_mode="r") if self.meta["dtype"] == "int8" else None
+        self._offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        with open(path / "payloads.jsonl", "rb") as f:
+            self._payloads = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if rows else b""
+        index_path = path / "index"
+        # Exports from before the index files existed get the arrays built on first use.
+        self._index: Optional[dict[str, np.ndarray]] = None
+        if index_path.exists():
+            names = ["ids", "id_rows"] + [
+                f"{field}.{part}" for field in FILTER_FIELDS for part in ("keys", "starts", "rows")
+            ]
+            self._index = {name: np.load(index_path / f"{name}.npy", mmap_mode="r") for name in names}
+        topics_path = path / "topics.json"
+        self.topics: list[dict] = json.loads(topics_path.read_text()) if topics_path.exists() else []
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("MmapVectorStore is read-only; ingest into Qdrant and export again.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("MmapVectorStore is read-only; build it with export_mmap_store().")
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities.
+        return lambda score: score
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4, filter: Optional[dict] = None, **kwargs
+    ) -> list[tuple[Document, float]]:
+        """`filter` is a retrieve()-style dict, e.g. {"course": "CS201", "page": [3, 4]}."""
+        return self.similarity_search_with_score_by_vectors([embedding], k, filter)[0]
+
+    def similarity_search_with_score_by_vectors(
+        self, embeddings: list[list[float]], k: int = 4, filter: Optional[dict] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        Top-k for several query vectors with the same filter in one pass over
+        the matrix: each block is read once and scored against every query.
+        """
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        rows = self._rows_matching(filter) if filter else None
+        total = len(self._vectors) if rows is None else len(rows)
+
+        best_rows = [np.empty(0, dtype=np.int64) for _ in queries]
+        best_scores = [np.empty(0, dtype=np.float32) for _ in queries]
+        for start in range(0, total, self.block_rows):
+            if rows is None:
+                block_rows = np.arange(start, min(start + self.block_rows, total))
+                block = self._vectors[start:start + self.block_rows]
+            else:
+                block_rows = rows[start:start + self.block_rows]
+                block = self._vectors[block_rows]
+            scores = block.astype(np.float32) @ queries.T
+            if self._scales is not None:
+                scores *= self._scales[block_rows][:, None]
+            for j in range(len(queries)):
+                column = scores[:, j]
+                top = np.argpartition(-column, k)[:k] if len(column) > k else np.arange(len(column))
+                best_rows[j] = np.concatenate([best_rows[j], block_rows[top]])
+                best_scores[j] = np.concatenate([best_scores[j], column[top]])
+                if len(best_rows[j]) > k:
+                    keep = np.argpartition(-best_scores[j], k)[:k]
+                    best_rows[j], best_scores[j] = best_rows[j][keep], best_scores[j][keep]
+
+        results = []
+        for found_rows, found_scores in zip(best_rows, best_scores):
+            order = np.argsort(-found_scores)
+            results.append([(self._document(int(found_rows[i])), float(found_scores[i])) for i in order])
+        return results
+
+    def _index_arrays(self) -> dict[str, np.ndarray]:
+        if self._index is None:
+            records = [self._record(row) for row in range(len(self))]
+            self._index = _mmap_index_arrays([r["id"] for r in records], [r["metadata"] for r in records])
+        return self._index
+
+    def _rows_for(self, field: str, value) -> np.ndarray:
+        index = self._index_arrays()
+        keys, key = index[f"{field}.keys"], json.dumps(value)
+        i = int(np.searchsorted(keys, key))
+        if i == len(keys) or keys[i] != key:
+            return np.empty(0, dtype=np.int64)
+        starts = index[f"{field}.starts"]
+        return np.asarray(index[f"{field}.rows"][starts[i]:starts[i + 1]])
+
+    def _rows_matching(self, filters: dict) -> np.ndarray:
+        """Sorted row numbers whose metadata matches every field of `filters`."""
+        matched: Optional[np.ndarray] = None
+        for field, values in normalize_filters(filters).items():
+            empty = np.empty(0, dtype=np.int64)
+            field_rows = np.unique(np.concatenate([self._rows_for(field, value) for value in values] or [empty]))
+            matched = field_rows if matched is None else np.intersect1d(matched, field_rows)
+        return np.arange(len(self)) if matched is None else matched
+
+    def get_by_ids(self, ids: list) -> list[Document]:
+        """Documents for the given point ids, in the same order; unknown ids are skipped."""
+        index = self._index_arrays()
+        sorted_ids, id_rows = index["ids"], index["id_rows"]
+        docs = []
+        for point_id in map(str, ids):
+            i = int(np.searchsorted(sorted_ids, point_id))
+            if i < len(sorted_ids) and sorted_ids[i] == point_id:
+                docs.append(self._document(int(id_rows[i])))
+        return docs
+
+    def get_by_filter(self, filters: dict, limit: Optional[int] = 50) -> list[Document]:
+        """Documents whose metadata matches `filters` (at most `limit`; None: all), in export order (no search)."""
+        return [self._document(int(row)) for row in self._rows_matching(filters)[:limit]]
+
+    def _record(self, row: int) -> dict:
+        return json.loads(self._payloads[int(self._offsets[row]):int(self._offsets[row + 1])])
+
+    def _document(self, row: int) -> Document:
+        record = self._record(row)
+        metadata = record["metadata"]
+        metadata["_id"] = record["id"]
+        metadata["_collection_name"] = self.collection_name
+        return Document(page_content=record["page_content"], metadata=metadata)
+
+
+# ---------------------------------------------------------------------------
+# Collection snapshots (portable export / import, no re-embedding)
+# ---------------------------------------------------------------------------
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def _snapshot_codec() -> str:
+    """zstd when the `zstandard` package is installed, gzip otherwise."""
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return "gz"
+    return "zst"
+
+
+def _open_compressed_writer(path: Path, codec: str):
+    if codec == "zst":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=10, threads=-1).stream_writer(open(path, "wb"))
+    return gzip.open(path, "wb", compresslevel=6)
+
+
+def _open_compressed_reader(fileobj, codec: str):
+    if codec == "zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("This snapshot is zstd-compressed; pip install zstandard to read it.")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(fileobj), buffer_size=1 << 20)
+    return gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+
+def export_snapshot(
+    client: QdrantClient,
+    collection_name: str,
+    path: str,
+    page_size: int = 1000,
+    embedding_model: Optional[str] = None,
+) -> int:
+    """
+    Export every point of a collection (ids, vectors, payloads) and its
+    vector configuration to one portable file; returns the point count.
+
+    The file is an uncompressed tar of compressed members:
+      manifest.json       format, codec, point count, vector / sparse / HNSW /
+                          quantization config, embedding model
+      vectors-<i>.npy.*   one float32 N x D matrix per named dense vector
+      points.jsonl.*      one {"id", "payload", "sparse"} line per point, same order
+
+    Members are zstd-compressed (gzip without `zstandard`).
+    """
+    source = _resolve_alias(client, collection_name)
+    info = client.get_collection(collection_name=source)
+    params = info.config.params
+    unnamed = not isinstance(params.vectors, dict)
+    dense = {"": params.vectors} if unnamed else dict(params.vectors)
+    names = list(dense)
+    codec = _snapshot_codec()
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=target.parent, prefix=f".{target.name}.") as tmp:
+        staging = Path(tmp)
+        raw_files = [open(staging / f"vectors-{i}.f32", "wb") for i in range(len(names))]
+        rows = 0
+        offset = None
+        with _open_compressed_writer(staging / f"points.jsonl.{codec}", codec) as points:
+            while True:
+                records, offset = client.scroll(
+                    collection_name=source,
+                    offset=offset,
+                    limit=page_size,
+                    with_payload=True,
+                    with_vectors=True,
+                )
+                for record in records:
+                    vectors = {"": record.vector} if unnamed else (record.vector or {})
+                    for raw, name in zip(raw_files, names):
+                        raw.write(np.asarray(vectors[name], dtype=np.float32).tobytes())
+                    line = {"id": record.id, "payload": record.payload or {}}
+                    sparse = {
+                        name: {"indices": list(vector.indices), "values": list(vector.values)}
+                        for name, vector in vectors.items()
+                        if name not in dense
+                    }
+                    if sparse:
+                        line["sparse"] = sparse
+                    points.write(json.dumps(line).encode("utf-8") + b"\n")
+                rows += len(records)
+                if offset is None:
+                    break
+        for raw in raw_files:
+            raw.close()
+
+        for i, name in enumerate(names):
+            with _open_compressed_writer(staging / f"vectors-{i}.npy.{codec}", codec) as out:
+                np.lib.format.write_array_header_1_0(out, {
+                    "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                    "fortran_order": False,
+                    "shape": (rows, dense[name].size),
+                })
+                with open(staging / f"vectors-{i}.f32", "rb") as raw:
+                    shutil.copyfileobj(raw, out, 1 << 20)
+            os.remove(staging / f"vectors-{i}.f32")
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT_VERSION,
+            "codec": codec,
+            "collection": collection_name,
+            "points": rows,
+            "vectors": [
+                {"name": name, "file": f"vectors-{i}.npy.{codec}", "params": dense[name].model_dump(mode="json")}
+                for i, name in enumerate(names)
+            ],
+            "unnamed_vector": unnamed,
+            "sparse_vectors": {
+                name: value.model_dump(mode="json") for name, value in (params.sparse_vectors or {}).items()
+            },
+            "hnsw_config": info.config.hnsw_config.model_dump(mode="json") if info.config.hnsw_config else None,
+            "quantization_config": (
+                info.config.quantization_config.model_dump(mode="json") if info.config.quantization_config else None
+            ),
+            "metadata": info.config.metadata or {},
+            "embedding_model": embedding_model,
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+        (staging / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+        partial = staging / "snapshot.tar"
+        with tarfile.open(partial, "w") as tar:
+            tar.add(staging / "manifest.json", arcname="manifest.json")
+            tar.add(staging / f"points.jsonl.{codec}", arcname=f"points.jsonl.{codec}")
+            for entry in manifest["vectors"]:
+                tar.add(staging / entry["file"], arcname=entry["file"])
+        os.replace(partial, target)
+    return rows
+
+
+def read_snapshot_manifest(path: str) -> dict:
+    with tarfile.open(path, "r") as tar:
+        return json.load(tar.extractfile("manifest.json"))
+
+
+def iter_snapshot(path: str, batch_size: int = 1000) -> Iterator[tuple[list, dict[str, np.ndarray], list[dict]]]:
+    """
+    Yield (ids, {vector name: float32 block}, point lines) batches from a
+    snapshot file, streaming each member instead of loading it whole.
+    """
+    with tarfile.open(path, "r") as tar:
+        manifest = json.load(tar.extractfile("manifest.json"))
+        if manifest.get("format") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {manifest.get('format')!r} in {path}.")
+        codec = manifest["codec"]
+        points = _open_compressed_reader(tar.extractfile(f"points.jsonl.{codec}"), codec)
+        matrices = {}
+        for entry in manifest["vectors"]:
+            reader = _open_compressed_reader(tar.extractfile(entry["file"]), codec)
+            np.lib.format.read_magic(reader)
+            shape, _, dtype = np.lib.format.read_array_header_1_0(reader)
+            matrices[entry["name"]] = (reader, shape[1], dtype)
+
+        remaining = manifest["points"]
+        while remaining:
+            count = min(batch_size, remaining)
+            lines = [json.loads(points.readline()) for _ in range(count)]
+            blocks = {
+                name: np.frombuffer(reader.read(count * dim * dtype.itemsize), dtype=dtype).reshape(count, dim)
+                for name, (reader, dim, dtype) in matrices.items()
+            }
+            yield [line["id"] for line in lines], blocks, lines
+            remaining -= count
+
+
+def _create_collection_from_manifest(client: QdrantClient, name: str, manifest: dict) -> None:
+    from pydantic import TypeAdapter
+    from qdrant_client.models import QuantizationConfig
+
+    vectors = {entry["name"]: VectorParams.model_validate(entry["params"]) for entry in manifest["vectors"]}
+    hnsw = manifest.get("hnsw_config")
+    quantization = manifest.get("quantization_config")
+    client.create_collection(
+        collection_name=name,
+        vectors_config=vectors[""] if manifest["unnamed_vector"] else vectors,
+        sparse_vectors_config={
+            key: SparseVectorParams.model_validate(value) for key, value in manifest["sparse_vectors"].items()
+        } or None,
+        hnsw_config=HnswConfigDiff.model_validate(hnsw) if hnsw else None,
+        quantization_config=TypeAdapter(QuantizationConfig).validate_python(quantization) if quantization else None,
+        metadata=manifest.get("metadata") or None,
+    )
+
+
+def import_snapshot(
+    path: str,
+    client: QdrantClient,
+    collection_name: Optional[str] = None,
+    batch_size: int = 1000,
+    recreate: bool = False,
+    payload_transform: Optional[Callable[[dict], dict]] = None,
+) -> int:
+    """
+    Bulk-load a snapshot into a Qdrant collection (default: the exported
+    name). Existing points with the same ids are overwritten;
+    `payload_transform` can rewrite each payload on the way in. Returns the
+    number of points loaded.
 
-    Older collections in this project were created with an unnamed dense vector,
-    while newer runs may use the named vector `dense`.
+    A missing collection, or every import with `recreate`, goes into a new
+    version created from the stored config; the alias is switched to it once
+    all points are in, and with `recreate` the version it replaces is dropped.
     """
-    try:
-        collection = client.get_collection(collection_name=collection_name)
-    except Exception:
-        return default
+    manifest = read_snapshot_manifest(path)
+    alias = collection_name or manifest["collection"]
+    previous = _resolve_alias(client, alias)
+    name = previous
+    if recreate or not client.collection_exists(collection_name=previous):
+        name = _new_collection_version(alias)
+        _create_collection_from_manifest(client, name, manifest)
+
+    loaded = 0
+    for ids, blocks, lines in iter_snapshot(path, batch_size):
+        points = []
+        for row, (point_id, line) in enumerate(zip(ids, lines)):
+            vector = {key: block[row].tolist() for key, block in blocks.items()}
+            for key, sparse in line.get("sparse", {}).items():
+                vector[key] = SparseVector(**sparse)
+            points.append(PointStruct(
+                id=point_id,
+                vector=vector[""] if manifest["unnamed_vector"] else vector,
+                payload=payload_transform(line["payload"]) if payload_transform else line["payload"],
+            ))
+        client.upsert(collection_name=name, points=points, wait=True)
+        loaded += len(points)
+
+    if name != previous:
+        replaced = client.collection_exists(collection_name=previous) and _alias_target(client, alias) is not None
+        _swap_alias(client, alias, name, replace_legacy=recreate)
+        if recreate and replaced:
+            _delete_collection(client, previous)
+    return loaded
 
-    vectors = collection.config.params.vectors
-    if isinstance(vectors, dict):
-        return default if default in vectors else (next(iter(vectors)) if vectors else default)
-    return ""
+
+def snapshot_to_mmap(path: str, directory: str, dtype: str = "float16", batch_size: int = 1000) -> int:
+    """Write a snapshot straight to an `MmapVectorStore` directory (no Qdrant involved)."""
+    manifest = read_snapshot_manifest(path)
+    entries = {entry["name"]: entry for entry in manifest["vectors"]}
+    vector_name = "dense" if "dense" in entries else next(iter(entries))
+    blocks = (
+        (ids, np.array(vectors[vector_name], dtype=np.float32), [line["payload"] for line in lines])
+        for ids, vectors, lines in iter_snapshot(path, batch_size)
+    )
+    return _publish_mmap_store(directory, lambda version: _write_mmap_store(
+        blocks, manifest["points"], entries[vector_name]["params"]["size"], version, dtype, {
+            "collection": manifest["collection"],
+            "source_collection": manifest["collection"],
+            **_recorded_identity(manifest.get("metadata") or {}, manifest.get("embedding_model")),
+        },
+    ))
 
 
 # ---------------------------------------------------------------------------
@@ -239,7 +3403,11 @@ class RAGPipeline:
     Build once, query many times.
 
     Three modes:
-      1. .build()        — load from a DataSource, chunk, embed, upsert into Qdrant.
+      1. .build()        — load from a DataSource, chunk, embed and upsert into a new
+                           collection version, then switch the alias to it.
+         .sync()         — ingest only new/changed files of a DirectoryDataSource.
+         .copy_from()    — copy another collection's stored vectors, no re-embedding.
+         .import_snapshot() — load an export_snapshot() file, no re-embedding.
       2. .use_existing() — skip ingestion, connect to an already-populated collection.
       3. .query() / .retrieve() / .show_context() — ask questions.
 
@@ -262,6 +3430,16 @@ class RAGPipeline:
         self.config = config or RAGConfig()
         self._vectorstore: Optional[QdrantVectorStore] = None
         self._retriever = None
+        self._topics: Optional[list[dict]] = None
+        self._search_params: Optional[SearchParams] = None
+        self._reduced_dim: Optional[int] = None
+        self.rerank_stats = RerankStats()
+        self.query_cache: Optional[QueryVectorCache] = None
+        if self.config.query_cache_size > 0:
+            self.query_cache = QueryVectorCache(self.config.query_cache_size, self.config.query_cache_ttl)
+        self._summary_collection: Optional[str] = None
+        self._summary_store: Optional[MmapVectorStore] = None
+        self.last_ingest_stats: Optional[IngestStats] = None
 
     # ------------------------------------------------------------------
     # Mode 1 — ingest from DataSource
@@ -276,51 +3454,61 @@ class RAGPipeline:
             )
 
         cfg = self.config
-        embeddings = OpenAIEmbeddings(model=cfg.embedding_model)
+        embeddings = _make_embeddings(cfg)
         client = _make_qdrant_client(cfg)
+        # Refuse an unflagged legacy migration before any embedding work is spent.
+        _check_legacy_collection(client, cfg.qdrant_collection, cfg.replace_legacy_collection)
 
-        # Create (or recreate) the collection
-        client.recreate_collection(
-            collection_name=cfg.qdrant_collection,
-            vectors_config={
-                "dense": VectorParams(size=cfg.embedding_dim, distance=Distance.COSINE)
-            },
-        )
+        # Blue/green: fill a fresh versioned collection while the alias keeps
+        # serving the current one, then switch the alias once it is verified.
+        shadow = _new_collection_version(cfg.qdrant_collection)
+        _create_dense_collection(client, shadow, cfg)
+        self._create_payload_indexes(client, shadow)
 
-        print(f"Loading documents from: {self.source.description()}")
-        docs = self.source.load()
-        print(f"  → {len(docs)} document(s) loaded")
+        # The new version starts empty, so any previous sync manifest is stale.
+        manifest = SyncManifest.for_collection(cfg)
+        manifest.entries = {}
+        plan = manifest.plan(self.source.files()) if hasattr(self.source, "files") else None
 
-        print("Splitting into chunks ...")
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=cfg.chunk_size,
-            chunk_overlap=cfg.chunk_overlap,
-            length_function=len,
-        )
-        chunks = splitter.split_documents(docs)
-        chunks = clean_documents(chunks)
-        print(f"  → {len(chunks)} chunks created")
+        chunks = self._iter_chunks()
 
-        print(f"Embedding and upserting into Qdrant collection '{cfg.qdrant_collection}' ...")
-        self._vectorstore = QdrantVectorStore.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            url=cfg.qdrant_url,
-            api_key=cfg.qdrant_api_key,
-            collection_name=cfg.qdrant_collection,
-            vector_name="dense",
-        )
+        print(f"Embedding and upserting into Qdrant collection '{shadow}' ...")
+        try:
+            stats = self._ingest(client, embeddings, "dense", chunks, collection_name=shadow)
+            self._verify_collection(client, shadow, stats)
+            self._refresh_topics(client, shadow, recluster=True)
+            self._refresh_summaries(client, embeddings, shadow, reuse_from=_resolve_alias(client, cfg.qdrant_collection))
+        except BaseException:
+            _delete_collection(client, shadow)
+            raise
 
-        self._retriever = self._vectorstore.as_retriever(
-            search_kwargs={"k": cfg.top_k}
-        )
+        _swap_alias(client, cfg.qdrant_collection, shadow, cfg.replace_legacy_collection)
+        print(f"  → alias '{cfg.qdrant_collection}' now points to '{shadow}'")
+        removed = _gc_collection_versions(client, cfg.qdrant_collection, cfg.keep_versions)
+        if removed:
+            print(f"  → removed old versions: {', '.join(removed)}")
+
+        if plan is not None:
+            manifest.commit(plan)
+        elif os.path.exists(manifest.path):
+            os.remove(manifest.path)
+
+        self._connect(client, embeddings, "dense")
         print("RAG pipeline ready.\n")
         return self
 
-    def build_incremental(self) -> "RAGPipeline":
+    def build_incremental(
+        self,
+        checkpoint: Optional[IngestCheckpoint] = None,
+        on_commit: Optional[Callable[[list[Document]], None]] = None,
+    ) -> "RAGPipeline":
         """
         Load data, chunk, embed, and append into an existing Qdrant collection.
         This does not recreate the collection, so previously ingested documents stay intact.
+
+        With a `checkpoint`, progress is saved after every batch and work it
+        already records is skipped. `on_commit` is called with each committed
+        batch (e.g. for progress reporting).
         """
         if self.source is None:
             raise ValueError(
@@ -329,52 +3517,181 @@ class RAGPipeline:
             )
 
         cfg = self.config
-        embeddings = OpenAIEmbeddings(model=cfg.embedding_model)
+        embeddings = _make_embeddings(cfg)
         client = _make_qdrant_client(cfg)
-        vector_name = _resolve_vector_name(client, cfg.qdrant_collection)
+        collection, vector_name = self._ensure_collection(client)
 
-        try:
-            client.get_collection(collection_name=cfg.qdrant_collection)
-        except Exception:
-            client.create_collection(
-                collection_name=cfg.qdrant_collection,
-                vectors_config={
-                    "dense": VectorParams(
-                        size=cfg.embedding_dim,
-                        distance=Distance.COSINE,
-                    )
-                },
+        chunks = self._iter_chunks(checkpoint=checkpoint)
+
+        def committed(batch: list[Document]) -> None:
+            if checkpoint is not None:
+                checkpoint.record(batch)
+            if on_commit is not None:
+                on_commit(batch)
+
+        print(f"Appending embeddings into Qdrant collection '{collection}' ...")
+        self._ingest(client, embeddings, vector_name, chunks, on_commit=committed, collection_name=collection)
+        self._refresh_topics(client, collection)
+        self._refresh_summaries(client, embeddings, collection)
+
+        self._connect(client, embeddings, vector_name)
+        print("RAG incremental ingestion complete.\n")
+        return self
+
+    def sync(self) -> "RAGPipeline":
+        """
+        Bring the collection in line with a file-based source such as
+        DirectoryDataSource, using a per-collection manifest (see SyncManifest).
+
+        New and changed files are ingested; points belonging to changed or
+        removed files are deleted first via a `metadata.source` filter.
+        When nothing changed, no file is parsed and nothing is embedded.
+        """
+        if not hasattr(self.source, "files") or not hasattr(self.source, "for_files"):
+            raise ValueError(
+                ".sync() needs a file-based DataSource with files() / for_files(), "
+                "e.g. DirectoryDataSource."
             )
-            vector_name = "dense"
 
-        print(f"Loading documents from: {self.source.description()}")
-        docs = self.source.load()
-        print(f"  → {len(docs)} document(s) loaded")
+        cfg = self.config
+        embeddings = _make_embeddings(cfg)
+        client = _make_qdrant_client(cfg)
+        collection, vector_name = self._ensure_collection(client)
 
-        print("Splitting into chunks ...")
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=cfg.chunk_size,
-            chunk_overlap=cfg.chunk_overlap,
-            length_function=len,
+        manifest = SyncManifest.for_collection(cfg)
+        plan = manifest.plan(self.source.files())
+        print(
+            f"Sync plan for '{cfg.qdrant_collection}': {len(plan.new)} new, "
+            f"{len(plan.changed)} changed, {len(plan.removed)} removed, "
+            f"{len(plan.unchanged)} unchanged"
         )
-        chunks = splitter.split_documents(docs)
-        chunks = clean_documents(chunks)
-        print(f"  → {len(chunks)} chunks created")
 
-        print(f"Appending embeddings into Qdrant collection '{cfg.qdrant_collection}' ...")
-        self._vectorstore = QdrantVectorStore.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            url=cfg.qdrant_url,
-            api_key=cfg.qdrant_api_key,
-            collection_name=cfg.qdrant_collection,
-            vector_name=vector_name,
+        if plan.to_delete:
+            client.delete(
+                collection_name=collection,
+                points_selector=FilterSelector(filter=Filter(must=[
+                    FieldCondition(key="metadata.source", match=MatchAny(any=plan.to_delete))
+                ])),
+            )
+
+        if plan.to_ingest:
+            chunks = self._iter_chunks(self.source.for_files(plan.to_ingest))
+            self._ingest(client, embeddings, vector_name, chunks, collection_name=collection)
+        if plan.to_ingest or plan.to_delete:
+            self._refresh_topics(client, collection)
+            self._refresh_summaries(client, embeddings, collection)
+        manifest.commit(plan)
+
+        self._connect(client, embeddings, vector_name)
+        print("RAG sync complete.\n")
+        return self
+
+    def copy_from(
+        self,
+        source_collection: str,
+        page_size: int = 1000,
+        workers: int = 4,
+        payload_transform: Optional[Callable[[dict], dict]] = None,
+    ) -> "RAGPipeline":
+        """
+        Fill `config.qdrant_collection` with the points of another collection
+        in the same Qdrant deployment, reusing the stored vectors — no
+        embedding calls. See `copy_collection()`.
+
+        A missing target is created with the source's vectors and this
+        config's layout settings (quantization, on-disk storage, HNSW), so
+        copying is also how an existing collection is re-indexed with them.
+        With `embedding_search_dim` set and a source that has no reduced
+        vector, the copy adds one computed from the stored full vectors —
+        the migration path to Matryoshka search. Chunks ingested before the
+        filter fields existed get `material_id` (and `course`, if
+        `course_code` is set) added on the way.
+        """
+        cfg = self.config
+        embeddings = _make_embeddings(cfg)
+        client = _make_qdrant_client(cfg)
+
+        source = _resolve_alias(client, source_collection)
+        source_vector = _resolve_vector_name(client, source)
+        vector_transform = None
+        migrate = (
+            bool(cfg.embedding_search_dim)
+            and cfg.embedding_search_dim < cfg.embedding_dim
+            and _reduced_dim(client, source) is None
         )
+        if migrate:
+            vectors = client.get_collection(collection_name=source).config.params.vectors
+            size = vectors[source_vector].size if source_vector else vectors.size
+            if size != cfg.embedding_dim:
+                raise ValueError(
+                    f"'{source_collection}' stores {size}-dim vectors but embedding_dim is {cfg.embedding_dim}."
+                )
+
+            def vector_transform(vector):
+                full = vector[source_vector] if source_vector else vector
+                point = {"dense": full, REDUCED_VECTOR_NAME: truncate_embedding(full, cfg.embedding_search_dim)}
+                if isinstance(vector, dict) and SPARSE_VECTOR_NAME in vector:
+                    point[SPARSE_VECTOR_NAME] = vector[SPARSE_VECTOR_NAME]
+                return point
+
+        def create_target(target_client: QdrantClient, name: str, source_info) -> None:
+            if migrate:
+                # Keep the source's sparse vectors (and their model) as they are.
+                _create_dense_collection(target_client, name, replace(cfg, sparse_model=_sparse_model(client, source)))
+                return
+            params = source_info.config.params
+            vectors = params.vectors
+            if cfg.vectors_on_disk:
+                if isinstance(vectors, dict):
+                    vectors = {key: value.model_copy(update={"on_disk": True}) for key, value in vectors.items()}
+                else:
+                    vectors = vectors.model_copy(update={"on_disk": True})
+            settings = _collection_settings(cfg)
+            settings["quantization_config"] = settings["quantization_config"] or source_info.config.quantization_config
+            target_client.create_collection(
+                collection_name=name,
+                vectors_config=vectors,
+                sparse_vectors_config=params.sparse_vectors,
+                metadata=source_info.config.metadata,
+                **settings,
+            )
+
+        target = _resolve_alias(client, cfg.qdrant_collection)
+        if not client.collection_exists(collection_name=target):
+            source_info = client.get_collection(collection_name=source)
+            target = _create_collection_version(
+                client, cfg.qdrant_collection, lambda name: create_target(client, name, source_info)
+            )
+        # Source topic labels are relabelled against the target's own topics.
+        keep_topics = not client.collection_exists(collection_name=_topics_collection(target))
+
+        def transform(payload: dict) -> dict:
+            payload = payload_transform(payload) if payload_transform else payload
+            if not keep_topics:
+                payload = _without_topic(payload)
+            metadata = payload.get(QdrantVectorStore.METADATA_KEY)
+            if isinstance(metadata, dict):
+                self._tag_document(Document(page_content="", metadata=metadata))
+            return payload
 
-        self._retriever = self._vectorstore.as_retriever(
-            search_kwargs={"k": cfg.top_k}
+        print(f"Copying '{source_collection}' → '{target}' ...")
+        stats = copy_collection(
+            client,
+            source,
+            target,
+            page_size=page_size,
+            workers=workers if cfg.qdrant_url else 1,
+            payload_transform=transform,
+            create_target=create_target,
+            vector_transform=vector_transform,
         )
-        print("RAG incremental ingestion complete.\n")
+        self._create_payload_indexes(client, target)
+        print(f"  → {stats.summary()}")
+        self._refresh_topics(client, target)
+        self._refresh_summaries(client, embeddings, target, reuse_from=source)
+
+        self._connect(client, embeddings, _resolve_vector_name(client, target))
+        print("RAG copy complete.\n")
         return self
 
     # ------------------------------------------------------------------
@@ -383,25 +3700,24 @@ class RAGPipeline:
 
     def use_existing(self) -> "RAGPipeline":
         """
-        Connect to an already-populated Qdrant collection.
+        Connect to an already-populated Qdrant collection, or to its
+        memory-mapped export when `config.vector_backend == "mmap"`.
         No documents are loaded or re-embedded.
         """
         cfg = self.config
-        embeddings = OpenAIEmbeddings(model=cfg.embedding_model)
+        embeddings = _make_embeddings(cfg)
+        if cfg.vector_backend == "mmap":
+            return self._use_mmap(embeddings)
+        if cfg.vector_backend != "qdrant":
+            raise ValueError(f"Unknown vector_backend {cfg.vector_backend!r}; use 'qdrant' or 'mmap'.")
         client = _make_qdrant_client(cfg)
         vector_name = _resolve_vector_name(client, cfg.qdrant_collection)
 
         print(f"Connecting to existing Qdrant collection '{cfg.qdrant_collection}' ...")
-        self._vectorstore = QdrantVectorStore.from_existing_collection(
-            embedding=embeddings,
-            url=cfg.qdrant_url,
-            api_key=cfg.qdrant_api_key,
-            collection_name=cfg.qdrant_collection,
-            vector_name=vector_name,
-        )
-        self._retriever = self._vectorstore.as_retriever(
-            search_kwargs={"k": cfg.top_k}
-        )
+        target = _alias_target(client, cfg.qdrant_collection)
+        if target:
+            print(f"  → alias '{cfg.qdrant_collection}' → '{target}'")
+        self._connect(client, embeddings, vector_name)
         print("RAG pipeline ready.\n")
         return self
 
@@ -409,10 +3725,463 @@ class RAGPipeline:
     # Retrieve (context only)
     # ------------------------------------------------------------------
 
-    def retrieve(self, question: str) -> list[Document]:
-        """Return the top-k most relevant chunks for a question."""
+    def retrieve(self, question: str, filters: Optional[dict] = None) -> list[Document]:
+        """
+        Return the top-k most relevant chunks for a question.
+
+        `filters` restricts the search to chunks whose metadata matches every
+        given field (see FILTER_FIELDS); a list matches any of its values:
+            rag.retrieve("What is a vtable?", filters={"course": "CS201", "page": [4, 5]})
+        """
+        self._check_built()
+        if not filters:
+            docs = self._retriever.invoke(question)
+        elif isinstance(self._vectorstore, MmapVectorStore):
+            docs = self._retriever.invoke(question, filter=normalize_filters(filters))
+        else:
+            docs = self._retriever.invoke(question, filter=qdrant_filter(filters))
+        return self._expand_windows(self._rerank(question, docs))
+
+    def retrieve_many(
+        self, questions: list[str], filters: Optional[dict | list[Optional[dict]]] = None
+    ) -> list[list[Document]]:
+        """
+        `retrieve()` for many questions at once, for offline jobs (evaluation,
+        cache warming, bulk generation). All questions are embedded in one
+        batched call and searched with one Qdrant batch request, and the
+        sentence-window neighbours of every result are fetched together.
+
+        `filters` is one retrieve()-style dict for every question, or a list
+        with one dict (or None) per question.
+        """
+        self._check_built()
+        if not questions:
+            return []
+        per_question = filters if isinstance(filters, list) else [filters] * len(questions)
+        if len(per_question) != len(questions):
+            raise ValueError(f"Got {len(per_question)} filters for {len(questions)} questions.")
+
+        vectors = embed_queries(self._vectorstore.embeddings, list(questions))
+        store = self._vectorstore
+        k = self._candidate_k()
+        if isinstance(store, MmapVectorStore):
+            # Questions sharing a filter are scored in one pass over the matrix.
+            groups: dict[str, list[int]] = {}
+            for i, question_filters in enumerate(per_question):
+                key = json.dumps(normalize_filters(question_filters) if question_filters else None, sort_keys=True)
+                groups.setdefault(key, []).append(i)
+            results: list[list[Document]] = [[] for _ in questions]
+            for key, indices in groups.items():
+                hits = store.similarity_search_with_score_by_vectors(
+                    [vectors[i] for i in indices], k, filter=json.loads(key)
+                )
+                for i, found in zip(indices, hits):
+                    results[i] = [doc for doc, _ in found]
+        else:
+            qdrant_filters = [qdrant_filter(f) if f else None for f in per_question]
+            if isinstance(self._retriever, (RescoringRetriever, HybridRetriever)):
+                results = self._retriever.search_many(list(questions), vectors, qdrant_filters)
+            else:
+                requests = [
+                    _dense_request(vector, f, k, store.vector_name or None, search_params=self._search_params)
+                    for vector, f in zip(vectors, qdrant_filters)
+                ]
+                results = _batch_documents(store.client, self.config.qdrant_collection, requests)
+
+        ranked = [self._rerank(question, docs) for question, docs in zip(questions, results)]
+        wanted = [point_id for docs in ranked for point_id in self._missing_neighbours(docs)]
+        neighbours = self._fetch_by_ids(list(dict.fromkeys(wanted))) if wanted else {}
+        return [self._expand_windows(docs, neighbours) for docs in ranked]
+
+    def _rerank(self, question: str, docs: list[Document]) -> list[Document]:
+        """
+        Best `top_k` of the candidates by cross-encoder score, or the first
+        `top_k` in vector order when reranking is off, fails or overruns
+        `config.rerank_timeout`.
+        """
+        cfg = self.config
+        if not cfg.rerank_model or len(docs) <= 1:
+            return docs[:cfg.top_k]
+        started = time.perf_counter()
+        future = CrossEncoderReranker.pool().submit(
+            lambda: _make_reranker(cfg.rerank_model, cfg.embedding_threads).scores(
+                question, [doc.page_content for doc in docs]
+            )
+        )
+        try:
+            scores = future.result(timeout=cfg.rerank_timeout)
+        except Exception:
+            future.cancel()
+            self.rerank_stats.record_fallback()
+            return docs[:cfg.top_k]
+        self.rerank_stats.record(time.perf_counter() - started)
+        ranked = sorted(zip(scores, range(len(docs))), key=lambda item: item[0], reverse=True)
+        best = []
+        for score, i in ranked[:cfg.top_k]:
+            docs[i].metadata["rerank_score"] = float(score)
+            best.append(docs[i])
+        return best
+
+    def export_mmap(self, directory: Optional[str] = None, dtype: Optional[str] = None) -> int:
+        """
+        Export `config.qdrant_collection` for the "mmap" backend (defaults:
+        `config.mmap_path`, `config.mmap_dtype`). No embedding calls are made.
+        """
+        cfg = self.config
+        directory = directory or cfg.mmap_path
+        if not directory:
+            raise ValueError("Pass a directory or set RAGConfig.mmap_path.")
+        client = _make_qdrant_client(cfg)
+        print(f"Exporting '{cfg.qdrant_collection}' → {directory} ...")
+        started = time.perf_counter()
+        rows = export_mmap_store(
+            client,
+            cfg.qdrant_collection,
+            directory,
+            dtype=dtype or cfg.mmap_dtype,
+            embedding_model=cfg.embedding_model,
+        )
+        print(f"  → {rows} vectors exported in {time.perf_counter() - started:.1f}s")
+        return rows
+
+    def export_snapshot(self, path: str) -> int:
+        """Write `config.qdrant_collection` to a portable snapshot file (see `export_snapshot()`)."""
+        cfg = self.config
+        client = _make_qdrant_client(cfg)
+        print(f"Exporting snapshot of '{cfg.qdrant_collection}' → {path} ...")
+        started = time.perf_counter()
+        points = export_snapshot(client, cfg.qdrant_collection, path, embedding_model=cfg.embedding_model)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"  → {points} points, {size_mb:.1f} MB in {time.perf_counter() - started:.1f}s")
+        return points
+
+    def import_snapshot(self, path: str, recreate: bool = False) -> "RAGPipeline":
+        """
+        Load a snapshot file without embedding calls and connect to it: into
+        `config.qdrant_collection`, or into `config.mmap_path` when the
+        backend is "mmap".
+        """
+        cfg = self.config
+        manifest = read_snapshot_manifest(path)
+        _check_embedding_identity(
+            _recorded_identity(manifest.get("metadata") or {}, manifest.get("embedding_model")), cfg, path
+        )
+        embeddings = _make_embeddings(cfg)
+        started = time.perf_counter()
+
+        if cfg.vector_backend == "mmap":
+            if not cfg.mmap_path:
+                raise ValueError('vector_backend="mmap" needs RAGConfig.mmap_path (RAG_MMAP_PATH).')
+            print(f"Importing snapshot {path} → {cfg.mmap_path} ...")
+            points = snapshot_to_mmap(path, cfg.mmap_path, cfg.mmap_dtype)
+            print(f"  → {points} points loaded in {time.perf_counter() - started:.1f}s")
+            return self._use_mmap(embeddings)
+
+        client = _make_qdrant_client(cfg)
+        print(f"Importing snapshot {path} → '{cfg.qdrant_collection}' ...")
+        has_topics = not recreate and client.collection_exists(
+            collection_name=_topics_collection(_resolve_alias(client, cfg.qdrant_collection))
+        )
+        points = import_snapshot(
+            path,
+            client,
+            cfg.qdrant_collection,
+            recreate=recreate,
+            # Snapshot topic labels are relabelled against this collection's own topics.
+            payload_transform=_without_topic if has_topics else None,
+        )
+        collection = _resolve_alias(client, cfg.qdrant_collection)
+        self._create_payload_indexes(client, collection)
+        print(f"  → {points} points loaded in {time.perf_counter() - started:.1f}s")
+        self._refresh_topics(client, collection)
+        self._refresh_summaries(client, embeddings, collection)
+        self._connect(client, embeddings, _resolve_vector_name(client, collection))
+        print("RAG snapshot import complete.\n")
+        return self
+
+    def _use_mmap(self, embeddings) -> "RAGPipeline":
+        cfg = self.config
+        if not cfg.mmap_path:
+            raise ValueError('vector_backend="mmap" needs RAGConfig.mmap_path (RAG_MMAP_PATH).')
+        print(f"Opening memory-mapped vector store at {cfg.mmap_path} ...")
+        store = MmapVectorStore(cfg.mmap_path, self._query_embeddings(embeddings))
+        _check_embedding_identity(store.meta, cfg, cfg.mmap_path)
+        print(f"  → {len(store)} vectors ({store.meta['dtype']}) from '{store.collection_name}'")
+        self._vectorstore = store
+        self._retriever = store.as_retriever(search_kwargs={"k": self._candidate_k()})
+        self._warm_reranker()
+        self._topics = None
+        self._summary_store = None
+        print("RAG pipeline ready.\n")
+        return self
+
+    def measure_recall(self, questions: list[str]) -> float:
+        """
+        Mean recall@top_k of `retrieve()` against an exact full-dimension
+        search, i.e. how much quantization, HNSW settings or a reduced
+        search vector cost on these questions (1.0 = nothing lost).
+        """
+        self._check_built()
+        store = self._vectorstore
+        if not isinstance(store, QdrantVectorStore):
+            raise RuntimeError("measure_recall() compares against Qdrant; use the 'qdrant' backend.")
+        exact = _batch_documents(store.client, self.config.qdrant_collection, [
+            QueryRequest(
+                query=vector,
+                using=store.vector_name or None,
+                limit=self.config.top_k,
+                params=SearchParams(exact=True),
+                with_payload=True,
+            )
+            for vector in embed_queries(store.embeddings, list(questions))
+        ])
+        found = expected = 0
+        for exact_docs, docs in zip(exact, self.retrieve_many(questions)):
+            exact_ids = {doc.metadata.get("_id") for doc in exact_docs}
+            found += len(exact_ids & {doc.metadata.get("_id") for doc in docs})
+            expected += len(exact_ids)
+        return found / expected if expected else 1.0
+
+    def _record_documents(self, records) -> list[Document]:
+        """Qdrant records (scroll / retrieve results) → Documents shaped like search hits."""
+        return _points_to_documents(records, self.config.qdrant_collection)
+
+    def _fetch_by_ids(self, ids: list) -> dict:
+        """One batched fetch of chunks by point id → {id: Document}."""
+        store = self._vectorstore
+        if isinstance(store, MmapVectorStore):
+            docs = store.get_by_ids(ids)
+        else:
+            docs = self._record_documents(store.client.retrieve(
+                collection_name=self.config.qdrant_collection,
+                ids=ids,
+                with_payload=True,
+                with_vectors=False,
+            ))
+        return {str(doc.metadata["_id"]): doc for doc in docs}
+
+    @staticmethod
+    def _missing_neighbours(docs: list[Document]) -> list:
+        """Window ids of `docs` that are not among the hits themselves."""
+        hits = {str(doc.metadata.get("_id")) for doc in docs}
+        return [
+            point_id
+            for doc in docs
+            for point_id in doc.metadata.get("window_ids") or []
+            if point_id not in hits
+        ]
+
+    def _expand_windows(self, docs: list[Document], neighbours: Optional[dict] = None) -> list[Document]:
+        """
+        Replace each sentence-window hit with the text of its whole window.
+        All missing neighbours are fetched in one call (or passed in as
+        `neighbours`); a hit already inside an earlier hit's window is
+        dropped instead of repeating its text.
+        """
+        if not any(doc.metadata.get("window_ids") for doc in docs):
+            return docs
+        hits = {str(doc.metadata.get("_id")): doc for doc in docs}
+        if neighbours is None:
+            wanted = self._missing_neighbours(docs)
+            neighbours = self._fetch_by_ids(list(dict.fromkeys(wanted))) if wanted else {}
+        texts = {point_id: doc.page_content for point_id, doc in hits.items()}
+        texts.update({point_id: doc.page_content for point_id, doc in neighbours.items()})
+
+        expanded, covered = [], set()
+        for doc in docs:
+            point_id = str(doc.metadata.get("_id"))
+            if point_id in covered:
+                continue
+            window = doc.metadata.get("window_ids") or [point_id]
+            covered.update(window)
+            metadata = dict(doc.metadata, match=doc.page_content)
+            expanded.append(Document(
+                page_content="\n".join(texts[i] for i in window if i in texts),
+                metadata=metadata,
+            ))
+        return expanded
+
+    def lookup(self, filters: dict, limit: Optional[int] = 50, page_size: int = 256) -> list[Document]:
+        """
+        Fetch chunks by metadata alone — no embedding call, no vector search —
+        e.g. every chunk of slides 12-13 of lecture 3:
+            rag.lookup({"course": "CS201", "lecture": 3, "page": [11, 12]})
+        Every match is read (in pages of `page_size`) and ordered by source,
+        page and position on the page; then the first `limit` are returned
+        (None: all). A cut is reported, never made silently.
+        """
+        self._check_built()
+        store = self._vectorstore
+        if isinstance(store, MmapVectorStore):
+            docs = store.get_by_filter(filters, None)
+        else:
+            docs, offset = [], None
+            while True:
+                records, offset = store.client.scroll(
+                    collection_name=self.config.qdrant_collection,
+                    scroll_filter=qdrant_filter(filters),
+                    limit=page_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=False,
+                )
+                docs.extend(self._record_documents(records))
+                if offset is None or not records:
+                    break
+        docs.sort(key=lambda doc: (
+            str(doc.metadata.get("source", "")),
+            doc.metadata.get("page", 0),
+            doc.metadata.get("start_index", 0),
+            str(doc.metadata.get("_id", "")),
+        ))
+        if limit is not None and len(docs) > limit:
+            print(f"  → lookup {filters} matched {len(docs)} chunks; returning the first {limit}")
+            docs = docs[:limit]
+        return docs
+
+    def build_topics(self, k: Optional[int] = None) -> list[dict]:
+        """
+        (Re)cluster `config.qdrant_collection` into `k` topics (default
+        `config.topic_clusters`) from its stored vectors; see `build_topic_index()`.
+        """
+        cfg = self.config
+        k = k or cfg.topic_clusters
+        if k <= 0:
+            raise ValueError("Pass k or set RAGConfig.topic_clusters.")
+        client = _make_qdrant_client(cfg)
+        collection = _resolve_alias(client, cfg.qdrant_collection)
+        print(f"Clustering '{collection}' into {k} topics ...")
+        started = time.perf_counter()
+        topics = build_topic_index(client, collection, k, cfg.topic_representatives)
+        print(f"  → {len(topics)} topics in {time.perf_counter() - started:.1f}s")
+        self._topics = None
+        return topics
+
+    def build_summaries(self) -> None:
+        """
+        Build or update the summary tier of `config.qdrant_collection` in page
+        windows of `config.summary_pages`; see `build_summary_index()`.
+        """
+        cfg = self.config
+        if cfg.summary_pages <= 0:
+            raise ValueError("Set RAGConfig.summary_pages (pages per window summary).")
+        client = _make_qdrant_client(cfg)
+        collection = _resolve_alias(client, cfg.qdrant_collection)
+        print(f"Summarizing '{collection}' ...")
+        self._refresh_summaries(client, _make_embeddings(cfg), collection)
+
+    def retrieve_summaries(
+        self,
+        question: str,
+        filters: Optional[dict] = None,
+        level: Optional[str] = None,
+        k: Optional[int] = None,
+    ) -> list[Document]:
+        """
+        Top-k precomputed summaries for a question — for summarization
+        requests and broad questions, instead of raw chunks. `level` picks
+        "window" (a few pages) or "document" summaries; default both.
+        `filters` work as for `retrieve()`; a page filter matches summaries
+        covering any of the pages. [] when the collection has no summary tier.
+        """
+        self._check_built()
+        filters = {**(filters or {}), "level": level} if level else filters
+        k = k or self.config.top_k
+        store = self._vectorstore
+        if isinstance(store, MmapVectorStore):
+            path = Path(store.directory) / "summaries"
+            if not path.exists():
+                return []
+            if self._summary_store is None:
+                self._summary_store = MmapVectorStore(str(path), store.embeddings)
+            return self._summary_store.similarity_search(question, k=k, filter=normalize_filters(filters))
+
+        client = store.client
+
+        def resolve() -> str:
+            # "" = this collection has no summary tier.
+            name = _summaries_collection(_resolve_alias(client, self.config.qdrant_collection))
+            return name if client.collection_exists(collection_name=name) else ""
+
+        if self._summary_collection is None:
+            self._summary_collection = resolve()
+        if not self._summary_collection:
+            return []
+        search = dict(
+            query=store.embeddings.embed_query(question),
+            using="dense",
+            query_filter=qdrant_filter(filters),
+            limit=k,
+            with_payload=True,
+        )
+        try:
+            response = client.query_points(collection_name=self._summary_collection, **search)
+        except Exception:
+            # The alias may have moved to a newer version since it was resolved.
+            self._summary_collection = resolve()
+            if not self._summary_collection:
+                return []
+            response = client.query_points(collection_name=self._summary_collection, **search)
+        return self._record_documents(response.points)
+
+    def topics(self) -> list[dict]:
+        """
+        The collection's topic index: {"topic", "size", "keywords", "sources",
+        "representatives", "centroid"} per topic; [] if it has none.
+        """
         self._check_built()
-        return self._retriever.invoke(question)
+        if self._topics is None:
+            store = self._vectorstore
+            if isinstance(store, MmapVectorStore):
+                self._topics = store.topics
+            else:
+                self._topics = load_topics(store.client, self.config.qdrant_collection)
+        return self._topics
+
+    def topic_documents(self, topic: str, filters: Optional[dict] = None, limit: Optional[int] = None) -> list[Document]:
+        """
+        Chunks of the precomputed topic cluster that best matches `topic`,
+        most central first — for flashcards, quizzes and study plans:
+            rag.topic_documents("inheritance", filters={"course": "CS201"})
+
+        The topic is matched on cluster keywords; only when none match is
+        `topic` embedded once to pick the nearest centroid. Without filters
+        the stored representatives are fetched by id — clusters span every
+        course in the collection, so pass a "course" filter to stay within
+        one; with filters the stored centroid is the query vector. [] when
+        there is no topic index.
+        """
+        topics = self.topics()
+        if not topics:
+            return []
+        limit = limit or self.config.top_k
+        chosen = match_topic(topic, topics)
+        if chosen is None:
+            vector = np.asarray(self._vectorstore.embeddings.embed_query(topic), dtype=np.float32)
+            centroids = np.asarray([t["centroid"] for t in topics], dtype=np.float32)
+            chosen = topics[int((centroids @ vector).argmax())]
+
+        if not filters and len(chosen["representatives"]) >= limit:
+            by_id = self._fetch_by_ids(chosen["representatives"][:limit])
+            docs = [by_id[str(i)] for i in chosen["representatives"][:limit] if str(i) in by_id]
+            return self._expand_windows(docs)
+
+        filters = {**(filters or {}), "topic": chosen["topic"]}
+        store = self._vectorstore
+        if isinstance(store, MmapVectorStore):
+            docs = store.similarity_search_by_vector(chosen["centroid"], k=limit, filter=normalize_filters(filters))
+        else:
+            request = _dense_request(
+                chosen["centroid"],
+                qdrant_filter(filters),
+                limit,
+                store.vector_name or None,
+                self._reduced_dim,
+                self.config.rescore_candidates,
+                self._search_params,
+            )
+            docs = _batch_documents(store.client, self.config.qdrant_collection, [request])[0]
+        return self._expand_windows(docs)
 
     def show_context(self, question: str) -> None:
         """Pretty-print retrieved context to stdout."""
@@ -506,8 +4275,9 @@ Question: {question}
 Detailed Answer:"""
     )
 
-    def query(self, question: str) -> dict:
+    def query(self, question: str, filters: Optional[dict] = None) -> dict:
         """Retrieve context and generate a structured teaching answer with citations.
+        `filters` is passed to `retrieve()`.
 
         Returns:
             {
@@ -519,8 +4289,44 @@ Detailed Answer:"""
             }
         """
         self._check_built()
-        docs = self.retrieve(question)
+        context, references = self._answer_context(self.retrieve(question, filters))
+
+        llm = ChatOpenAI(model=self.config.llm_model, temperature=self.config.llm_temperature)
+        chain = self.PROMPT_TEMPLATE | llm
+        answer = chain.invoke({"context": context, "question": question}).content
+
+        return {
+            "answer":     answer,
+            "references": references,
+        }
+
+    def query_many(
+        self, questions: list[str], filters: Optional[dict | list[Optional[dict]]] = None
+    ) -> list[dict]:
+        """
+        `query()` for many questions: retrieval goes through `retrieve_many()`
+        and at most `config.llm_max_concurrency` answers are generated at
+        once. Results are in question order.
+        """
+        self._check_built()
+        contexts = [self._answer_context(docs) for docs in self.retrieve_many(questions, filters)]
+        if not contexts:
+            return []
+
+        llm = ChatOpenAI(model=self.config.llm_model, temperature=self.config.llm_temperature)
+        chain = self.PROMPT_TEMPLATE | llm
+        messages = chain.batch(
+            [{"context": context, "question": question} for question, (context, _) in zip(questions, contexts)],
+            config={"max_concurrency": max(1, self.config.llm_max_concurrency)},
+        )
+        return [
+            {"answer": message.content, "references": references}
+            for message, (_, references) in zip(messages, contexts)
+        ]
 
+    @staticmethod
+    def _answer_context(docs: list[Document]) -> tuple[str, list[dict]]:
+        """Prompt context and citation list for the retrieved `docs`."""
         context_parts = []
         references = []
 
@@ -542,26 +4348,277 @@ Detailed Answer:"""
                 "snippet":  snippet,
             })
 
-        context = "\n\n---\n\n".join(context_parts)
-
-        llm = ChatOpenAI(model=self.config.llm_model, temperature=self.config.llm_temperature)
-        chain = self.PROMPT_TEMPLATE | llm
-        answer = chain.invoke({"context": context, "question": question}).content
-
-        return {
-            "answer":     answer,
-            "references": references,
-        }
+        return "\n\n---\n\n".join(context_parts), references
     # ------------------------------------------------------------------
     # Internals
     # ------------------------------------------------------------------
 
+    def _ensure_collection(self, client: QdrantClient) -> tuple[str, str]:
+        """
+        Create the collection if it is missing, as the first version behind
+        the `qdrant_collection` alias. Returns the physical collection to
+        write to (aliases resolved) and the dense vector name to use.
+        """
+        cfg = self.config
+        collection = _resolve_alias(client, cfg.qdrant_collection)
+        if client.collection_exists(collection_name=collection):
+            vector_name = _resolve_vector_name(client, collection)
+        else:
+            collection = _create_collection_version(
+                client, cfg.qdrant_collection, lambda name: _create_dense_collection(client, name, cfg)
+            )
+            vector_name = "dense"
+        self._create_payload_indexes(client, collection)
+        return collection, vector_name
+
+    def _create_payload_indexes(self, client: QdrantClient, collection: str) -> None:
+        # Filtered retrieval (FILTER_FIELDS); "source" is also used by sync() deletes.
+        for field, schema in FILTER_FIELDS.items():
+            client.create_payload_index(
+                collection_name=collection,
+                field_name=f"{QdrantVectorStore.METADATA_KEY}.{field}",
+                field_schema=schema,
+            )
+
+    def _refresh_topics(self, client: QdrantClient, collection: str, recluster: bool = False) -> None:
+        """
+        Bring the topic labels of `collection` up to date, if topic clusters
+        are enabled: new chunks join their nearest existing topic, and only a
+        rebuild (`recluster`) or a collection without a topic index is
+        clustered from scratch.
+        """
+        cfg = self.config
+        if cfg.topic_clusters <= 0:
+            return
+        started = time.perf_counter()
+        if not recluster and client.collection_exists(collection_name=_topics_collection(collection)):
+            assigned = assign_topics(client, collection)
+            print(f"  → {assigned} new chunks assigned to topics in {time.perf_counter() - started:.1f}s")
+            return
+        topics = build_topic_index(client, collection, cfg.topic_clusters, cfg.topic_representatives)
+        print(f"  → {len(topics)} topic clusters in {time.perf_counter() - started:.1f}s")
+
+    def _refresh_summaries(
+        self, client: QdrantClient, embeddings, collection: str, reuse_from: Optional[str] = None
+    ) -> None:
+        """
+        Bring the summary tier of `collection` up to date, if enabled. Existing
+        summaries of `reuse_from` (another version of the same material) are
+        copied instead of regenerated.
+        """
+        cfg = self.config
+        if cfg.summary_pages <= 0:
+            return
+        if reuse_from:
+            try:
+                _check_embedding_identity(_stored_metadata(client, reuse_from), cfg, reuse_from)
+            except ValueError:
+                reuse_from = None    # another embedding space; its summary vectors do not apply
+        llm = ChatOpenAI(model=cfg.summary_model or cfg.llm_model, temperature=0)
+        started = time.perf_counter()
+        stats = build_summary_index(
+            client,
+            collection,
+            summarize=lambda prompt: llm.invoke(prompt).content,
+            embeddings=embeddings,
+            window_pages=cfg.summary_pages,
+            workers=cfg.summary_workers,
+            reuse_from=_summaries_collection(reuse_from) if reuse_from and reuse_from != collection else None,
+        )
+        self._create_payload_indexes(client, _summaries_collection(collection))
+        print(
+            f"  → summaries: {stats['written']} written, {stats['reused']} reused, "
+            f"{stats['deleted']} deleted in {time.perf_counter() - started:.1f}s"
+        )
+
+    @staticmethod
+    def _verify_collection(client: QdrantClient, collection: str, stats: "IngestStats") -> None:
+        """Refuse to publish a new version that is empty or missing points."""
+        count = client.count(collection_name=collection, exact=True).count
+        if count == 0 or count < stats.upserted:
+            raise RuntimeError(
+                f"Collection '{collection}' failed verification: {count} points stored, "
+                f"{stats.upserted} upserted. The alias was not switched."
+            )
+
+    def _connect(self, client: QdrantClient, embeddings, vector_name: str) -> None:
+        """Point the vectorstore and retriever at `config.qdrant_collection` (alias or collection)."""
+        cfg = self.config
+        _check_embedding_identity(_stored_metadata(client, cfg.qdrant_collection), cfg, f"'{cfg.qdrant_collection}'")
+        self._topics = None
+        self._summary_collection = None
+        self._warm_reranker()
+        embeddings = self._query_embeddings(embeddings)
+        self._vectorstore = QdrantVectorStore(
+            client=client,
+            collection_name=cfg.qdrant_collection,
+            embedding=embeddings,
+            vector_name=vector_name,
+        )
+        # Taken from the collection, so a process that never sets
+        # `quantization` still oversamples and rescores a quantized one.
+        self._search_params = _search_params(cfg, _is_quantized(client, cfg.qdrant_collection))
+        search_params = self._search_params
+        reduced_dim = self._reduced_dim = _reduced_dim(client, cfg.qdrant_collection)
+        sparse_model = _sparse_model(client, cfg.qdrant_collection)
+        if sparse_model:
+            self._retriever = HybridRetriever(
+                client=client,
+                embeddings=embeddings,
+                sparse_embeddings=_make_sparse_embeddings(sparse_model),
+                collection_name=cfg.qdrant_collection,
+                vector_name=vector_name or "dense",
+                reduced_dim=reduced_dim,
+                k=self._candidate_k(),
+                candidates=max(cfg.hybrid_candidates, self._candidate_k()),
+                rescore_candidates=cfg.rescore_candidates,
+                search_params=search_params,
+            )
+            return
+        if reduced_dim:
+            self._retriever = RescoringRetriever(
+                client=client,
+                embeddings=embeddings,
+                collection_name=cfg.qdrant_collection,
+                reduced_dim=reduced_dim,
+                k=self._candidate_k(),
+                candidates=max(cfg.rescore_candidates, self._candidate_k()),
+                search_params=search_params,
+            )
+            return
+        search_kwargs = {"k": self._candidate_k()}
+        if search_params is not None:
+            search_kwargs["search_params"] = search_params
+        self._retriever = self._vectorstore.as_retriever(search_kwargs=search_kwargs)
+
+    def _query_embeddings(self, embeddings):
+        """`embeddings` behind this pipeline's query-vector cache, if it has one."""
+        if self.query_cache is None or isinstance(embeddings, QueryCachedEmbeddings):
+            return embeddings
+        return QueryCachedEmbeddings(embeddings, self.query_cache)
+
+    def _candidate_k(self) -> int:
+        """How many chunks the vector search returns: top_k, or the rerank pool."""
+        cfg = self.config
+        return max(cfg.top_k, cfg.rerank_candidates) if cfg.rerank_model else cfg.top_k
+
+    def _warm_reranker(self) -> None:
+        # Load the cross-encoder in the background, so the first query is not
+        # the one that pays for it and falls back.
+        cfg = self.config
+        if cfg.rerank_model:
+            CrossEncoderReranker.pool().submit(_make_reranker, cfg.rerank_model, cfg.embedding_threads)
+
+    def _iter_chunks(
+        self,
+        source: Optional[DataSource] = None,
+        checkpoint: Optional[IngestCheckpoint] = None,
+    ) -> Iterator[Document]:
+        """
+        Stream documents from the source and yield cleaned chunks one document
+        at a time, so raw documents, split chunks and cleaned copies are never
+        all held in memory together.
+
+        With a non-empty checkpoint, completed files are not loaded and the
+        committed leading chunks of other files are dropped.
+        """
+        cfg = self.config
+        source = source or self.source
+        to_skip: dict[str, int] = {}
+        if checkpoint is not None and not checkpoint.is_empty:
+            if hasattr(source, "files") and hasattr(source, "for_files"):
+                done = set(checkpoint.completed)
+                source = source.for_files([f for f in source.files() if f not in done])
+            to_skip = dict(checkpoint.committed)
+            print(f"Resuming: {len(checkpoint.completed)} file(s) already complete")
+        print(f"Loading and splitting documents from: {source.description()}")
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=cfg.child_chunk_size or cfg.chunk_size,
+            chunk_overlap=0 if cfg.child_chunk_size else cfg.chunk_overlap,
+            length_function=len,
+            add_start_index=True,    # keeps the chunks of a page in reading order for lookup()
+        )
+        doc_count = 0
+        for doc in source.iter_load():
+            doc_count += 1
+            self._tag_document(doc)
+            chunks = clean_documents(splitter.split_documents([doc]))
+            if cfg.child_chunk_size:
+                _link_windows(chunks, cfg.neighbor_window)
+            for chunk in chunks:
+                key = str(chunk.metadata.get("source", ""))
+                if to_skip.get(key, 0) > 0:
+                    to_skip[key] -= 1
+                    continue
+                yield chunk
+        print(f"  → {doc_count} document(s) loaded")
+
+    def _tag_document(self, doc: Document) -> None:
+        """Add the structured filter fields (course, material_id, lecture) to a loaded document."""
+        metadata = doc.metadata
+        if self.config.course_code and "course" not in metadata:
+            metadata["course"] = normalize_course_code(self.config.course_code)
+        if metadata.get("source") and "material_id" not in metadata:
+            metadata["material_id"] = material_id_for(metadata["source"])
+        if metadata.get("source") and "lecture" not in metadata:
+            lecture = lecture_number_for(metadata["source"])
+            if lecture is not None:
+                metadata["lecture"] = lecture
+        if "page" in metadata:
+            try:
+                metadata["page"] = int(metadata["page"])
+            except (TypeError, ValueError):
+                pass
+
+    def _ingest(
+        self,
+        client: QdrantClient,
+        embeddings,
+        vector_name: str,
+        chunks: Iterable[Document],
+        on_commit: Optional[Callable[[list[Document]], None]] = None,
+        collection_name: Optional[str] = None,
+    ) -> IngestStats:
+        """Embed and upsert chunks into `collection_name` (default: the configured one)."""
+        cfg = self.config
+        collection_name = collection_name or cfg.qdrant_collection
+        recorded = _stored_metadata(client, collection_name)
+        _check_embedding_identity(recorded, cfg, f"'{collection_name}'")
+        if "embedding_backend" not in recorded:
+            # Collections from before identities were recorded get this run's.
+            client.update_collection(collection_name=collection_name, metadata={**recorded, **_embedding_identity(cfg)})
+        sparse_model = _sparse_model(client, collection_name)
+        if cfg.sparse_model and sparse_model != cfg.sparse_model:
+            if sparse_model:
+                raise ValueError(
+                    f"'{collection_name}' was built with sparse model '{sparse_model}', "
+                    f"not '{cfg.sparse_model}'; use --rebuild to switch models."
+                )
+            print(f"  → '{collection_name}' has no sparse vectors; use --rebuild to make it hybrid")
+        engine = IngestionEngine(
+            client, embeddings, collection_name, vector_name, cfg,
+            reduced_dim=_reduced_dim(client, collection_name),
+            sparse_embeddings=_make_sparse_embeddings(sparse_model) if sparse_model else None,
+        )
+        cache = embeddings.cache if isinstance(embeddings, CachedEmbeddings) else None
+        before = cache.stats() if cache else None
+        stats = engine.run(chunks, on_commit=on_commit)
+        print(f"  → {stats.summary()}")
+        if cache:
+            after = cache.stats()
+            print(
+                f"  → embedding cache: {after['hits'] - before['hits']} hits, "
+                f"{after['misses'] - before['misses']} misses"
+            )
+        self.last_ingest_stats = stats
+        return stats
+
     def _check_built(self):
         if self._vectorstore is None:
             raise RuntimeError("Call .build() or .use_existing() before querying.")
 
     @property
-    def vectorstore(self) -> QdrantVectorStore:
+    def vectorstore(self) -> VectorStore:
         self._check_built()
         return self._vectorstore
 
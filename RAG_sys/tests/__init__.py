@@ -0,0 +1,8 @@
+"""Tests for the RAG pipeline. Run from RAG_sys/: python -m unittest discover tests"""
+
+import sys
+from pathlib import Path
+
+RAG_DIR = Path(__file__).resolve().parent.parent
+if str(RAG_DIR) not in sys.path:
+    sys.path.insert(0, str(RAG_DIR))
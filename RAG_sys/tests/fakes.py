@@ -0,0 +1,139 @@
+import contextlib
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from qdrant_client import QdrantClient
+
+import rag
+from rag import DataSource
+
+
+DIM = 16
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic unit vectors from a hash of the text; counts what it embeds."""
+
+    def __init__(self, dim: int = DIM):
+        self.dim = dim
+        self.embedded: list[str] = []
+
+    def vector(self, text: str) -> list[float]:
+        digest = hashlib.sha256(text.encode()).digest()
+        vector = np.frombuffer(digest, dtype=np.uint8)[:self.dim].astype(np.float32) + 1
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        # QdrantVectorStore embeds "dummy_text" on connect to check the dimension.
+        if texts != ["dummy_text"]:
+            self.embedded.extend(texts)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.vector(text)
+
+
+class TextFileSource(DataSource):
+    """One document per .txt file, with files() / for_files() so sync() can use it."""
+
+    def __init__(self, paths: list[str]):
+        self.paths = sorted(paths)
+
+    def files(self) -> list[str]:
+        return list(self.paths)
+
+    def for_files(self, files: list[str]) -> "TextFileSource":
+        return TextFileSource(files)
+
+    def load(self) -> list[Document]:
+        return list(self.iter_load())
+
+    def iter_load(self):
+        for path in self.paths:
+            with open(path, encoding="utf-8") as f:
+                yield Document(page_content=f.read(), metadata={"source": path, "page": 0})
+
+    def description(self) -> str:
+        return f"text files: {self.paths}"
+
+
+def write_pdf(path: str, pages: list[str], title: str = "Lecture") -> str:
+    """A minimal PDF with one line of Helvetica text per page, and an info dictionary."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % (5 + 2 * i) for i in range(len(pages))), len(pages)
+        ),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Title (%s) /Producer (tests) /CreationDate (D:20250101120000+00'00') >>" % title.encode(),
+    ]
+    for i, text in enumerate(pages):
+        stream = b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % text.encode("latin-1")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (6 + 2 * i)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def lecture_texts(count: int = 12) -> list[str]:
+    """Distinct, chunk-sized texts."""
+    return [f"Lecture {i} covers topic number {i}. " * 8 for i in range(count)]
+
+
+class PipelineTestCase(unittest.TestCase):
+    """
+    Every pipeline in a test shares one in-memory Qdrant client and one
+    FakeEmbeddings; manifests and exports go to a temporary directory.
+    """
+
+    def setUp(self):
+        self.embeddings = FakeEmbeddings()
+        self.client = QdrantClient(location=":memory:")
+        self.enterContext(mock.patch.object(rag, "_make_embeddings", return_value=self.embeddings))
+        self.enterContext(mock.patch.object(rag, "_make_qdrant_client", return_value=self.client))
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+        self.tmp = self.enterContext(tempfile.TemporaryDirectory())
+
+    def config(self, **overrides) -> rag.RAGConfig:
+        settings = {
+            "embedding_dim": DIM,
+            "qdrant_collection": "course",
+            "manifest_dir": os.path.join(self.tmp, "manifests"),
+            "ingest_batch_size": 4,
+            "ingest_workers": 1,
+            "chunk_size": 400,
+            "chunk_overlap": 0,
+            "top_k": 3,
+            "query_cache_size": 0,
+        }
+        settings.update(overrides)
+        return rag.RAGConfig(**settings)
+
+    def point_count(self, collection: str = "course") -> int:
+        return self.client.count(collection_name=collection, exact=True).count
+
+    def point_ids(self, collection: str = "course") -> set:
+        records, _ = self.client.scroll(collection_name=collection, limit=10_000)
+        return {record.id for record in records}
+
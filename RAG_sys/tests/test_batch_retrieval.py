@@ -0,0 +1,88 @@
+import hashlib
+import os
+from unittest import mock
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import rag
+from rag import RAGPipeline, RawTextDataSource
+
+from tests.fakes import PipelineTestCase, lecture_texts
+
+
+QUESTIONS = ["topic number 3", "Lecture 7", "what does lecture 10 cover?", "topic number 3"]
+FILTERS = [{"course": "CS201"}, None, {"course": "CS211", "page": [2, 4, 6, 10]}, {"lecture": 1}]
+
+
+class HashReranker:
+    """Scores that disagree with the vector order, so reranking visibly reorders."""
+
+    def scores(self, query: str, texts: list[str]) -> list[float]:
+        return [hashlib.sha256(f"{query}|{text}".encode()).digest()[0] / 255 for text in texts]
+
+
+def echo_llm(**kwargs):
+    """Stands in for ChatOpenAI: the answer is the prompt it was given."""
+    return RunnableLambda(lambda prompt: AIMessage(content=prompt.to_string()))
+
+
+class BatchRetrievalTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        texts = lecture_texts(12)
+        metadatas = [
+            {"source": f"/slides/Lecture {i % 3}.pdf", "page": i, "course": "CS201" if i % 2 else "CS211"}
+            for i in range(12)
+        ]
+        self.source = RawTextDataSource(texts, metadatas)
+
+    def pipelines(self, **overrides):
+        """The same material behind each store layout."""
+        yield "plain", RAGPipeline(self.source, self.config(**overrides)).build()
+        yield "reduced", RAGPipeline(
+            self.source, self.config(qdrant_collection="reduced", embedding_search_dim=8, **overrides)
+        ).build()
+        directory = os.path.join(self.tmp, "mmap")
+        RAGPipeline(config=self.config(**overrides)).use_existing().export_mmap(directory)
+        yield "mmap", RAGPipeline(config=self.config(vector_backend="mmap", mmap_path=directory, **overrides)).use_existing()
+
+    @staticmethod
+    def hits(docs) -> list[tuple]:
+        return [(str(doc.metadata["_id"]), doc.page_content, doc.metadata.get("rerank_score")) for doc in docs]
+
+    def assert_matches_retrieve(self, pipeline: RAGPipeline, filters) -> None:
+        per_question = filters if isinstance(filters, list) else [filters] * len(QUESTIONS)
+        expected = [self.hits(pipeline.retrieve(q, f)) for q, f in zip(QUESTIONS, per_question)]
+        self.assertEqual([self.hits(docs) for docs in pipeline.retrieve_many(QUESTIONS, filters)], expected)
+        self.assertTrue(all(expected))
+
+    def test_retrieve_many_matches_retrieve(self):
+        for name, pipeline in self.pipelines():
+            with self.subTest(name):
+                self.assert_matches_retrieve(pipeline, None)
+                self.assert_matches_retrieve(pipeline, {"course": "CS201"})
+                self.assert_matches_retrieve(pipeline, FILTERS)
+
+    def test_retrieve_many_matches_retrieve_with_reranking(self):
+        with mock.patch.object(rag, "_make_reranker", return_value=HashReranker()):
+            for name, pipeline in self.pipelines(rerank_model="fake/reranker", rerank_candidates=8):
+                with self.subTest(name):
+                    self.assert_matches_retrieve(pipeline, FILTERS)
+                    # The reranker, not the vector order, picked these.
+                    vector_order = self.hits(pipeline._retriever.invoke(QUESTIONS[1])[:3])
+                    self.assertNotEqual([hit[0] for hit in self.hits(pipeline.retrieve(QUESTIONS[1]))],
+                                        [hit[0] for hit in vector_order])
+
+    def test_query_many_matches_query_in_question_order(self):
+        pipeline = RAGPipeline(self.source, self.config()).build()
+        with mock.patch.object(rag, "ChatOpenAI", side_effect=echo_llm):
+            expected = [pipeline.query(q, f) for q, f in zip(QUESTIONS, FILTERS)]
+            self.assertEqual(pipeline.query_many(QUESTIONS, FILTERS), expected)
+        self.assertIn(QUESTIONS[2], expected[2]["answer"])
+        self.assertEqual(pipeline.query_many([]), [])
+
+    def test_filter_count_must_match_the_questions(self):
+        pipeline = RAGPipeline(self.source, self.config()).build()
+        with self.assertRaises(ValueError):
+            pipeline.retrieve_many(QUESTIONS, FILTERS[:2])
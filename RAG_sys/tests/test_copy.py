@@ -0,0 +1,77 @@
+import threading
+import unittest
+from collections import Counter
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from rag import copy_collection
+
+from tests.fakes import DIM
+
+
+class SerializedClient:
+    """An embedded client behind one lock, so parallel cursors can share it; records upserted ids."""
+
+    def __init__(self, client: QdrantClient):
+        self._client = client
+        self._lock = threading.Lock()
+        self.upserted = Counter()
+
+    def upsert(self, collection_name, points, **kwargs):
+        with self._lock:
+            self.upserted.update(point.id for point in points)
+            return self._client.upsert(collection_name=collection_name, points=points, **kwargs)
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return method(*args, **kwargs)
+
+        return locked
+
+
+class CopyCollectionTests(unittest.TestCase):
+    def setUp(self):
+        self.client = QdrantClient(location=":memory:")
+        self.client.create_collection("source", vectors_config={"dense": VectorParams(size=DIM, distance=Distance.COSINE)})
+        rng = np.random.default_rng(0)
+        self.client.upsert("source", points=[
+            PointStruct(
+                id=i,
+                vector={"dense": rng.normal(size=DIM).tolist()},
+                payload={"page_content": f"chunk {i}", "metadata": {"page": i % 7, "source": f"/slides/{i % 3}.pdf"}},
+            )
+            for i in range(1050)
+        ])
+
+    def records(self, collection: str) -> dict:
+        records, _ = self.client.scroll(collection, limit=10_000, with_payload=True, with_vectors=True)
+        return {record.id: (record.payload, np.asarray(record.vector["dense"])) for record in records}
+
+    def assert_same_points(self, target: dict, source: dict) -> None:
+        self.assertEqual(target.keys(), source.keys())
+        for point_id, (payload, vector) in source.items():
+            self.assertEqual(target[point_id][0], payload)
+            np.testing.assert_allclose(target[point_id][1], vector, rtol=1e-5, atol=1e-6)
+
+    def test_parallel_cursors_copy_every_point_once_with_vectors_and_payload(self):
+        shared = SerializedClient(self.client)
+        stats = copy_collection(shared, "source", "target", page_size=100, workers=4)
+
+        self.assertEqual(stats.points, 1050)
+        self.assertEqual(set(shared.upserted.values()), {1})
+        self.assertEqual(len(shared.upserted), 1050)
+        self.assert_same_points(self.records("target"), self.records("source"))
+
+    def test_single_cursor_and_transforms(self):
+        copy_collection(
+            self.client, "source", "target", page_size=100, workers=1,
+            payload_transform=lambda payload: {**payload, "copied": True},
+        )
+        target = self.records("target")
+        self.assertEqual(len(target), 1050)
+        self.assertTrue(all(payload["copied"] for payload, _ in target.values()))
@@ -0,0 +1,54 @@
+import itertools
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import rag
+from rag import CachedEmbeddings, EmbeddingCache
+
+from tests.fakes import DIM, FakeEmbeddings
+
+
+class EmbeddingCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.path = os.path.join(self.tmp, "embeddings.sqlite")
+        # A strictly increasing clock, so "least recently used" is unambiguous.
+        clock = itertools.count(1)
+        self.enterContext(mock.patch.object(rag.time, "time", side_effect=lambda: float(next(clock))))
+
+    def put(self, cache: EmbeddingCache, key: str) -> None:
+        cache.put_many("model", DIM, "document", {key: [float(ord(key))] * DIM})
+
+    def test_least_recently_used_entries_are_evicted_past_max_entries(self):
+        cache = EmbeddingCache(self.path, max_entries=3)
+        for key in "abc":
+            self.put(cache, key)
+        self.assertEqual(set(cache.get_many("model", DIM, "document", ["a"])), {"a"})
+        self.put(cache, "d")
+
+        found = cache.get_many("model", DIM, "document", list("abcd"))
+
+        self.assertEqual(set(found), {"a", "c", "d"})
+        self.assertEqual(found["d"], [float(ord("d"))] * DIM)
+        self.assertEqual(cache.stats(), {"hits": 4, "misses": 1, "hit_rate": 0.8})
+
+    def test_entries_are_keyed_by_model_dimension_and_kind_and_persist(self):
+        self.put(EmbeddingCache(self.path), "a")
+        reopened = EmbeddingCache(self.path)
+        self.assertEqual(set(reopened.get_many("model", DIM, "document", ["a"])), {"a"})
+        self.assertEqual(reopened.get_many("model", DIM, "query", ["a"]), {})
+        self.assertEqual(reopened.get_many("other", DIM, "document", ["a"]), {})
+        self.assertEqual(reopened.get_many("model", DIM + 1, "document", ["a"]), {})
+
+    def test_cached_embeddings_embed_each_text_once(self):
+        inner = FakeEmbeddings()
+        embeddings = CachedEmbeddings(inner, EmbeddingCache(self.path), "model", DIM)
+
+        first = embeddings.embed_documents(["x", "y", "x"])
+        second = embeddings.embed_documents(["y", "x"])
+
+        self.assertEqual(inner.embedded, ["x", "y"])
+        self.assertEqual(first, [inner.vector("x"), inner.vector("y"), inner.vector("x")])
+        self.assertEqual(second, [first[1], first[0]])
@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+
+import rag
+from rag import IngestionEngine, RAGConfig
+
+from tests.fakes import DIM, FakeEmbeddings
+
+
+def chunks(count: int) -> list[Document]:
+    return [Document(page_content=f"chunk {i}", metadata={"source": "/slides/a.pdf", "page": i}) for i in range(count)]
+
+
+class SlowEmbeddings(FakeEmbeddings):
+    """Earlier batches take longer, so batches finish out of order; records peak concurrency."""
+
+    def __init__(self, fail_on: str | None = None):
+        super().__init__()
+        self.fail_on = fail_on
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            first = int(texts[0].split()[1])
+            time.sleep(0.05 / (1 + first))
+            if self.fail_on in texts:
+                raise RuntimeError("embedding endpoint down")
+            return super().embed_documents(texts)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class IngestionEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.client = QdrantClient(location=":memory:")
+        self.config = RAGConfig(embedding_dim=DIM, ingest_batch_size=4, ingest_workers=4)
+        rag._create_dense_collection(self.client, "course", self.config)
+        self.committed: list[list[str]] = []
+
+    def run_engine(self, embeddings, count: int = 24):
+        engine = IngestionEngine(self.client, embeddings, "course", "dense", self.config)
+        return engine.run(chunks(count), on_commit=lambda batch: self.committed.append([d.page_content for d in batch]))
+
+    def stored(self) -> set[str]:
+        records, _ = self.client.scroll("course", limit=1000, with_payload=True)
+        return {record.payload["page_content"] for record in records}
+
+    def test_batches_embed_concurrently_and_commit_in_input_order(self):
+        embeddings = SlowEmbeddings()
+        stats = self.run_engine(embeddings)
+
+        self.assertGreater(embeddings.peak, 1)
+        self.assertEqual(self.committed, [[f"chunk {i}" for i in range(s, s + 4)] for s in range(0, 24, 4)])
+        self.assertEqual((stats.chunks, stats.upserted, stats.skipped), (24, 24, 0))
+        self.assertEqual(len(self.stored()), 24)
+
+    def test_failed_batch_is_never_committed_and_later_batches_are_not_written(self):
+        embeddings = SlowEmbeddings(fail_on="chunk 9")
+        with self.assertRaises(RuntimeError):
+            self.run_engine(embeddings)
+
+        # Batches 3-5 finish embedding before batch 2 fails, but are never written.
+        self.assertEqual(self.committed, [[f"chunk {i}" for i in range(s, s + 4)] for s in (0, 4)])
+        self.assertEqual(self.stored(), {f"chunk {i}" for i in range(8)})
+
+    def test_repeats_within_a_run_are_counted_apart_from_stored_chunks(self):
+        embeddings = FakeEmbeddings()
+        IngestionEngine(self.client, embeddings, "course", "dense", self.config).run(chunks(4))
+        all_chunks = chunks(8)
+        repeated = all_chunks + [all_chunks[1]] * 3 + [all_chunks[6]]
+
+        stats = IngestionEngine(self.client, embeddings, "course", "dense", self.config).run(repeated)
+
+        # chunk 0-3 were stored before; chunk 1 (x3) and chunk 6 repeat within this run.
+        self.assertEqual((stats.chunks, stats.upserted, stats.skipped, stats.duplicates), (12, 4, 4, 4))
+        self.assertIn("4 already present, 4 repeated in this run", stats.summary())
+        self.assertEqual(embeddings.embedded, [f"chunk {i}" for i in range(8)])
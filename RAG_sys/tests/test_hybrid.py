@@ -0,0 +1,110 @@
+from unittest import mock
+
+import numpy as np
+from qdrant_client.models import PointStruct, SparseVector
+
+import rag
+from rag import RAGPipeline, RawTextDataSource
+
+from tests.fakes import DIM, FakeEmbeddings, PipelineTestCase
+
+
+QUERY = "graph traversal"
+DENSE_ONLY_QUERY = "how is it searched?"    # same direction as QUERY, no vocabulary words
+
+# Dense similarity to QUERY falls from A to D; only B and D share its words,
+# B more strongly. A and C have empty sparse vectors.
+DOCS = {
+    "A": (0.95, "Alpha notes on recursion and the call stack."),
+    "B": (0.90, "Beta notes: graph traversal, graph traversal examples."),
+    "C": (0.85, "Gamma notes on sorting algorithms."),
+    "D": (0.80, "Delta notes with one graph traversal."),
+}
+
+
+class PlacedEmbeddings(FakeEmbeddings):
+    """Both queries point along the first axis; each doc sits at its chosen cosine to it."""
+
+    def vector(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for i, (cosine, doc) in enumerate(DOCS.values(), start=1):
+            if text == doc:
+                vector[0], vector[i] = cosine, np.sqrt(1 - cosine ** 2)
+                return vector.tolist()
+        vector[0 if text in (QUERY, DENSE_ONLY_QUERY) else self.dim - 1] = 1.0
+        return vector.tolist()
+
+
+class WordSparse:
+    """Term counts over a fixed vocabulary, standing in for a fastembed sparse model."""
+
+    VOCABULARY = ["graph", "traversal"]
+
+    def embed_query(self, text: str) -> SparseVector:
+        words = [w.strip(",.:").lower() for w in text.split()]
+        indices = [i for i, term in enumerate(self.VOCABULARY) if term in words]
+        return SparseVector(indices=indices, values=[float(words.count(self.VOCABULARY[i])) for i in indices])
+
+    def embed_documents(self, texts: list[str]) -> list[SparseVector]:
+        return [self.embed_query(text) for text in texts]
+
+
+def rrf(*rankings: list[str], k: int = 2) -> list[str]:
+    """Reciprocal rank fusion with Qdrant's default constant."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, name in enumerate(ranking):
+            scores[name] = scores.get(name, 0.0) + 1 / (k + rank + 1)
+    return sorted(scores, key=lambda name: -scores[name])
+
+
+class HybridRetrievalTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.embeddings = PlacedEmbeddings(DIM)
+        self.enterContext(mock.patch.object(rag, "_make_embeddings", return_value=self.embeddings))
+        self.enterContext(mock.patch.object(rag, "_make_sparse_embeddings", return_value=WordSparse()))
+        texts = [text for _, text in DOCS.values()]
+        metadatas = [{"source": f"/notes/{name}.pdf", "page": 0} for name in DOCS]
+        self.pipeline = RAGPipeline(
+            RawTextDataSource(texts, metadatas), self.config(sparse_model="fake/words", top_k=4)
+        ).build()
+
+    def names(self, docs) -> list[str]:
+        return [doc.metadata["source"][-5] for doc in docs]
+
+    def test_points_store_sparse_vectors_only_where_terms_matched(self):
+        records = self.client.scroll("course", limit=10, with_payload=True, with_vectors=True)[0]
+        sparse = {r.payload["metadata"]["source"][-5]: r.vector.get(rag.SPARSE_VECTOR_NAME) for r in records}
+        self.assertEqual(sparse["B"].values, [2.0, 2.0])
+        self.assertEqual(sparse["D"].values, [1.0, 1.0])
+        for name in "AC":
+            self.assertFalse(sparse[name] and sparse[name].indices)
+
+    def test_dense_and_sparse_rankings_are_fused(self):
+        self.assertIsInstance(self.pipeline._retriever, rag.HybridRetriever)
+        with mock.patch.object(self.client, "query_batch_points", wraps=self.client.query_batch_points) as query:
+            docs = self.pipeline.retrieve(QUERY)
+
+        (request,) = query.call_args.kwargs["requests"]
+        self.assertEqual([p.using for p in request.prefetch], ["dense", rag.SPARSE_VECTOR_NAME])
+        # Dense alone gives A, B, C, D and sparse alone B, D; fused, B and D lead.
+        self.assertEqual(self.names(docs), ["B", "D", "A", "C"])
+        self.assertEqual(self.names(docs), rrf(["A", "B", "C", "D"], ["B", "D"]))
+
+    def test_query_without_sparse_terms_falls_back_to_the_dense_order(self):
+        self.assertEqual(self.names(self.pipeline.retrieve(DENSE_ONLY_QUERY)), ["A", "B", "C", "D"])
+
+    def test_points_without_a_sparse_vector_are_still_found_by_the_dense_side(self):
+        vector = np.zeros(DIM, dtype=np.float32)
+        vector[0], vector[5] = 0.75, np.sqrt(1 - 0.75 ** 2)
+        self.client.upsert("course", [PointStruct(id=1, vector={"dense": vector.tolist()}, payload={
+            "page_content": "Epsilon notes, copied without a sparse vector.",
+            "metadata": {"source": "/notes/E.pdf", "page": 0},
+        })])
+
+        pipeline = RAGPipeline(config=self.config(sparse_model="fake/words", top_k=5)).use_existing()
+        docs = pipeline.retrieve(QUERY)
+
+        self.assertEqual(self.names(docs), ["B", "D", "A", "C", "E"])
+        self.assertEqual(self.names(docs), rrf(["A", "B", "C", "D", "E"], ["B", "D"]))
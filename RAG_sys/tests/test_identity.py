@@ -0,0 +1,73 @@
+import os
+
+from qdrant_client.models import Distance, VectorParams
+
+import rag
+from rag import RAGPipeline, RawTextDataSource
+
+from tests.fakes import PipelineTestCase, lecture_texts
+
+
+MISMATCHES = {
+    "embedding_model": {"embedding_model": "text-embedding-3-large"},
+    "embedding_dim": {"embedding_dim": 32},
+    "embedding_backend": {"embedding_backend": "fastembed"},
+}
+
+
+class EmbeddingIdentityTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pipeline = RAGPipeline(RawTextDataSource(lecture_texts(4)), self.config()).build()
+
+    def test_collection_records_the_identity_it_was_built_with(self):
+        recorded = rag._stored_metadata(self.client, "course")
+        self.assertEqual(
+            {key: recorded[key] for key in ("embedding_backend", "embedding_model", "embedding_dim")},
+            {"embedding_backend": "openai", "embedding_model": "text-embedding-3-small", "embedding_dim": 16},
+        )
+
+    def test_connecting_with_another_identity_is_refused(self):
+        for key, overrides in MISMATCHES.items():
+            with self.subTest(key), self.assertRaisesRegex(ValueError, f"{key}="):
+                RAGPipeline(config=self.config(**overrides)).use_existing()
+
+    def test_ingesting_with_another_identity_writes_nothing(self):
+        before = self.point_ids()
+        source = RawTextDataSource([f"New lecture {i} text. " * 8 for i in range(3)])
+        for key, overrides in MISMATCHES.items():
+            with self.subTest(key), self.assertRaisesRegex(ValueError, f"{key}="):
+                RAGPipeline(source, self.config(**overrides)).build_incremental()
+        self.assertEqual(self.point_ids(), before)
+
+    def test_exports_carry_the_identity(self):
+        snapshot = os.path.join(self.tmp, "course.snapshot")
+        self.pipeline.export_snapshot(snapshot)
+        mmap_path = os.path.join(self.tmp, "mmap")
+        self.pipeline.export_mmap(mmap_path)
+
+        other = self.config(embedding_model="text-embedding-3-large", qdrant_collection="copy")
+        with self.assertRaisesRegex(ValueError, "embedding_model="):
+            RAGPipeline(config=other).import_snapshot(snapshot)
+        self.assertFalse(self.client.collection_exists("copy"))
+        with self.assertRaisesRegex(ValueError, "embedding_model="):
+            RAGPipeline(config=self.config(
+                embedding_model="text-embedding-3-large", vector_backend="mmap", mmap_path=mmap_path
+            )).use_existing()
+
+        # The same identity connects to both.
+        RAGPipeline(config=self.config(qdrant_collection="copy")).import_snapshot(snapshot)
+        self.assertEqual(self.point_count("copy"), self.point_count())
+        RAGPipeline(config=self.config(vector_backend="mmap", mmap_path=mmap_path)).use_existing()
+
+    def test_collections_without_a_recorded_identity_adopt_the_first_one(self):
+        # As created before identities were recorded.
+        self.client.create_collection("legacy", vectors_config={
+            "dense": VectorParams(size=16, distance=Distance.COSINE),
+        })
+        large = self.config(embedding_model="text-embedding-3-large", qdrant_collection="legacy")
+        RAGPipeline(RawTextDataSource(["One more lecture. " * 8]), large).build_incremental()
+
+        self.assertEqual(rag._stored_metadata(self.client, "legacy")["embedding_model"], "text-embedding-3-large")
+        with self.assertRaisesRegex(ValueError, "embedding_model="):
+            RAGPipeline(config=self.config(qdrant_collection="legacy")).use_existing()
@@ -0,0 +1,165 @@
+import os
+import time
+
+from qdrant_client.models import Distance, VectorParams
+
+import rag
+from rag import IngestCheckpoint, RAGPipeline, RawTextDataSource
+
+from tests.fakes import DIM, PipelineTestCase, TextFileSource, lecture_texts
+
+
+def lecture_source(count: int = 12) -> RawTextDataSource:
+    texts = lecture_texts(count)
+    return RawTextDataSource(texts, [{"source": f"/slides/lecture-{i % 3}.pdf", "page": i} for i in range(count)])
+
+
+class IdempotentIngestTests(PipelineTestCase):
+    def test_point_ids_are_deterministic(self):
+        RAGPipeline(lecture_source(), self.config(qdrant_collection="first")).build()
+        RAGPipeline(lecture_source(), self.config(qdrant_collection="second")).build()
+        self.assertEqual(self.point_ids("first"), self.point_ids("second"))
+
+    def test_reingesting_the_same_chunks_embeds_and_adds_nothing(self):
+        RAGPipeline(lecture_source(), self.config()).build_incremental()
+        count, embedded = self.point_count(), len(self.embeddings.embedded)
+
+        RAGPipeline(lecture_source(), self.config()).build_incremental()
+
+        self.assertEqual(self.point_count(), count)
+        self.assertEqual(len(self.embeddings.embedded), embedded)
+
+
+class ResumeTests(PipelineTestCase):
+    def test_resumed_run_skips_committed_batches(self):
+        checkpoint_path = os.path.join(self.tmp, "checkpoint.json")
+        cfg = self.config()
+        embed_documents = self.embeddings.embed_documents
+        calls = []
+
+        def fail_on_third_batch(texts):
+            calls.append(texts)
+            if len(calls) == 3:
+                raise RuntimeError("connection lost")
+            return embed_documents(texts)
+
+        self.embeddings.embed_documents = fail_on_third_batch
+        with self.assertRaises(RuntimeError):
+            RAGPipeline(lecture_source(), cfg).build_incremental(IngestCheckpoint.load(checkpoint_path, cfg))
+        self.assertEqual(self.point_count(), 8)
+
+        self.embeddings.embed_documents = embed_documents
+        self.embeddings.embedded.clear()
+        RAGPipeline(lecture_source(), cfg).build_incremental(IngestCheckpoint.load(checkpoint_path, cfg))
+
+        self.assertEqual(self.point_count(), 12)
+        self.assertEqual(len(self.embeddings.embedded), 4)
+
+    def test_checkpoint_with_other_chunk_settings_is_ignored(self):
+        checkpoint_path = os.path.join(self.tmp, "checkpoint.json")
+        checkpoint = IngestCheckpoint.load(checkpoint_path, self.config())
+        checkpoint.completed = ["/slides/lecture-0.pdf"]
+        checkpoint.save()
+
+        self.assertTrue(IngestCheckpoint.load(checkpoint_path, self.config(chunk_size=200)).is_empty)
+        self.assertFalse(IngestCheckpoint.load(checkpoint_path, self.config()).is_empty)
+
+
+class SyncTests(PipelineTestCase):
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.tmp, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def sources(self) -> list[str]:
+        return [record.payload["metadata"]["source"] for record in self.client.scroll("course", limit=1000)[0]]
+
+    def test_only_new_changed_and_removed_files_are_touched(self):
+        texts = lecture_texts(3)
+        paths = [self.write(f"lecture-{i}.txt", text) for i, text in enumerate(texts)]
+        RAGPipeline(TextFileSource(paths), self.config()).sync()
+        self.assertEqual(sorted(set(self.sources())), sorted(paths))
+
+        self.embeddings.embedded.clear()
+        RAGPipeline(TextFileSource(paths), self.config()).sync()
+        self.assertEqual(self.embeddings.embedded, [])
+
+        time.sleep(0.01)
+        rewritten = " ".join(["Rewritten lecture about vtables."] * 8)
+        self.write("lecture-1.txt", rewritten)
+        os.remove(paths[2])
+        RAGPipeline(TextFileSource(paths[:2]), self.config()).sync()
+
+        self.assertEqual(self.embeddings.embedded, [rewritten])
+        self.assertEqual(sorted(set(self.sources())), sorted(paths[:2]))
+        self.assertEqual(self.point_count(), 2)
+
+    def test_touched_but_identical_file_is_not_reingested(self):
+        path = self.write("lecture-0.txt", lecture_texts(1)[0])
+        RAGPipeline(TextFileSource([path]), self.config()).sync()
+        self.embeddings.embedded.clear()
+
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        RAGPipeline(TextFileSource([path]), self.config()).sync()
+
+        self.assertEqual(self.embeddings.embedded, [])
+
+
+class BlueGreenBuildTests(PipelineTestCase):
+    def collections(self) -> list[str]:
+        return sorted(c.name for c in self.client.get_collections().collections)
+
+    def test_rebuild_switches_the_alias_and_keeps_two_versions(self):
+        for _ in range(3):
+            RAGPipeline(lecture_source(), self.config()).build()
+        versions = self.collections()
+        self.assertEqual(len(versions), 2)
+        self.assertEqual(rag._alias_target(self.client, "course"), versions[-1])
+        self.assertEqual(self.point_count(), 12)
+
+    def test_incremental_ingest_creates_an_alias_that_a_rebuild_can_switch(self):
+        RAGPipeline(lecture_source(4), self.config()).build_incremental()
+        first = rag._alias_target(self.client, "course")
+        self.assertTrue(first.startswith("course__v"))
+
+        RAGPipeline(lecture_source(), self.config()).build()
+        self.assertNotEqual(rag._alias_target(self.client, "course"), first)
+        self.assertEqual(self.point_count(), 12)
+
+    def test_copy_and_snapshot_import_create_aliases(self):
+        RAGPipeline(lecture_source(), self.config()).build()
+        RAGPipeline(config=self.config(qdrant_collection="copy")).copy_from("course")
+        path = os.path.join(self.tmp, "course.snapshot.tar")
+        RAGPipeline(config=self.config()).export_snapshot(path)
+        RAGPipeline(config=self.config(qdrant_collection="restored")).import_snapshot(path)
+
+        for name in ("copy", "restored"):
+            self.assertTrue(rag._alias_target(self.client, name).startswith(f"{name}__v"))
+            self.assertEqual(self.point_count(name), 12)
+
+    def test_recreating_import_switches_to_a_new_version(self):
+        RAGPipeline(lecture_source(), self.config()).build()
+        path = os.path.join(self.tmp, "course.snapshot.tar")
+        RAGPipeline(config=self.config()).export_snapshot(path)
+        RAGPipeline(lecture_source(4), self.config(qdrant_collection="restored")).build_incremental()
+        first = rag._alias_target(self.client, "restored")
+
+        RAGPipeline(config=self.config(qdrant_collection="restored")).import_snapshot(path, recreate=True)
+
+        self.assertNotEqual(rag._alias_target(self.client, "restored"), first)
+        self.assertFalse(self.client.collection_exists(first))
+        self.assertEqual(self.point_count("restored"), 12)
+
+    def test_legacy_collection_is_kept_unless_replacement_is_asked_for(self):
+        self.client.create_collection("course", vectors_config=VectorParams(size=DIM, distance=Distance.COSINE))
+        RAGPipeline(lecture_source(4), self.config()).build_incremental()
+
+        with self.assertRaises(RuntimeError):
+            RAGPipeline(lecture_source(), self.config()).build()
+        self.assertEqual(self.collections(), ["course"])
+        self.assertEqual(self.point_count(), 4)
+
+        RAGPipeline(lecture_source(), self.config(replace_legacy_collection=True)).build()
+        self.assertTrue(rag._alias_target(self.client, "course").startswith("course__v"))
+        self.assertEqual(self.point_count(), 12)
@@ -0,0 +1,67 @@
+import threading
+import unittest
+from unittest import mock
+
+import rag
+from rag import CrossEncoderReranker, RerankStats
+
+
+class LocalModelTests(unittest.TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.dict(rag._LOCAL_MODELS, clear=True))
+        self.enterContext(mock.patch.dict(rag._LOCAL_MODEL_LOCKS, clear=True))
+
+    def test_loading_one_model_does_not_block_another(self):
+        loading, release = threading.Event(), threading.Event()
+
+        def slow_download():
+            loading.set()
+            release.wait(5)
+            return "slow"
+
+        thread = threading.Thread(target=rag._local_model, args=(("dense", "big"), slow_download))
+        thread.start()
+        self.assertTrue(loading.wait(5))
+        self.assertEqual(rag._local_model(("sparse", "bm25"), lambda: "fast"), "fast")
+        release.set()
+        thread.join()
+        self.assertEqual(rag._LOCAL_MODELS[("dense", "big")], "slow")
+
+    def test_each_model_is_loaded_once(self):
+        loads = []
+
+        def load():
+            loads.append(1)
+            return object()
+
+        threads = [threading.Thread(target=rag._local_model, args=(("rerank", "m", None), load)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(loads), 1)
+
+
+class RerankTests(unittest.TestCase):
+    def test_pool_is_created_on_first_use(self):
+        with mock.patch.object(CrossEncoderReranker, "_pool", None):
+            self.assertIsNone(CrossEncoderReranker._pool)
+            pool = CrossEncoderReranker.pool()
+            self.assertIs(CrossEncoderReranker.pool(), pool)
+            pool.shutdown()
+
+    def test_stats_count_every_update_from_many_threads(self):
+        stats = RerankStats()
+
+        def update():
+            for _ in range(1000):
+                stats.record(0.001)
+                stats.record_fallback()
+
+        threads = [threading.Thread(target=update) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((stats.reranked, stats.fallbacks), (8000, 8000))
+        self.assertAlmostEqual(stats.seconds, 8.0)
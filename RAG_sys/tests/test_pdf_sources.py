@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import rag
+from rag import PageCache, PDFDataSource, file_sha256
+
+from tests.fakes import write_pdf
+
+
+class PDFTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.paths = [
+            write_pdf(os.path.join(self.tmp, f"Lecture {i}.pdf"), [f"Lecture {i} page {p}" for p in range(pages)])
+            for i, pages in enumerate([5, 1, 3])
+        ]
+
+    def pages(self, docs) -> list[tuple[str, dict]]:
+        return [(doc.page_content, doc.metadata) for doc in docs]
+
+
+class ParallelParseTests(PDFTestCase):
+    def test_process_pool_matches_the_serial_loader(self):
+        serial = self.pages(PDFDataSource(self.paths).load())
+        self.assertEqual(len(serial), 9)
+        self.assertEqual(serial[0][0], "Lecture 0 page 0")
+        for pages_per_task in (1, 2, 32):
+            with self.subTest(pages_per_task=pages_per_task):
+                parallel = PDFDataSource(self.paths, workers=2, pages_per_task=pages_per_task).load()
+                self.assertEqual(self.pages(parallel), serial)
+
+
+class PageCacheTests(PDFTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = PageCache(os.path.join(self.tmp, "pages"))
+        self.parsed: list[str] = []
+        parse = PDFDataSource._parse
+
+        def counting_parse(source, paths):
+            self.parsed.extend(paths)
+            return parse(source, paths)
+
+        self.enterContext(mock.patch.object(PDFDataSource, "_parse", counting_parse))
+
+    def load(self, paths=None):
+        return self.pages(PDFDataSource(paths or self.paths, page_cache=self.cache).load())
+
+    def test_second_load_is_served_from_the_cache(self):
+        first = self.load()
+        self.parsed.clear()
+
+        self.assertEqual(self.load(), first)
+        self.assertEqual(self.parsed, [])
+        self.assertEqual((self.cache.hits, self.cache.misses), (3, 3))
+
+    def test_entries_round_trip_through_gzip_with_the_loading_path_as_source(self):
+        expected = self.load()[:5]
+        entry = self.cache._entry_path(file_sha256(self.paths[0]))
+        with gzip.open(entry, "rt", encoding="utf-8") as f:
+            stored = json.load(f)
+        self.assertEqual([page["text"] for page in stored], [text for text, _ in expected])
+        self.assertNotIn("source", stored[0]["metadata"])
+
+        moved = shutil.copy(self.paths[0], os.path.join(self.tmp, "moved.pdf"))
+        self.assertEqual(
+            [(text, metadata) for text, metadata in self.load([moved])],
+            [(text, metadata | {"source": moved}) for text, metadata in expected],
+        )
+        self.assertNotIn(moved, self.parsed)
+
+    def test_changed_file_or_parser_version_is_parsed_again(self):
+        self.load()
+        write_pdf(self.paths[1], ["Lecture 1 rewritten"])
+        self.parsed.clear()
+        pages = self.load()
+        self.assertEqual(self.parsed, [self.paths[1]])
+        self.assertIn("Lecture 1 rewritten", [text for text, _ in pages])
+
+        self.parsed.clear()
+        with mock.patch.object(rag, "_pdf_parser_version", return_value="pypdf-next"):
+            self.load()
+        self.assertEqual(self.parsed, self.paths)
@@ -0,0 +1,70 @@
+import unittest
+from unittest import mock
+
+import rag
+from rag import QueryCachedEmbeddings, QueryVectorCache, RAGPipeline, RawTextDataSource
+
+from tests.fakes import FakeEmbeddings, PipelineTestCase, lecture_texts
+
+
+class QueryVectorCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.enterContext(mock.patch.object(rag.time, "monotonic", side_effect=lambda: self.now))
+
+    def test_entries_expire_after_ttl(self):
+        cache = QueryVectorCache(max_entries=8, ttl=60)
+        cache.put("q", [1.0], seconds=0.1)
+        self.now = 60
+        self.assertEqual(cache.get("q"), [1.0])
+        self.now = 60.5
+        self.assertIsNone(cache.get("q"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = QueryVectorCache(max_entries=2)
+        cache.put("a", [1.0], seconds=0.1)
+        cache.put("b", [2.0], seconds=0.1)
+        cache.get("a")
+        cache.put("c", [3.0], seconds=0.1)
+
+        self.assertEqual(cache.get("a"), [1.0])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), [3.0])
+
+    def test_stats_report_hits_and_the_time_saved(self):
+        cache = QueryVectorCache()
+        cache.put("a", [1.0], seconds=0.2)
+        cache.put("b", [2.0], seconds=0.4)
+        for key in ["a", "a", "b", "c"]:
+            cache.get(key)
+
+        stats = cache.stats()
+
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"]), (2, 3, 1))
+        self.assertEqual(stats["hit_rate"], 0.75)
+        self.assertAlmostEqual(stats["mean_miss_ms"], 600)
+        self.assertAlmostEqual(stats["saved_seconds"], 1.8)
+
+    def test_equivalent_questions_share_an_entry(self):
+        inner = FakeEmbeddings()
+        embeddings = QueryCachedEmbeddings(inner, QueryVectorCache())
+        with mock.patch.object(inner, "embed_query", wraps=inner.embed_query) as embed_query:
+            first = embeddings.embed_query("What is  Encapsulation?")
+            second = embeddings.embed_query("what is encapsulation")
+        self.assertEqual(first, second)
+        embed_query.assert_called_once()
+
+
+class PipelineQueryCacheTests(PipelineTestCase):
+    def test_repeated_questions_are_embedded_once(self):
+        RAGPipeline(RawTextDataSource(lecture_texts(4)), self.config()).build()
+        pipeline = RAGPipeline(config=self.config(query_cache_size=16)).use_existing()
+
+        with mock.patch.object(self.embeddings, "embed_query", wraps=self.embeddings.embed_query) as embed_query:
+            first = pipeline.retrieve("topic number 2")
+            second = pipeline.retrieve("Topic number 2?")
+
+        self.assertEqual([d.metadata["_id"] for d in first], [d.metadata["_id"] for d in second])
+        embed_query.assert_called_once()
+        self.assertEqual(pipeline.query_cache.stats()["hits"], 1)
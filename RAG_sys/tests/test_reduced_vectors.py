@@ -0,0 +1,85 @@
+from unittest import mock
+
+import numpy as np
+
+import rag
+from rag import RAGPipeline, RawTextDataSource
+
+from tests.fakes import DIM, PipelineTestCase, lecture_texts
+
+
+QUESTIONS = ["topic number 3", "Lecture 7", "what does lecture 10 cover?"]
+
+
+def course_source(count: int = 12) -> RawTextDataSource:
+    texts = lecture_texts(count)
+    metadatas = [
+        {"source": f"/slides/Lecture {i}.pdf", "page": 0, "course": "CS201" if i % 2 else "CS211"}
+        for i in range(count)
+    ]
+    return RawTextDataSource(texts, metadatas)
+
+
+class ReducedVectorTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pipeline = RAGPipeline(
+            course_source(), self.config(embedding_search_dim=8, rescore_candidates=6, topic_clusters=2)
+        ).build()
+
+    def requests(self):
+        """Records the QueryRequests sent to Qdrant."""
+        return mock.patch.object(self.client, "query_batch_points", wraps=self.client.query_batch_points)
+
+    def exact(self, question: str, k: int, course: str = None) -> list:
+        """Point ids of an exhaustive full-vector search."""
+        records = self.client.scroll("course", limit=1000, with_payload=True, with_vectors=["dense"])[0]
+        if course:
+            records = [r for r in records if r.payload["metadata"]["course"] == course]
+        query = np.asarray(self.embeddings.embed_query(question))
+        records.sort(key=lambda r: -float(np.dot(r.vector["dense"], query)))
+        return [r.id for r in records[:k]]
+
+    def assert_prefetch_then_rescore(self, request):
+        self.assertEqual(request.using, "dense")
+        self.assertEqual(request.prefetch.using, rag.REDUCED_VECTOR_NAME)
+        self.assertEqual(len(request.prefetch.query), 8)
+        self.assertGreaterEqual(request.prefetch.limit, request.limit)
+
+    def test_collection_stores_an_unindexed_full_vector_and_a_reduced_one(self):
+        vectors = self.client.get_collection("course").config.params.vectors
+        self.assertEqual(vectors["dense"].size, DIM)
+        self.assertEqual(vectors["dense"].hnsw_config.m, 0)
+        self.assertTrue(vectors["dense"].on_disk)
+        self.assertEqual(vectors[rag.REDUCED_VECTOR_NAME].size, 8)
+        self.assertIsInstance(self.pipeline._retriever, rag.RescoringRetriever)
+
+    def test_truncated_embedding_is_a_unit_vector(self):
+        vector = self.embeddings.embed_query("anything")
+        reduced = rag.truncate_embedding(vector, 8)
+        self.assertEqual(len(reduced), 8)
+        self.assertAlmostEqual(float(np.linalg.norm(reduced)), 1.0, places=5)
+        np.testing.assert_allclose(reduced, np.asarray(vector[:8]) / np.linalg.norm(vector[:8]), rtol=1e-6)
+
+    def test_retrieve_prefetches_reduced_vectors_and_rescores_with_full_ones(self):
+        with self.requests() as query_batch_points:
+            results = self.pipeline.retrieve_many(QUESTIONS, filters=[None, {"course": "CS201"}, None])
+
+        requests = query_batch_points.call_args.kwargs["requests"]
+        self.assertEqual(len(requests), 3)
+        for request in requests:
+            self.assert_prefetch_then_rescore(request)
+        self.assertIsNotNone(requests[1].prefetch.filter)
+        # With enough candidates the rescored ranking is the exact one.
+        for question, course, docs in zip(QUESTIONS, [None, "CS201", None], results):
+            self.assertEqual([doc.metadata["_id"] for doc in docs], self.exact(question, 3, course))
+
+    def test_filtered_topic_documents_go_through_the_reduced_vectors(self):
+        with self.requests() as query_batch_points:
+            docs = self.pipeline.topic_documents("topic number 4", filters={"course": "CS211"}, limit=2)
+
+        self.assertEqual(len(docs), 2)
+        self.assertEqual({doc.metadata["course"] for doc in docs}, {"CS211"})
+        (request,) = query_batch_points.call_args.kwargs["requests"]
+        self.assert_prefetch_then_rescore(request)
+        self.assertIsNotNone(request.prefetch.filter)
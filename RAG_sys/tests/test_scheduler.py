@@ -0,0 +1,234 @@
+import base64
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import numpy as np
+
+import rag
+from rag import EmbeddingScheduler, RAGConfig, _TokenBucket
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_refills_at_the_per_minute_rate(self):
+        clock = [100.0]
+        with mock.patch.object(rag.time, "monotonic", side_effect=lambda: clock[0]):
+            bucket = _TokenBucket(60)
+            self.assertEqual(bucket.wait_time(1), 0.0)
+            bucket.take(60)
+            self.assertAlmostEqual(bucket.wait_time(1), 1.0)
+            clock[0] += 0.5
+            self.assertAlmostEqual(bucket.wait_time(1), 0.5)
+            clock[0] += 0.5
+            self.assertEqual(bucket.wait_time(1), 0.0)
+
+    def test_request_larger_than_the_budget_waits_for_a_full_bucket(self):
+        clock = [0.0]
+        with mock.patch.object(rag.time, "monotonic", side_effect=lambda: clock[0]):
+            bucket = _TokenBucket(60)
+            bucket.take(30)
+            self.assertAlmostEqual(bucket.wait_time(1000), 30.0)
+
+
+class EmbeddingSchedulerTests(unittest.TestCase):
+    def test_requests_per_minute_are_enforced(self):
+        scheduler = EmbeddingScheduler(rpm=120, tpm=0)
+        started = time.monotonic()
+        for _ in range(121):
+            scheduler.call(lambda texts: [[0.0]], ["x"])
+        # 120 calls fit the bucket; the 121st waits for 1/2 s of refill.
+        self.assertGreaterEqual(time.monotonic() - started, 0.4)
+
+    def test_tokens_per_minute_are_enforced(self):
+        scheduler = EmbeddingScheduler(rpm=0, tpm=2400)
+        scheduler.call(lambda texts: [[0.0]], ["x" * 9600])     # 2400 tokens: the whole budget
+        started = time.monotonic()
+        scheduler.call(lambda texts: [[0.0]], ["x" * 80])       # 20 tokens at 40 tokens/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.4)
+
+    def test_throttling_halves_concurrency_and_success_grows_it(self):
+        scheduler = EmbeddingScheduler(rpm=0, tpm=0, max_concurrency=8, base_delay=0.01)
+        failures = [Throttled(), Throttled()]
+
+        def flaky(texts):
+            if failures:
+                raise failures.pop()
+            return [[1.0]]
+
+        self.assertEqual(scheduler.call(flaky, ["x"]), [[1.0]])
+        self.assertEqual(scheduler.retries, 2)
+        self.assertEqual(scheduler.concurrency_limit, 2)
+        for _ in range(10):
+            scheduler.call(lambda texts: [[1.0]], ["x"])
+        self.assertGreater(scheduler.concurrency_limit, 2)
+
+    def test_concurrent_429s_halve_concurrency_once(self):
+        scheduler = EmbeddingScheduler(rpm=0, tpm=0, max_concurrency=8, base_delay=0.01)
+        in_flight = threading.Barrier(8)
+        attempts = threading.local()
+
+        def overloaded(texts):
+            # Every call is in flight when the first 429 arrives; retries fail for good.
+            attempts.count = getattr(attempts, "count", 0) + 1
+            if attempts.count == 1:
+                in_flight.wait()
+                raise Throttled()
+            raise ValueError("stop")
+
+        threads = [threading.Thread(target=self.call_quietly, args=(scheduler, overloaded)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(scheduler.throttled, 8)
+        self.assertEqual(scheduler.concurrency_limit, 4)
+
+    @staticmethod
+    def call_quietly(scheduler, fn):
+        try:
+            scheduler.call(fn, ["x"])
+        except ValueError:
+            pass
+
+    def test_gives_up_after_max_retries(self):
+        scheduler = EmbeddingScheduler(rpm=0, tpm=0, max_retries=2, base_delay=0.01)
+
+        def always_throttled(texts):
+            raise Throttled()
+
+        with self.assertRaises(Throttled):
+            scheduler.call(always_throttled, ["x"])
+        self.assertEqual(scheduler.retries, 2)
+
+    def test_other_errors_are_not_retried(self):
+        scheduler = EmbeddingScheduler(rpm=0, tpm=0)
+
+        def broken(texts):
+            raise ValueError("bad input")
+
+        with self.assertRaises(ValueError):
+            scheduler.call(broken, ["x"])
+        self.assertEqual(scheduler.retries, 0)
+
+    def test_concurrency_never_exceeds_the_limit(self):
+        scheduler = EmbeddingScheduler(rpm=0, tpm=0, max_concurrency=3)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow(texts):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return [[0.0]]
+
+        threads = [threading.Thread(target=scheduler.call, args=(slow, ["x"])) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak[0], 3)
+
+
+class StubEndpointTests(unittest.TestCase):
+    """The real OpenAI client, pointed at a local stub that throttles the first requests."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubEmbeddingsHandler)
+        self.server.throttle = 2
+        self.server.slow = 0
+        self.server.requests = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.enterContext(mock.patch.dict("os.environ", {"OPENAI_API_KEY": "test"}))
+        self.enterContext(mock.patch.dict(rag._EMBEDDING_SCHEDULERS, clear=True))
+
+    def test_429s_are_retried_after_retry_after(self):
+        cfg = RAGConfig(
+            embedding_dim=4,
+            embedding_api_base=f"http://127.0.0.1:{self.server.server_port}/v1",
+            embedding_rpm=0,
+            embedding_tpm=0,
+        )
+        embeddings = rag._make_embeddings(cfg)
+        vectors = embeddings.embed_documents(["alpha", "beta"])
+
+        self.assertEqual(len(vectors), 2)
+        self.assertEqual(len(vectors[0]), 4)
+        scheduler = rag.get_embedding_scheduler(cfg)
+        self.assertEqual(scheduler.stats()["throttled"], 2)
+        self.assertEqual(scheduler.concurrency_limit, 2)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_slow_requests_time_out_and_are_retried(self):
+        self.server.throttle = 0
+        self.server.slow = 1
+        cfg = RAGConfig(
+            embedding_dim=4,
+            embedding_api_base=f"http://127.0.0.1:{self.server.server_port}/v1",
+            embedding_rpm=0,
+            embedding_tpm=0,
+            embedding_request_timeout=0.2,
+        )
+        embeddings = rag._make_embeddings(cfg)
+        self.assertEqual(embeddings.inner.request_timeout, 0.2)
+
+        rag.get_embedding_scheduler(cfg).base_delay = 0.01
+        self.assertEqual(len(embeddings.embed_documents(["alpha"])), 1)
+        self.assertEqual(rag.get_embedding_scheduler(cfg).stats()["retries"], 1)
+        self.assertEqual(self.server.requests, 2)
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+class StubEmbeddingsHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI-style POST /v1/embeddings: 429 for the first `server.throttle`
+    requests, then the next `server.slow` requests stall for a second.
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests += 1
+        if self.server.throttle < self.server.requests <= self.server.throttle + self.server.slow:
+            time.sleep(1.0)
+        if self.server.requests <= self.server.throttle:
+            self._reply(429, {"error": {"message": "slow down", "type": "rate_limit"}}, {"Retry-After": "0.05"})
+            return
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, _ in enumerate(inputs):
+            vector = np.full(4, 0.5, dtype=np.float32)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        self._reply(200, {
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        })
+
+    def _reply(self, status: int, payload: dict, headers: dict | None = None) -> None:
+        encoded = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
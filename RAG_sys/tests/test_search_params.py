@@ -0,0 +1,46 @@
+from unittest import mock
+
+import rag
+from rag import RAGPipeline, RawTextDataSource
+
+from tests.fakes import PipelineTestCase, lecture_texts
+
+
+class QuantizationTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        RAGPipeline(RawTextDataSource(lecture_texts(6)), self.config()).build()
+
+    def quantized(self, quantization: str):
+        """The local client drops quantization configs; report one as a server would."""
+        get_collection = self.client.get_collection
+
+        def with_quantization(collection_name):
+            info = get_collection(collection_name)
+            info.config.quantization_config = rag._quantization_config(self.config(quantization=quantization))
+            return info
+
+        return mock.patch.object(self.client, "get_collection", side_effect=with_quantization)
+
+    def test_collection_settings_follow_the_quantization_setting(self):
+        self.assertIsNotNone(rag._collection_settings(self.config(quantization="scalar"))["quantization_config"].scalar)
+        self.assertIsNotNone(rag._collection_settings(self.config(quantization="binary"))["quantization_config"].binary)
+        self.assertIsNone(rag._collection_settings(self.config())["quantization_config"])
+        with self.assertRaises(ValueError):
+            rag._quantization_config(self.config(quantization="pq"))
+
+    def test_search_params_come_from_the_collection_not_the_querying_config(self):
+        with self.quantized("scalar"):
+            # The backend never sets `quantization`; it only tunes the search.
+            pipeline = RAGPipeline(config=self.config(search_oversampling=2.0, search_hnsw_ef=64)).use_existing()
+
+        self.assertEqual(pipeline._search_params.hnsw_ef, 64)
+        self.assertEqual(pipeline._search_params.quantization.oversampling, 2.0)
+        self.assertTrue(pipeline._search_params.quantization.rescore)
+        with mock.patch.object(self.client, "query_points", wraps=self.client.query_points) as query_points:
+            self.assertTrue(pipeline.retrieve("topic number 3"))
+        self.assertEqual(query_points.call_args.kwargs["search_params"], pipeline._search_params)
+
+    def test_unquantized_collection_gets_no_quantization_params(self):
+        pipeline = RAGPipeline(config=self.config(quantization="scalar", search_oversampling=2.0)).use_existing()
+        self.assertIsNone(pipeline._search_params)
@@ -0,0 +1,69 @@
+from unittest import mock
+
+from langchain_core.documents import Document
+
+from rag import RAGPipeline, RawTextDataSource, chunk_point_id
+
+from tests.fakes import PipelineTestCase
+
+
+def sentence(source: int, page: int, i: int) -> str:
+    return f"Lecture {source}, page {page}: sentence number {i:02d} of this page."
+
+
+def lecture_pages(sources: int = 2, pages: int = 2, sentences: int = 10) -> RawTextDataSource:
+    texts, metadatas = [], []
+    for s in range(sources):
+        for p in range(pages):
+            texts.append("\n\n".join(sentence(s, p, i) for i in range(sentences)))
+            metadatas.append({"source": f"/slides/Lecture {s}.pdf", "page": p})
+    return RawTextDataSource(texts, metadatas)
+
+
+class SentenceWindowTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pipeline = RAGPipeline(
+            lecture_pages(), self.config(child_chunk_size=60, neighbor_window=2, top_k=1)
+        ).build()
+
+    def point_id(self, source: int, page: int, i: int) -> str:
+        text = sentence(source, page, i)
+        return chunk_point_id(Document(page_content=text, metadata={"source": f"/slides/Lecture {source}.pdf", "page": page}))
+
+    def test_chunks_are_single_sentences(self):
+        self.assertEqual(self.point_count(), 2 * 2 * 10)
+
+    def test_hit_is_returned_with_its_neighbours_in_reading_order(self):
+        with mock.patch.object(self.client, "retrieve", wraps=self.client.retrieve) as retrieve:
+            (doc,) = self.pipeline.retrieve(sentence(1, 0, 5))
+
+        self.assertEqual(doc.page_content, "\n".join(sentence(1, 0, i) for i in range(3, 8)))
+        self.assertEqual(doc.metadata["match"], sentence(1, 0, 5))
+        self.assertEqual(retrieve.call_count, 1)
+        self.assertEqual(len(retrieve.call_args.kwargs["ids"]), 4)
+
+    def test_windows_stop_at_the_page_and_document(self):
+        (first,) = self.pipeline.retrieve(sentence(1, 1, 0))
+        (last,) = self.pipeline.retrieve(sentence(0, 1, 9))
+
+        self.assertEqual(first.page_content, "\n".join(sentence(1, 1, i) for i in range(0, 3)))
+        self.assertEqual(last.page_content, "\n".join(sentence(0, 1, i) for i in range(7, 10)))
+
+    def test_hits_inside_an_earlier_window_are_dropped(self):
+        ids = [self.point_id(0, 0, 3), self.point_id(0, 0, 4), self.point_id(0, 0, 9), self.point_id(0, 1, 4)]
+        by_id = self.pipeline._fetch_by_ids(ids)
+        hits = [by_id[i] for i in ids]
+
+        with mock.patch.object(self.client, "retrieve", wraps=self.client.retrieve) as retrieve:
+            expanded = self.pipeline._expand_windows(hits)
+
+        self.assertEqual([doc.metadata["match"] for doc in expanded], [
+            sentence(0, 0, 3), sentence(0, 0, 9), sentence(0, 1, 4),
+        ])
+        self.assertEqual(expanded[1].page_content, "\n".join(sentence(0, 0, i) for i in range(7, 10)))
+        # Each neighbour is fetched once, in a single call.
+        self.assertEqual(retrieve.call_count, 1)
+        fetched = retrieve.call_args.kwargs["ids"]
+        self.assertEqual(len(fetched), len(set(fetched)))
+        self.assertNotIn(self.point_id(0, 0, 4), fetched)
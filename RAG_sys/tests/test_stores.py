@@ -0,0 +1,129 @@
+import os
+import shutil
+from unittest import mock
+
+from rag import MmapVectorStore, RAGPipeline, RawTextDataSource
+
+from tests.fakes import PipelineTestCase, lecture_texts
+
+
+QUESTIONS = ["topic number 3", "Lecture 7", "what does lecture 10 cover?"]
+
+
+class StoreTestCase(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        texts = lecture_texts(12)
+        metadatas = [
+            {"source": f"/slides/Lecture {i % 3}.pdf", "page": i, "course": "CS201" if i % 2 else "CS211"}
+            for i in range(12)
+        ]
+        self.pipeline = RAGPipeline(RawTextDataSource(texts, metadatas), self.config()).build()
+
+    def assert_same_results(self, other: RAGPipeline, filters=None) -> None:
+        for question in QUESTIONS:
+            expected = [doc.page_content for doc in self.pipeline.retrieve(question, filters)]
+            self.assertEqual([doc.page_content for doc in other.retrieve(question, filters)], expected)
+
+
+class SnapshotTests(StoreTestCase):
+    def test_round_trip_keeps_points_and_results(self):
+        path = os.path.join(self.tmp, "course.snapshot.tar")
+        exported = self.pipeline.export_snapshot(path)
+        embedded = len(self.embeddings.embedded)
+
+        restored = RAGPipeline(config=self.config(qdrant_collection="restored")).import_snapshot(path)
+
+        self.assertEqual(exported, 12)
+        self.assertEqual(self.point_ids("restored"), self.point_ids("course"))
+        self.assertEqual(len(self.embeddings.embedded), embedded)
+        self.assertEqual(
+            [doc.page_content for doc in restored.lookup({"course": "CS201"}, limit=None)],
+            [doc.page_content for doc in self.pipeline.lookup({"course": "CS201"}, limit=None)],
+        )
+        self.assert_same_results(restored)
+
+    def test_reimport_overwrites_and_recreate_drops_other_points(self):
+        path = os.path.join(self.tmp, "course.snapshot.tar")
+        self.pipeline.export_snapshot(path)
+        RAGPipeline(config=self.config(qdrant_collection="restored")).import_snapshot(path)
+        RAGPipeline(config=self.config(qdrant_collection="restored")).import_snapshot(path)
+        self.assertEqual(self.point_count("restored"), 12)
+
+        RAGPipeline(RawTextDataSource(["An extra chunk about templates."]), self.config(qdrant_collection="restored")).build_incremental()
+        self.assertEqual(self.point_count("restored"), 13)
+        RAGPipeline(config=self.config(qdrant_collection="restored")).import_snapshot(path, recreate=True)
+        self.assertEqual(self.point_count("restored"), 12)
+
+
+class MmapStoreTests(StoreTestCase):
+    def open(self, dtype: str) -> RAGPipeline:
+        directory = os.path.join(self.tmp, f"mmap-{dtype}")
+        self.assertEqual(self.pipeline.export_mmap(directory, dtype), 12)
+        return RAGPipeline(config=self.config(vector_backend="mmap", mmap_path=directory)).use_existing()
+
+    def test_float16_export_matches_qdrant(self):
+        store = self.open("float16")
+        self.assert_same_results(store)
+        self.assert_same_results(store, {"course": "CS201"})
+
+    def test_int8_export_finds_the_exact_match(self):
+        store = self.open("int8")
+        for doc in self.pipeline.lookup({"lecture": 1}, limit=None):
+            self.assertEqual(store.retrieve(doc.page_content)[0].page_content, doc.page_content)
+
+    def test_filters_and_lookup(self):
+        store = self.open("float16")
+        self.assertEqual(
+            [
+                (doc.metadata["source"], doc.metadata["page"])
+                for doc in store.lookup({"course": "CS201", "page": [1, 2, 3]}, limit=None)
+            ],
+            [("/slides/Lecture 0.pdf", 3), ("/slides/Lecture 1.pdf", 1)],
+        )
+        self.assertEqual(
+            [doc.page_content for doc in store.lookup({"lecture": 1}, limit=None)],
+            [doc.page_content for doc in self.pipeline.lookup({"lecture": 1}, limit=None)],
+        )
+
+    def test_filters_and_ids_use_the_exported_index(self):
+        directory = os.path.join(self.tmp, "mmap")
+        self.pipeline.export_mmap(directory)
+        store = MmapVectorStore(directory, self.embeddings)
+        expected = self.pipeline.lookup({"lecture": 1}, limit=None)
+
+        with mock.patch.object(MmapVectorStore, "_record", wraps=store._record) as record:
+            found = store.get_by_filter({"lecture": 1}, limit=None)
+            store.get_by_ids([doc.metadata["_id"] for doc in expected])
+        self.assertEqual(record.call_count, 2 * len(expected))
+        self.assertEqual(sorted(doc.page_content for doc in found), sorted(doc.page_content for doc in expected))
+
+        shutil.rmtree(os.path.join(store.directory, "index"))
+        older = MmapVectorStore(directory, self.embeddings)
+        self.assertEqual([doc.page_content for doc in older.get_by_filter({"lecture": 1}, limit=None)],
+                         [doc.page_content for doc in found])
+
+    def test_reexport_swaps_the_link_and_keeps_open_stores_readable(self):
+        directory = os.path.join(self.tmp, "mmap")
+        self.pipeline.export_mmap(directory)
+        first = MmapVectorStore(directory, self.embeddings)
+        for _ in range(2):
+            self.pipeline.export_mmap(directory)
+
+        self.assertTrue(os.path.islink(directory))
+        self.assertEqual(len(MmapVectorStore(directory, self.embeddings)), 12)
+        versions = [name for name in os.listdir(self.tmp) if name.startswith(".mmap.v")]
+        self.assertEqual(len(versions), 2)
+        self.assertNotEqual(first.directory, os.path.realpath(directory))
+        self.assertEqual(len(first.similarity_search("Lecture 7", k=2)), 2)
+
+    def test_plain_directory_from_an_older_export_is_replaced(self):
+        directory = os.path.join(self.tmp, "mmap")
+        self.pipeline.export_mmap(directory)
+        shutil.move(os.path.realpath(directory), os.path.join(self.tmp, "plain"))
+        os.remove(directory)
+        shutil.move(os.path.join(self.tmp, "plain"), directory)
+
+        self.pipeline.export_mmap(directory)
+        self.assertTrue(os.path.islink(directory))
+        self.assertEqual(len(MmapVectorStore(directory, self.embeddings)), 12)
@@ -0,0 +1,98 @@
+from unittest import mock
+
+from qdrant_client.models import Distance, VectorParams
+
+import rag
+from rag import RAGPipeline, RawTextDataSource, build_summary_index
+
+from tests.fakes import PipelineTestCase
+
+
+def lectures(pages: dict[int, int], changed: tuple = ()) -> RawTextDataSource:
+    """`pages` maps lecture number -> page count; `changed` lists (lecture, page) pairs with new text."""
+    texts, metadatas = [], []
+    for lecture, count in pages.items():
+        for page in range(count):
+            edit = " (revised)" if (lecture, page) in changed else ""
+            texts.append(f"Lecture {lecture}, page {page} covers concept {lecture}.{page}{edit}.")
+            metadatas.append({"source": f"/slides/CS201/Lecture {lecture}.pdf", "page": page, "course": "CS201"})
+    return RawTextDataSource(texts, metadatas)
+
+
+class SummaryIndexTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.prompts: list[str] = []
+
+    def summarize(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return f"summary {len(self.prompts)}"
+
+    def build(self, source: RawTextDataSource) -> dict:
+        RAGPipeline(source, self.config()).build()
+        return build_summary_index(self.client, "course", self.summarize, self.embeddings, window_pages=2, workers=2)
+
+    def summaries(self) -> list[dict]:
+        records = self.client.scroll("course__summaries", limit=1000, with_payload=True)[0]
+        return [record.payload["metadata"] for record in records]
+
+    def test_windows_and_a_document_summary_per_source(self):
+        stats = self.build(lectures({1: 5, 2: 2}))
+
+        self.assertEqual(stats, {"written": 6, "reused": 0, "deleted": 0})
+        pages = sorted((m["source"][-5], m["level"], m["page"]) for m in self.summaries())
+        self.assertEqual(pages, [
+            ("1", "document", [0, 1, 2, 3, 4]),
+            ("1", "window", [0, 1]),
+            ("1", "window", [2, 3]),
+            ("1", "window", [4]),
+            ("2", "document", [0, 1]),
+            ("2", "window", [0, 1]),
+        ])
+        self.assertEqual({m["course"] for m in self.summaries()}, {"CS201"})
+        self.assertIn("pages 3-4", self.prompts[1] + self.prompts[2])
+
+    def test_each_source_is_read_and_written_before_the_next(self):
+        RAGPipeline(lectures({1: 3, 2: 3, 3: 3}), self.config()).build()
+        events = []
+        scroll, upsert = self.client.scroll, self.client.upsert
+
+        def record_scroll(collection_name, scroll_filter=None, **kwargs):
+            if collection_name == "course":
+                condition = scroll_filter.must[0].match.value if scroll_filter else None
+                events.append(("read", condition and condition[-5]))
+            return scroll(collection_name, scroll_filter=scroll_filter, **kwargs)
+
+        def record_upsert(collection_name, points, **kwargs):
+            events.append(("write", {p.payload["metadata"]["source"][-5] for p in points}))
+            return upsert(collection_name, points, **kwargs)
+
+        with mock.patch.object(self.client, "scroll", side_effect=record_scroll), \
+                mock.patch.object(self.client, "upsert", side_effect=record_upsert):
+            build_summary_index(self.client, "course", self.summarize, self.embeddings, window_pages=2, page_size=2)
+
+        # Sources are listed first; then each one is read in full and written.
+        self.assertEqual(events, [
+            ("read", None), ("read", None), ("read", None), ("read", None), ("read", None),
+            ("read", "1"), ("read", "1"), ("write", {"1"}),
+            ("read", "2"), ("read", "2"), ("write", {"2"}),
+            ("read", "3"), ("read", "3"), ("write", {"3"}),
+        ])
+
+    def test_rerun_only_resummarizes_changed_pages_and_drops_removed_sources(self):
+        self.build(lectures({1: 4, 2: 2}))
+        self.prompts.clear()
+
+        stats = self.build(lectures({1: 4}, changed=[(1, 3)]))
+
+        # Window [2, 3] and the document summary of lecture 1 changed; lecture 2 is gone.
+        self.assertEqual(len(self.prompts), 2)
+        self.assertEqual(stats, {"written": 2, "reused": 1, "deleted": 4})
+        self.assertEqual({m["source"] for m in self.summaries()}, {"/slides/CS201/Lecture 1.pdf"})
+        self.assertEqual(len(self.summaries()), 3)
+
+    def test_empty_collection_writes_nothing(self):
+        self.client.create_collection("course", vectors_config={"dense": VectorParams(size=4, distance=Distance.COSINE)})
+        stats = build_summary_index(self.client, "course", self.summarize, self.embeddings)
+        self.assertEqual(stats, {"written": 0, "reused": 0, "deleted": 0})
+        self.assertFalse(self.client.collection_exists(rag._summaries_collection("course")))
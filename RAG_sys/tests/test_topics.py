@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import rag
+from rag import RAGPipeline, RawTextDataSource, kmeans
+
+from tests.fakes import PipelineTestCase
+
+
+SUBJECTS = {
+    "CS201": "inheritance subclass override virtual method base class",
+    "CS211": "linked list node pointer traversal insertion deletion",
+}
+
+
+def course_source(per_course: int = 6, start: int = 0) -> RawTextDataSource:
+    texts, metadatas = [], []
+    for course, words in SUBJECTS.items():
+        for i in range(start, start + per_course):
+            texts.append(f"{words} {words} part {i}.")
+            metadatas.append({"source": f"/slides/{course}/Lecture {i}.pdf", "page": 0, "course": course})
+    return RawTextDataSource(texts, metadatas)
+
+
+class KMeansTests(unittest.TestCase):
+    def test_separates_well_spread_clusters(self):
+        rng = np.random.default_rng(1)
+        centres = np.eye(4, 8, dtype=np.float32)
+        vectors = np.repeat(centres, 25, axis=0) + rng.normal(0, 0.05, (100, 8)).astype(np.float32)
+        _, labels = kmeans(vectors, 4, block_rows=7)
+        for block in labels.reshape(4, 25):
+            self.assertEqual(len(set(block)), 1)
+        self.assertEqual(len(set(labels)), 4)
+
+
+class TopicIndexTests(PipelineTestCase):
+    def labels(self) -> dict:
+        records = self.client.scroll("course", limit=1000, with_payload=True)[0]
+        return {record.id: record.payload["metadata"].get("topic") for record in records}
+
+    def test_incremental_runs_assign_new_chunks_without_reclustering(self):
+        cfg = self.config(topic_clusters=2)
+        RAGPipeline(course_source(), cfg).build_incremental()
+        before = self.labels()
+        self.assertNotIn(None, before.values())
+
+        with mock.patch.object(rag, "build_topic_index") as build_topic_index:
+            RAGPipeline(course_source(8), cfg).build_incremental()
+            build_topic_index.assert_not_called()
+
+        after = self.labels()
+        self.assertEqual(len(after), 16)
+        self.assertNotIn(None, after.values())
+        self.assertEqual({point_id: after[point_id] for point_id in before}, before)
+        topics = rag.load_topics(self.client, "course")
+        self.assertEqual(sum(topic["size"] for topic in topics), 16)
+
+    def test_course_filter_keeps_topic_documents_in_one_course(self):
+        pipeline = RAGPipeline(course_source(), self.config(topic_clusters=1)).build()
+        docs = pipeline.topic_documents("inheritance", filters={"course": "CS211"}, limit=4)
+        self.assertEqual(len(docs), 4)
+        self.assertEqual({doc.metadata["course"] for doc in docs}, {"CS211"})